@@ -1,3 +1,6 @@
+from telegram import User
+
+
 class TechnionFCPlayer:
     """This object represents a Technion FC player"""
     def __init__(self, user, liable=False, approved=False, match_ball=False):
@@ -12,3 +15,13 @@ class TechnionFCPlayer:
                 return self.user.username == other.user.username
             return self.user.id == other.user.id
         return False
+
+    def to_dict(self):
+        """Return a JSON serializable representation of the player"""
+        return {'user': self.user.to_dict(), 'liable': self.liable, 'approved': self.approved,
+                'match_ball': self.match_ball}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a player from its to_dict representation"""
+        return cls(User.de_json(data['user'], None), data['liable'], data['approved'], data['match_ball'])
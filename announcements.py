@@ -0,0 +1,112 @@
+import logging
+from threading import Lock
+from collections import defaultdict
+
+from telegram.utils.helpers import escape_markdown
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096       # Telegram's limit on the length of a message's text
+SEPARATOR = '\n\n'
+
+
+class AnnouncementBatcher:
+    """This class merges group announcements made in quick succession into a single message per chat
+
+    The first announcement to a chat schedules a flush `window` seconds later on the job queue. Announcements made
+    until then are sent along with it as one MarkdownV2 message (split only if it exceeds Telegram's length limit), so
+    sweeps and bulk edits don't flood the chat. Urgent announcements are sent right away."""
+
+    def __init__(self, window):
+        self._window = window
+        self._pending = defaultdict(list)       # chat id -> MarkdownV2 texts waiting to be sent
+        self._lock = Lock()
+        self.announced = 0      # number of announcements batched
+        self.sent = 0           # number of messages they were sent in
+        self.urgent = 0         # number of announcements sent right away
+
+    @property
+    def saved(self):
+        """Return the number of messages saved by batching so far (announcements still waiting aren't counted)"""
+        with self._lock:
+            waiting = sum(len(texts) for texts in self._pending.values())
+        return self.announced - waiting - self.sent
+
+    def announce(self, context, chat_id, text, markdown=False, urgent=False):
+        """Announce text to a chat. Plain text is escaped, text marked as markdown must already be MarkdownV2"""
+        if not markdown:
+            text = escape_markdown(text, version=2)
+        if urgent or self._window <= 0:
+            self.urgent += 1
+            return context.bot.send_message(chat_id=chat_id, text=text, parse_mode='MarkdownV2')
+
+        with self._lock:
+            first = not self._pending[chat_id]
+            self._pending[chat_id].append(text)
+            self.announced += 1
+        if first:
+            context.job_queue.run_once(self._flush_job, self._window, context=chat_id, name='flush_announcements')
+
+    def _flush_job(self, context):
+        self.flush(context.bot, context.job.context)
+
+    def flush(self, bot, chat_id=None):
+        """Send the announcements waiting for a chat (or for all chats) right away"""
+        with self._lock:
+            chat_ids = [chat_id] if chat_id is not None else list(self._pending)
+            batches = [(chat, self._pending.pop(chat)) for chat in chat_ids if self._pending.get(chat)]
+        for chat, texts in batches:
+            messages = merge(texts)
+            with self._lock:
+                self.sent += len(messages)
+            for message in messages:
+                bot.send_message(chat_id=chat, text=message, parse_mode='MarkdownV2')
+            if len(texts) > 1:
+                logger.debug(f"Merged {len(texts)} announcements to {chat} into {len(messages)} messages")
+
+
+def merge(texts):
+    """Join texts into as few messages as Telegram's length limit allows, keeping each text whole when possible"""
+    messages = []
+    current = ''
+    for text in texts:
+        for part in split(text):
+            if current and len(current) + len(SEPARATOR) + len(part) <= MAX_MESSAGE_LENGTH:
+                current += SEPARATOR + part
+            else:
+                if current:
+                    messages.append(current)
+                current = part
+    if current:
+        messages.append(current)
+    return messages
+
+
+def split(text):
+    """Split a text longer than Telegram's length limit at line breaks, so MarkdownV2 escapes and entities (which don't
+    span lines in the bot's announcements) stay whole. Lines longer than the limit are split at spaces, or if they have
+    none, just before the limit but never inside an escape"""
+    parts = []
+    current = None
+    for line in text.split('\n'):
+        while len(line) > MAX_MESSAGE_LENGTH:
+            cut = line.rfind(' ', 0, MAX_MESSAGE_LENGTH) + 1 or escape_safe_cut(line, MAX_MESSAGE_LENGTH)
+            if current is not None:
+                parts.append(current)
+                current = None
+            parts.append(line[:cut])
+            line = line[cut:]
+        if current is not None and len(current) + 1 + len(line) <= MAX_MESSAGE_LENGTH:
+            current += '\n' + line
+        else:
+            if current is not None:
+                parts.append(current)
+            current = line
+    parts.append(current)
+    return [part for part in parts if part.strip()]
+
+
+def escape_safe_cut(line, cut):
+    """Return the cut nearest to (and not after) a given one which doesn't leave a backslash escaping nothing"""
+    backslashes = len(line[:cut]) - len(line[:cut].rstrip('\\'))
+    return cut - backslashes % 2
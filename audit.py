@@ -0,0 +1,65 @@
+import logging
+from threading import Lock
+from datetime import datetime, timezone
+
+from psycopg.types.json import Jsonb
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50             # entries buffered before they are written without waiting for the next flush
+PAGE_SIZE = 20              # entries per /audit page
+COLUMNS = ('created_at', 'actor_id', 'actor_name', 'action', 'target', 'match_id', 'details')
+INSERT_QUERY = f"INSERT INTO AUDIT ({', '.join(COLUMNS)}) VALUES "
+ROW_PLACEHOLDERS = f"({', '.join(['%s'] * len(COLUMNS))})"
+
+
+class AuditLog:
+    """This class records admin and roster actions in the AUDIT table
+
+    Entries are buffered in memory and written by the background database writer in a single multi-row insert,
+    once `batch_size` entries are waiting or when flushed (periodically and on shutdown), whichever comes first."""
+
+    def __init__(self, writer, batch_size=BATCH_SIZE):
+        self._writer = writer
+        self._batch_size = batch_size
+        self._buffer = []
+        self._lock = Lock()
+
+    def record(self, actor, action, target=None, match_id=None, details=None):
+        """Record an action taken by a telegram user (or by the bot itself if actor is None)"""
+        entry = (datetime.now(timezone.utc), actor.id if actor else None, actor.full_name if actor else 'bot',
+                 action, target, match_id, Jsonb(details) if details else None)
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self._batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered entries in one insert"""
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+        query = INSERT_QUERY + ', '.join([ROW_PLACEHOLDERS] * len(entries))
+        self._writer.submit('AUDIT', [(query, [value for entry in entries for value in entry])])
+
+
+def fetch_page(connection, actor_id=None, before_id=None, limit=PAGE_SIZE):
+    """Return up to `limit` entries older than the given entry id (newest first), optionally of a single actor
+
+    Pages are keyed by the last entry id seen rather than an OFFSET, so every page is a short index range scan
+    however far back it is."""
+    conditions, params = [], []
+    if actor_id is not None:
+        conditions.append("actor_id = %s")
+        params.append(actor_id)
+    if before_id is not None:
+        conditions.append("id < %s")
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT id, {', '.join(COLUMNS)} FROM AUDIT {where}ORDER BY id DESC LIMIT %s", params + [limit])
+        rows = cur.fetchall()
+    connection.commit()
+    return rows
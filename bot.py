@@ -1,1243 +1,2507 @@
-import re
-import logging
-import random
-from datetime import datetime, time
-from pytz import timezone
-from collections import deque
-from psycopg import OperationalError, DatabaseError, Error
-
-from telegram import User, TelegramError
-from telegram.ext import Updater, CommandHandler
-
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_GROUP_INVITE_LINK, PORT
-from postgres import PostgreSqlDb
-from TechnionFCPlayer import TechnionFCPlayer
-
-# SQL Database
-sql_database = PostgreSqlDb()
-db_connection = sql_database.get_connection()
-
-# Enable logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    level=logging.DEBUG)
-
-logger = logging.getLogger(__name__)
-
-# Constants
-MATCHDAYS = (0, 3)                  # matchdays are Monday and Thursday
-LIST_MAX_SIZE = 15                  # there are 3 teams, each team has 5 players (set by pitch size)
-BACKUP_INTERVAL = 600               # backup interval set to 10 minutes
-ACCEPT_TIMEFRAME = 86400            # accept timeframe is set to 24 hours
-FAKE_USER_ID = -1
-ADMIN_PRIVILEGE = 'admin'
-MEMBER_PRIVILEGE = 'member'
-PUBLIC_COMMAND = 'public'
-PRIVATE_COMMAND = 'private'
-
-# Emojis
-ALARM_EMOJI_CODE = '\U000023F0'
-BIB_EMOJI_CODE = '\U0001F3BD'
-CALENDAR_EMOJI_CODE = '\U0001F4C5'
-CHECK_MARK_EMOJI_CODE = '\U00002705'
-CIRCLE_BLUE_EMOJI_CODE = '\U0001F535'
-CIRCLE_GREEN_EMOJI_CODE = '\U0001F7E2'
-CIRCLE_RED_EMOJI_CODE = '\U0001F534'
-CLIPBOARD_EMOJI_CODE = '\U0001F4CB'
-CLOCK_EMOJI_CODE = '\U0001F55A'
-HOURGLASS_EMOJI_CODE = '\U000023F3'
-FOOTBALL_EMOJI_CODE = '\U000026BD'
-NO_ENTRY_EMOJI_CODE = '\U000026D4'
-OK_SIGN_EMOJI_CODE = '\U0001F44C'
-POINTING_EMOJI_CODE = '\U0000261D'
-POINTING_DOWN_EMOJI_CODE = '\U0001F447'
-SCROLL_EMOJI_CODE = '\U0001F4DC'
-STOPWATCH_EMOJI_CODE = '\U000023F1'
-
-# Playing list. This data structure functions as a waiting list as well
-playing = deque()
-
-# Users to be added by admins
-invited = deque()
-
-# Possible users to assume match liability
-asked = deque()
-
-# region ADMIN COMMANDS
-
-
-def start_command(update, context):
-    """Send bot welcome message and add jobs to the context's JobQueue"""
-    user = update.message.from_user
-    message = 'TechnionFC Bot has started operating\.\.\.\n\nPlease use the /help command to list your options'
-
-    user.send_message(message, parse_mode='MarkdownV2')
-
-
-def addUser_command(update, context):
-    """Add tagged user to the playing list
-
-    When provided with an index, place the tagged user accordingly"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'addUser'):
-        return
-
-    # message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
-    if len(update.message.entities) != 2:
-        return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag the user you wish to add!')
-
-    tagged_user = update.message.entities[1].user   # second message entity is a TEXT_MENTION or a MENTION
-
-    # in case admin wants to add a player in a specific place on the list, two arguments are provided.
-    index = None
-    if len(context.args) == 2:
-        index_str = context.args[1]                 # second argument agreed to be said place on the list
-        try:
-            index = int(index_str) - 1              # decreased index to accommodate "natural" indexing
-        except ValueError:
-            return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag the user you wish '
-                                             f'to add first, and the list index second!')
-
-    if tagged_user is None:  # if second message entity is a MENTION
-        return addUser_by_username(user, index, update, context)
-
-    if not user_full_name_is_valid(tagged_user):
-        return update.message.reply_text(f'Hi {user.full_name}, you\'ve tried adding a user with an invalid '
-                                         f'telegram name!\n\nPlease advise him to change it and try again...')
-
-    tagged_player = TechnionFCPlayer(tagged_user)
-    if tagged_player in playing:
-        return update.message.reply_text(f'Hi {user.full_name}, '
-                                         f'user {tagged_user.full_name} is already on the playing list!')
-
-    if index is not None:
-        playing.insert(index, tagged_player)
-    else:
-        playing.append(tagged_player)
-    update.message.reply_text(f'Congratulations {tagged_user.full_name}, '
-                              f'you were added to the playing list by {user.full_name}!')
-
-
-def addExternal_command(update, context):
-    """Add a non-group member to the playing list"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'addExternal'):
-        return
-
-    # message MUST have at least two arguments to be valid (Full names must include both first and last names)
-    if len(context.args) < 2:
-        return update.message.reply_text(f'Hi {user.full_name}, please provide the full name '
-                                         f'of the external player you wish to add!')
-
-    ext_player_first_name = context.args[0]
-    ext_player_last_name = ' '.join(str(arg) for arg in context.args[1:])
-    ext_player_full_name = f'{ext_player_first_name} {ext_player_last_name}'
-    ext_user = User(-int(round(datetime.now().timestamp())), first_name=ext_player_first_name, is_bot=False,
-                    last_name=ext_player_last_name)
-    ext_player = TechnionFCPlayer(ext_user, approved=True)
-
-    if ext_player in playing:
-        return update.message.reply_text(f'Hi {user.full_name}, {ext_player_full_name} is already on the playing list!')
-
-    playing.append(ext_player)
-    update.message.reply_text(f'External player named {ext_player_full_name} added to the playing list '
-                              f'by {user.full_name}!')
-
-
-def removeUser_command(update, context):
-    """Remove tagged user from the playing list"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'removeUser'):
-        return
-
-    # message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
-    if len(update.message.entities) != 2:
-        return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag the user you wish to remove!')
-
-    player, player_name = get_player_from_entity_id(update, context, entity_id=1)
-
-    if player not in playing:
-        return update.message.reply_text(f'Hi {user.full_name}, the player you wish to remove, '
-                                         f'{player_name}, is not listed...\n\n'
-                                         f'Please make sure to tag the correct user you wish to remove!')
-    index = playing.index(player)
-    if playing[index].liable:
-        return update.message.reply_text(f'Hi {user.full_name}, {player_name} is liable for the match. Therefore, '
-                                         f'you cannot remove him from the list until he ensures another player assumes '
-                                         f'match liability!')
-
-    # if the player hasn't accepted yet, he needs to be removed from invited too
-    if player_name in invited:
-        invited.remove(player_name)
-
-    update.message.reply_text(f'{player_name} was removed from the playing list by {user.full_name}!')
-    remove_player_from_list(context, index, player)
-
-
-def createList_command(update, context):
-    """Build list with tagged users"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'createList'):
-        return
-
-    if len(context.args) != len(set(context.args)):         # not all entities are unique
-        return update.message.reply_text(f'Hi {user.full_name}, please make sure not to tag the same user twice!')
-
-    invalids = []
-    for entity in update.message.entities:                  # MENTION or TEXT_MENTION are types of MessageEntity
-        if entity.type not in ('mention', 'text_mention'):
-            continue
-
-        tagged_user = entity.user
-        if tagged_user is None:
-            continue
-        if not user_full_name_is_valid(tagged_user):
-            invalids.append(tagged_user)
-
-    if invalids:
-        text = f'Hi {user.full_name}, the following users have invalid telegram name:\n\n'
-        for invalid in invalids:
-            text += f'{invalid.full_name}\n'
-        text += f'\nPlease advise them to change it and then try again!'
-        return update.message.reply_text(text)
-
-    playing.clear()                                         # clearing both queues prior to population
-    invited.clear()
-    for entity in update.message.entities[1:]:              # first MessageEntity is of type 'bot_command'
-        tagged_user = entity.user
-        if tagged_user is None:
-            index = update.message.entities.index(entity)
-            tagged_username = context.args[index - 1]       # argument index = entity index - 1
-            username = tagged_username.replace('@', '')
-            fake_user = User(FAKE_USER_ID, 'Reserved for', is_bot=False, last_name=username, username=username)
-            fake_player = TechnionFCPlayer(fake_user)
-            invited.append(username)
-            playing.append(fake_player)
-
-            text = f'Hi @{username},\n{user.full_name} is trying to add you to the playing list\n\n' \
-                   f'Your spot is reserved for the next 24 hours.\n' \
-                   f'Please respond to this message with /accept'
-
-            context.job_queue.run_once(check_accepted, ACCEPT_TIMEFRAME, context=(update.message.chat_id, username))
-            update.message.reply_text(text)
-        else:
-            tagged_player = TechnionFCPlayer(tagged_user)
-            playing.append(tagged_player)
-            text = f'Congratulations {tagged_user.full_name}, you were added to the playing list by {user.full_name}!'
-            update.message.reply_text(text)
-
-
-def clearAll_command(update, context):
-    """Clear both playing and waiting lists"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'clearAll'):
-        return
-
-    playing.clear()
-    invited.clear()
-    asked.clear()
-    try:
-        db_connection = sql_database.get_connection()
-        with db_connection.cursor() as cur:
-            cur.execute("DELETE FROM PLAYING")  # delete current tables
-            cur.execute("DELETE FROM INVITED")
-            cur.execute("DELETE FROM ASKED")
-        db_connection.commit()
-    except OperationalError as err:
-        logger.error(f"Operational error: {err}")
-        sql_database.restart_connection()
-        return update.message.reply_text('Database operational error occurred. Please view the log...')
-    except DatabaseError as err:
-        logger.error(f"Database error: {err}")
-        db_connection.rollback()
-        return update.message.reply_text('Database error occurred. Please view the log...')
-    return update.message.reply_text('Both lists were cleared by an admin')
-
-
-def transferLiability_command(update, context):
-    """Transfer match liability from one player to another"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'transferLiability'):
-        return
-
-    # message MUST have exactly three entities to be valid: BOT_COMMAND and two TEXT_MENTION or MENTION
-    if len(update.message.entities) != 3:
-        return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag both users!')
-
-    liable_player, liable_player_name = get_player_from_entity_id(update, context, entity_id=1)
-    assuming_player, assuming_player_name = get_player_from_entity_id(update, context, entity_id=2)
-
-    for player, player_name in (liable_player, liable_player_name), (assuming_player, assuming_player_name):
-        if player not in playing:
-            return update.message.reply_text(f'Hi {user.full_name}, {player_name} is not listed...\n\n'
-                                             f'Please make sure to tag the correct users!')
-    index_liable = playing.index(liable_player)
-    if not playing[index_liable].liable:
-        return update.message.reply_text(f'Hi {user.full_name}, {liable_player_name} is not liable for the match. '
-                                         f'Please make sure to tag the correct users!')
-
-    index_assuming = playing.index(assuming_player)
-    playing[index_liable].liable = False
-    playing[index_assuming].liable = True
-    text = f'{user.full_name} has transferred match liability from {liable_player_name} to {assuming_player_name}!'
-    update.message.reply_text(text)
-
-
-def liableUser_command(update, context):
-    """Grant match liability to a specific player"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'liableUser'):
-        return
-
-    # message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
-    if len(update.message.entities) != 2:
-        return update.message.reply_text(f'Hi {user.full_name}, '
-                                         f'please make sure to tag the user you wish to grant match liability to!')
-
-    liable_player, liable_player_name = get_player_from_entity_id(update, context, entity_id=1)
-
-    if liable_player not in playing:
-        return update.message.reply_text(f'Hi {user.full_name}, {liable_player_name} is not listed...\n\n'
-                                         f'Please make sure to tag the correct user!')
-
-    for player in playing:
-        if player.liable:
-            return update.message.reply_text(f'Hi {user.full_name}, '
-                                             f'{player.user.full_name} is already liable for the match...\n\n'
-                                             f'Please use the /transferLiability command to transfer match liability!')
-
-    index_liable = playing.index(liable_player)
-    playing[index_liable].liable = True
-    update.message.reply_text(f'{liable_player_name} is now liable for the match!')
-
-# endregion
-
-# region USER COMMANDS
-
-
-def help_command(update, context):
-    """Send bot help message"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'help'):
-        return
-
-    message = f'Welcome to the *Technion Football Club*\!\n\n'\
-              f'\n*Club rules* :\n' \
-              f'0\. Club matchdays are: _Monday @ 20:30\-22:30, Thursday @ 20:30\-22:30_\n' \
-              f'If you can not attend the FULL 2 hours, please refrain from adding yourself to the list\.\n\n' \
-              f'1\. Players MUST use their full names in their telegram profiles \(Hebrew or English\)\.\n' \
-              f'NO SPECIAL CHARACTERS ALLOWED\!\!\!\n\n' \
-              f'2\. Players must be either Technion students or Technion Pre\-Academic Prep\. School students\.\n' \
-              f'Group admins must authorize exceptions\.\n\n' \
-              f'3\. External players \(Technion students who are not part of our group\) can only be added if ' \
-              f'the list is not full and with the approval of one of the group admins\.\n\n' \
-              f'4\. Training bibs are *MANDATORY\!*\nPlayers who do not have one, must purchase one to play\.\n' \
-              f'The link for purchasing the agreed\-upon bib can be found here https://t\.me/c/1760505503/5543\n\n' \
-              f'5\. Creating a list for Monday becomes possible on Saturday evening starting at 21:30\.\n' \
-              f'Creating a list for Thursday becomes possible on Tuesday evening starting at 21:30\.\n\n' \
-              f'6\. List creator will be liable for the match, which means he must ensure all players have a ' \
-              f'student card in effect \(every player is responsible for bringing his\)\.\n' \
-              f'In addition, he\'ll be ASAT\'s point of contact regarding any possible match\-related inquiries\.\n\n' \
-              f'7\. If the list creator wishes to remove himself from the list, he must ensure that another player ' \
-              f'assumes match liability\. Failing to do so will force an admin to clear the list\.\n\n' \
-              f'8\. Players can only add themselves, and only once\!\n\n' \
-              f'9\. If the list is already full \(max list size is 15 players\), ' \
-              f'the player will be placed on a waiting list \(will be created automatically\)\.\n\n' \
-              f'10\. Moving from the waiting list to the playing list is possible only if one of the players removes ' \
-              f'himself from the playing list or if an admin removed one of the players\.\n\n' \
-              f'11\. Every matchday, the players on the playing list MUST approve their attendance by 16:00\.\n' \
-              f'Players who fail to do so will be removed from the playing list\!\n\n' \
-              f'12\. Arrival approval for a match becomes mandatory if 15 players approve their arrival before\n' \
-              f'the deadline \(for approving attendance\)\. If fewer than 15 people have approved their attendance,\n' \
-              f'cancellations can be made up to two hours before the game\.\n' \
-              f'Afterward, all players who confirmed their arrival must attend\.\n\n' \
-              f'13\. The @FCTechnionBot was created to ease the players\' registration process\.\n' \
-              f'Please use bot commands in a private chat @ https://t\.me/FCTechnionBot \(when possible\)\.\n\n' \
-              f'\n*Available user commands* :\n' \
-              f'/print \- print the list\n' \
-              f'/create \- create a new list\n' \
-              f'/add \- add yourself to the list\n' \
-              f'/remove \- remove yourself from the list\n' \
-              f'/approve \- approve you\'ll be attending the match\n' \
-              f'/ball \- inform you\'ll be bringing a match ball\n' \
-              f'/shuffle \- shuffle the playing list to create 3 random teams\n' \
-              f'/rules \- print match rules\n' \
-              f'/schedule \- print the bot\'s schedule\n' \
-              f'/liable \- ask the tagged user to assume match liability\n' \
-              f'/assume \- assume match liability\n' \
-              f'/accept \- accept admin invitation to join the list\n' \
-              f'/help \- view club rules and available bot commands\n' \
-              f'\n*Available only to admins* :\n' \
-              f'/start \- start the bot\n' \
-              f'/createList \- create a new list with tagged users\n' \
-              f'/clearAll \- clear the list\n' \
-              f'/addUser \- add the tagged user to the list\n' \
-              f'/removeUser \- remove the tagged user from the list\n' \
-              f'/addExternal \- add External player to the list\n' \
-              f'/liableUser \- grant match liability to the tagged user\n' \
-              f'/transferLiability \- transfer match liability between tagged users\n'
-
-    user.send_message(message, parse_mode='MarkdownV2')
-
-
-def create_command(update, context):
-    """Create a playing list"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'create'):
-        return
-
-    day = datetime.now(tz=timezone('Asia/Jerusalem')).weekday()
-    current_time = datetime.now(tz=timezone('Asia/Jerusalem'))
-    if day == 1 and current_time.time() < time(hour=21, minute=30, tzinfo=timezone('Asia/Jerusalem')):
-        return user.send_message(f'Hi {user.full_name}, club rules state that creating a list for Thursday '
-                                 f'becomes possible on Tuesday evening starting at 21:30!')
-    if day == 4 or (day == 5 and current_time.time() < time(hour=21, minute=30, tzinfo=timezone('Asia/Jerusalem'))):
-        return user.send_message(f'Hi {user.full_name}, club rules state that creating a list for Monday '
-                                 f'becomes possible on Saturday evening starting at 21:30!')
-    if not user_full_name_is_valid(user):
-        return user.send_message(f'Hi {user.full_name}, your telegram name is invalid!\n\n'
-                                 f'Please use /help to read on our naming rules, change it, and try again')
-
-    if playing:
-        return user.send_message(f'Playing list is not empty!\n\n{user.full_name}, '
-                                 f'please add yourself to current queue using the /add command')
-
-    player = TechnionFCPlayer(user, liable=True)
-    playing.append(player)
-    context.bot.send_message(TELEGRAM_CHAT_ID, f'{user.full_name} has created a new playing list!')
-    user.send_message(f'Congratulations {user.full_name}, you\'ve created a new playing list!\n\n'
-                      f'Please note, you\'re liable for the match!\n'
-                      f'For more information, please see the /help message')
-
-
-def add_command(update, context):
-    """Add player to the playing list"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'add'):
-        return
-
-    if not user_full_name_is_valid(user):
-        return user.send_message(f'Hi {user.full_name}, your telegram name is invalid!\n\n'
-                                 f'Please use /help to read on our naming rules, change it, and try again')
-
-    player = TechnionFCPlayer(user)
-    if playing.count(player) > 0:
-        index = playing.index(player)
-        if index < LIST_MAX_SIZE:
-            return user.send_message(f'{user.full_name}, you\'re already on the playing list!')
-        else:
-            return user.send_message(f'{user.full_name}, you\'re already on the waiting list!')
-    else:
-        if len(playing) == 0:
-            return user.send_message(f'{user.full_name}, please use the /create command '
-                                     f'to create a list first!')
-
-        playing.append(player)
-        index = playing.index(player)
-        if index < LIST_MAX_SIZE:
-            return user.send_message(f'Congratulations {user.full_name}, you\'re on the playing list!\n')
-        else:
-            return user.send_message(f'Playing list is full!\n\n{user.full_name}, you\'re on the waiting list')
-
-
-def remove_command(update, context):
-    """Remove player from the playing list"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'remove'):
-        return
-
-    player = TechnionFCPlayer(user)
-    if player not in playing:
-        return user.send_message(f'{user.full_name}, you\'re not listed at all!')
-
-    index = playing.index(player)
-    if playing[index].liable:
-        return user.send_message(f'Hi {user.full_name}, you are liable for the match. Therefore, you cannot remove '
-                                 f'yourself from the list until you ensure another player assumes match liability!')
-
-    user.send_message(f'{user.full_name}, the bot has removed you from the playing list!')
-    remove_player_from_list(context, index, player)
-
-
-def liable_command(update, context):
-    """Ask the tagged user to assume match liability"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PUBLIC_COMMAND, 'liable'):
-        return
-
-    player = TechnionFCPlayer(user)
-    if player not in playing:
-        return user.send_message(f'Hi {user.full_name}, you\'re not listed at all and therefore not liable!')
-
-    index = playing.index(player)
-    if not playing[index].liable:
-        return user.send_message(f'Hi {user.full_name}, you\'re not liable and therefore cannot transfer liability!')
-
-    # message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
-    if len(update.message.entities) != 2:
-        return user.send_message(f'Hi {user.full_name}, please tag the user you wish will assume match liability!')
-
-    player, player_name = get_player_from_entity_id(update, context, entity_id=1)
-
-    if player not in playing:
-        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, is not listed...\n\n'
-                                 f'Please tag the correct user you wish will assume match liability!')
-    index = playing.index(player)
-    if playing[index].user.id == FAKE_USER_ID:
-        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, '
-                                 f'has yet to accept the admin\'s invitation to join the list...\n\n'
-                                 f'Please tag a user on the playing list!')
-
-    if index >= LIST_MAX_SIZE:
-        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, '
-                                 f'is on the waiting list...\n\n'
-                                 f'Please tag the correct user you wish will assume match liability!')
-
-    user_id_or_name = str(playing[index].user.id) \
-        if not playing[index].user.username \
-        else playing[index].user.username
-    if user_id_or_name in asked:
-        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, '
-                                 f'has already been asked to assume match liability!')
-
-    asked.append(user_id_or_name)
-    update.message.reply_text(f'Hi {player_name}, {user.full_name} has asked you to assume match liability.\n\n'
-                              f'Please use the /assume command to assume match liability!')
-
-
-def accept_command(update, context):
-    """Accept admin invitation to join the list"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PUBLIC_COMMAND, 'accept'):
-        return
-
-    if user.username not in invited:
-        return user.send_message(f'Hi {user.full_name},\nYou were not invited by an admin!')
-
-    if not user_full_name_is_valid(user):
-        return user.send_message(f'Hi {user.full_name}, your telegram name is invalid!\n\n'
-                                 f'Please use /help to read on our naming rules, change it, and try again')
-
-    # for each invited player, there is a single fake player on the playing list with the same (unique) username
-    fake_player = [player for player in playing if player.user.username == user.username].pop()
-
-    index = playing.index(fake_player)
-    playing.remove(fake_player)
-    playing.insert(index, TechnionFCPlayer(user))
-    invited.remove(user.username)
-    if index < LIST_MAX_SIZE:
-        return user.send_message(f'Congratulations {user.full_name}, you\'re on the playing list!\n')
-    user.send_message(f'Hi {user.full_name}, you\'re on the waiting list')
-
-
-def approve_command(update, context):
-    """Mark player approval for attending the match"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'approve'):
-        return
-
-    day = datetime.now(tz=timezone('Asia/Jerusalem')).weekday()
-    if day not in MATCHDAYS:
-        return user.send_message(f'Hi {user.full_name}, please wait for matchday to approve your attendance!')
-
-    player = TechnionFCPlayer(user)
-    if player not in playing:
-        return user.send_message(f'Hi {user.full_name}, you\'re not listed at all.\n\nNo need to approve!')
-
-    index = playing.index(player)
-    playing[index].approved = True
-    user.send_message(f'{user.full_name}, you\'ve approved you\'ll be attending the match!')
-
-
-def assume_command(update, context):
-    """Assume match liability"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PUBLIC_COMMAND, 'assume'):
-        return
-
-    player = TechnionFCPlayer(user)
-    if player not in playing:
-        return user.send_message(f'Hi {user.full_name}, you\'re not listed at all.\n\n'
-                                 f'No need to assume match liability!')
-
-    index = playing.index(player)
-    if playing[index].liable:
-        return user.send_message(f'Hi {user.full_name}, you\'re already liable!\n\nNo need to assume match liability!')
-
-    if playing[index].user.id == FAKE_USER_ID:
-        return user.send_message(f'Hi {user.full_name}, '
-                                 f'please /accept admin invitation before assuming match liability!')
-
-    user_id_or_name = str(user.id) if user.username is None else user.username
-    if user_id_or_name not in asked:
-        return user.send_message(f'Hi {user.full_name},\nYou were not asked to assume match liability!')
-
-    for player in playing:
-        player.liable = False
-    playing[index].liable = True
-
-    asked.clear()
-    try:
-        db_connection = sql_database.get_connection()
-        with db_connection.cursor() as cur:
-            cur.execute("DELETE FROM ASKED")
-        db_connection.commit()
-    except OperationalError as err:
-        logger.error(f"Operational error: {err}")
-        sql_database.restart_connection()
-        return update.message.reply_text('Database operational error occurred. Please view the log...')
-    except DatabaseError as err:
-        logger.error(f"Database error: {err}")
-        db_connection.rollback()
-        return update.message.reply_text('Database error occurred. Please view the log...')
-    context.bot.send_message(TELEGRAM_CHAT_ID, f'{user.full_name} has assumed match liability!')
-
-
-def ball_command(update, context):
-    """Mark player approval for bringing a match ball"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'ball'):
-        return
-
-    player = TechnionFCPlayer(user)
-    if player not in playing:
-        return user.send_message(f'Hi {user.full_name}, you\'re not listed at all.\n\nNo need to bring a match ball!')
-    index = playing.index(player)
-    playing[index].match_ball = not playing[index].match_ball
-    if playing[index].match_ball:
-        user.send_message(f'Hi {user.full_name}, you\'re in charge of bringing a match ball!')
-    else:
-        user.send_message(f'Hi {user.full_name}, you\'re not in charge of bringing a match ball anymore')
-
-
-def print_command(update, context):
-    """Print both playing and waiting lists"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'print'):
-        return
-
-    user.send_message(get_lists(), parse_mode='MarkdownV2')
-
-
-def shuffle_command(update, context):
-    """Shuffle playing list to create 3 unique teams"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'shuffle'):
-        return
-
-    day = datetime.now(tz=timezone('Asia/Jerusalem')).weekday()
-    current_time = datetime.now(tz=timezone('Asia/Jerusalem'))
-    # shuffle is allowed only on matchdays
-    if day not in MATCHDAYS:
-        return user.send_message(f'Hi {user.full_name}, shuffle command is reserved only for matchdays!')
-
-    teams = {}
-    colors = ('Red', 'Green', 'Blue')
-    players = [player for player in playing if playing.index(player) < LIST_MAX_SIZE]
-    for i in range(LIST_MAX_SIZE - len(players)):
-        players += [f'External {i}']
-    random.shuffle(players)
-
-    text = 'One possible way to divide into 3 teams\n\n'
-    for color in colors:
-        teams[color] = players[colors.index(color)::3]
-        if color == 'Red':
-            text += f'{CIRCLE_RED_EMOJI_CODE}{CIRCLE_RED_EMOJI_CODE}  {color} Team  ' \
-                   f'{CIRCLE_RED_EMOJI_CODE}{CIRCLE_RED_EMOJI_CODE}\n\n'
-        elif color == 'Green':
-            text += f'{CIRCLE_GREEN_EMOJI_CODE}{CIRCLE_GREEN_EMOJI_CODE}  {color} Team  ' \
-                   f'{CIRCLE_GREEN_EMOJI_CODE}{CIRCLE_GREEN_EMOJI_CODE}\n\n'
-        else:
-            text += f'{CIRCLE_BLUE_EMOJI_CODE}{CIRCLE_BLUE_EMOJI_CODE}  {color} Team  ' \
-                   f'{CIRCLE_BLUE_EMOJI_CODE}{CIRCLE_BLUE_EMOJI_CODE}\n\n'
-        team_players = teams[color]
-        for player in team_players:
-            text += f'{team_players.index(player) + 1}\. '
-            if isinstance(player, str):
-                text += f'{player}\n'
-            else:
-                text += f'{player.user.first_name} {player.user.last_name}\n'
-        text += '\n'
-    user.send_message(text, parse_mode='MarkdownV2')
-
-
-def rules_command(update, context):
-    """Prints the match rules"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'rules'):
-        return
-
-    message = f'\n{SCROLL_EMOJI_CODE}{SCROLL_EMOJI_CODE}  *Match Rules*  {SCROLL_EMOJI_CODE}{SCROLL_EMOJI_CODE}\n\n' \
-              f'0\. There are three \(3\) teams\. Each team consists of five \(5\) players\.\n\n' \
-              f'1\. Each player must have a blue and green training bib\.\n\n' \
-              f'2\. A match lasts eight \(8\) minutes or up until one team scores two \(2\) goals\.\n\n' \
-              f'3\. In case of a tie, there will be two \(2\) additional minutes of stoppage time\.\n\n' \
-              f'4\. In case the standard time of play passes and the game is still in play, ' \
-              f'the match will have one last attack\.\n\n' \
-              f'5\. The "last attack" ends when \(whichever comes first\):\n' \
-              f'    a\. A team gets a goal kick\.\n' \
-              f'    b\. The ball has been out for a throw\-out for the third time\.\n' \
-              f'    \* corner\-kicks are considered a part of the attack\.\n\n' \
-              f'6\. In case the stoppage time ends in a tie, there are two options:\n' \
-              f'    a\. The veteran team \(if there is one\) leaves\.\n' \
-              f'    b\. Each team gets two penalty kicks\.\n' \
-              f'        The first team that scores while the other misses, stays\.\n\n' \
-              f'7\. The goalkeeper\'s movement is limited to his team\'s half\.\n\n' \
-              f'8\. The goalkeeper can score a goal\.\n\n' \
-              f'9\. The goalkeeper is replaced in each of the following cases \(whichever comes first\):\n' \
-              f'    a\. He has conceded a goal\.\n' \
-              f'    b\. He has been in goal the entire match \(from start to finish\)\.\n\n'
-
-    user.send_message(message, parse_mode='MarkdownV2')
-
-
-def schedule_command(update, context):
-    """Prints the bot's schedule"""
-    user = update.message.from_user
-    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'schedule'):
-        return
-
-    message = f'\n{CLIPBOARD_EMOJI_CODE}{CLIPBOARD_EMOJI_CODE}  *Bot schedule*  ' \
-              f'{CLIPBOARD_EMOJI_CODE}{CLIPBOARD_EMOJI_CODE}\n\n' \
-              f'0\. Each matchday at 12:30, ' \
-              f'the bot will remind players who have yet to approve their attendance to do so\.\n\n' \
-              f'1\. Each matchday at 15:00, ' \
-              f'the bot will give a final reminder for players who have yet to approve their attendance to do so\.\n\n' \
-              f'2\. Each matchday at 16:00, 16:30, 17:00, 17:30, and 18:00, ' \
-              f'the bot will remove from the list players who have yet to approve their attendance\.\n' \
-              f'When promoting players from the waiting list, ' \
-              f'the bot will give preference to players who approved their attendance\.\n\n' \
-              f'3\. Each matchday at 11:15, 13:15, 15:15, 17:15, 18:15, and 19:15, the bot will print ' \
-              f'the current state of the list\.\n\n' \
-              f'4\. Each matchday at 23:59:59, the bot will clean up the list\.\n\n' \
-              f'5\. Each day at 05:00:00, the bot restarts itself\.\n' \
-              f'Please refrain from performing any actions during the 10 minutes before\.\n\n'
-
-    user.send_message(message, parse_mode='MarkdownV2')
-
-# endregion
-
-# region TELEGRAM JOBS
-
-
-def backup_to_database(context):
-    """Backup list to database"""
-    try:
-        db_connection = sql_database.get_connection()
-        with db_connection.cursor() as cur:
-            cur.execute("DELETE FROM PLAYING")  # delete current table
-            for player in playing:
-                user_id = player.user.id
-                user_first_name = player.user.first_name
-                user_last_name = player.user.last_name
-                user_username = player.user.username if player.user.username is not None else ''
-                player_liable = player.liable
-                player_approved = player.approved
-                player_match_ball = player.match_ball
-                cur.execute("INSERT INTO PLAYING (user_id, user_first_name, user_last_name, user_username, "
-                            "player_liable, player_approved, player_match_ball)"
-                            "VALUES(%s, %s, %s, %s, %s, %s, %s)",
-                            (user_id, user_first_name, user_last_name, user_username,
-                             player_liable, player_approved, player_match_ball))
-            db_connection.commit()
-
-            cur.execute("DELETE FROM INVITED")
-            for username in invited:
-                # cur.execute inserted value must be a tuple
-                cur.execute("INSERT INTO INVITED (username) VALUES(%s)", (username,))
-            db_connection.commit()
-
-            cur.execute("DELETE FROM ASKED")
-            for user_id_or_name in asked:
-                # cur.execute inserted value must be a tuple
-                cur.execute("INSERT INTO ASKED (user_id_or_name) VALUES(%s)", (user_id_or_name,))
-            db_connection.commit()
-    except Error as err:
-        logger.error(f"Backup error: {err}")
-        sql_database.restart_connection()
-
-
-def kindly_reminder(context):
-    """Remind players to approve their attendance"""
-    if all(player.approved for player in playing):
-        return
-
-    text = f'{ALARM_EMOJI_CODE}  It\'s 12:30 on matchday  {ALARM_EMOJI_CODE}\n\n' \
-           f'This is a kindly reminder for\n\n'
-    yet_to_approve = [player for player in playing if not player.approved]
-    for player in yet_to_approve:
-        if player.user.id == FAKE_USER_ID:
-            text += f'\@{player.user.username}\n'
-        else:
-            text += f'{player.user.mention_markdown_v2()}\n'
-    text += '\nPlease approve you\'ll be attending the match\!'
-
-    context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2')
-
-
-def final_reminder(context):
-    """Final reminder for players to approve their attendance"""
-    if all(player.approved for player in playing):
-        return
-
-    text = ''
-    playing_yet_to_approve = [player for player in playing
-                              if playing.index(player) < LIST_MAX_SIZE and not player.approved]
-    if playing_yet_to_approve:
-        text += f'{ALARM_EMOJI_CODE}  It\'s 15:00 on matchday  {ALARM_EMOJI_CODE}\n\n' \
-               f'This is a final reminder for\n\n'
-        for player in playing_yet_to_approve:
-            if player.user.id == FAKE_USER_ID:
-                text += f'\@{player.user.username}\n'
-            else:
-                text += f'{player.user.mention_markdown_v2()}\n'
-        text += f'\nPlease approve you\'ll be attending the match\!\n' \
-                f'{NO_ENTRY_EMOJI_CODE}  *If you will not approve your attendance in the next hour, ' \
-                f'you\'ll lose your place on the playing list\!*  {NO_ENTRY_EMOJI_CODE}'
-
-    if len(playing) > LIST_MAX_SIZE:        # waiting list is not empty
-        waiting_yet_to_approve = [player for player in playing
-                                  if playing.index(player) >= LIST_MAX_SIZE and not player.approved]
-        if waiting_yet_to_approve:
-            if playing_yet_to_approve:
-                text += f'\n\nThis is also a kindly reminder for\n\n'
-            else:
-                text += f'{ALARM_EMOJI_CODE}  It\'s 16:00 on matchday  {ALARM_EMOJI_CODE}\n\n' \
-                        f'This is a kindly reminder for\n\n'
-            for player in waiting_yet_to_approve:
-                if player.user.id == FAKE_USER_ID:
-                    text += f'\@{player.user.username}\n'
-                else:
-                    text += f'{player.user.mention_markdown_v2()}\n'
-            text += f'\n*It is advisable to approve your attendance\!*\nWhen promoting players from ' \
-                    f'the waiting list, the bot will prioritize players who\'ve approved their attendance\!'
-
-    if text:
-        context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2')
-
-
-def remove_non_attenders(context):
-    """Remove players on the playing list who didn't approve their attendance in time
-
-    Such players will be replaced with players on the waiting list (preferably, ones who've approved) if there are any.
-    Move the non-attenders to the back of the waiting list"""
-    if all(player.approved for player in playing):
-        return
-
-    yet_to_approve = [player for player in playing if playing.index(player) < LIST_MAX_SIZE and not player.approved]
-    for player in yet_to_approve:
-        if player.liable:
-            continue
-        if player.user.id == FAKE_USER_ID:
-            text = f'\@{player.user.username}, '
-        else:
-            text = f'{player.user.mention_markdown_v2()}, '
-        text += f'the bot removed you from the playing list for failing to approve your attendance in time\.\n\n'
-
-        # prioritizing players on the waiting list who've already approved their attendance
-        first_in_line = next((player_waiting for player_waiting in playing
-                              if playing.index(player_waiting) >= LIST_MAX_SIZE and player_waiting.approved),
-                             playing[LIST_MAX_SIZE] if len(playing) > LIST_MAX_SIZE else None)
-
-        playing.remove(player)
-        if first_in_line is not None:       # waiting list is not empty
-            if first_in_line.user.id == FAKE_USER_ID:
-                text += f'Congratulations \@{first_in_line.user.username}, you\'ve made the playing list\!'
-            else:
-                text += f'Congratulations {first_in_line.user.mention_markdown_v2()}, you\'ve made the playing list\!'
-            if not first_in_line.approved:
-                text += f'\nPlease approve you\'ll be attending the match\!'
-            playing.remove(first_in_line)
-            playing.insert(LIST_MAX_SIZE - 1, first_in_line)
-
-        context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2')
-
-
-def print_lists(context):
-    """Print both playing and waiting lists"""
-    if not playing:     # playing list is empty. Therefore, no need to print it.
-        return
-    text = f'{POINTING_DOWN_EMOJI_CODE}  Current state of the list  {POINTING_DOWN_EMOJI_CODE}\n\n'
-    text += get_lists()
-    if context.job.context:
-        text += f'\n\n{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}' \
-                f'\nDon\'t forget to bring your training bib\!\n' \
-                f'{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}'
-    context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2')
-
-
-def list_cleanup(context):
-    """Clear the playing list"""
-    if not playing:     # playing list is empty. Therefore, no need to clear it.
-        return
-    text = f'{CLOCK_EMOJI_CODE}  It\'s time for the bot\'s scheduled cleanup\.\.\.  {CLOCK_EMOJI_CODE}\n\n'
-    playing.clear()
-    invited.clear()
-    asked.clear()
-    try:
-        db_connection = sql_database.get_connection()
-        with db_connection.cursor() as cur:
-            cur.execute("DELETE FROM PLAYING")  # delete current tables
-            cur.execute("DELETE FROM INVITED")
-            cur.execute("DELETE FROM ASKED")
-        db_connection.commit()
-    except OperationalError as err:
-        logger.error(f"Operational error during cleanup: {err}")
-        sql_database.restart_connection()
-    except DatabaseError as err:
-        logger.error(f"Database error during cleanup: {err}")
-        db_connection.rollback()
-    text += 'List was cleared by the bot\!'
-    context.bot.send_message(chat_id=context.job.context, text=text, parse_mode='MarkdownV2')
-
-
-def check_accepted(context):
-    """Check if user has accepted the administrator's invitation"""
-    username = context.job.context
-    if username not in invited:
-        return
-
-    fake_user = User(id=FAKE_USER_ID, first_name='Reserved for', is_bot=False, last_name=username, username=username)
-    fake_player = TechnionFCPlayer(fake_user)
-    index = playing.index(fake_player)
-
-    text = f'Hi @{username}, timeframe for accepting the admin\'s invitation has passed!\n' \
-           f'Please contact an admin to get re-invited.'
-    context.bot.send_message(TELEGRAM_CHAT_ID, text)
-
-    invited.remove(username)
-    remove_player_from_list(context, index, fake_player)
-
-# endregion
-
-# region HELPER FUNCTIONS
-
-
-def valid_command_usage(update, context, user, privilege, publicity, command):
-    """Check for proper command usage
-
-    For example, check if a command that meant to be sent privately was sent publicly.
-    """
-    if not is_group_member(update, context, user):
-        return False
-
-    if privilege == 'admin' and not is_group_admin(update, context, user):
-        update.message.reply_text(f'Hi {user.full_name},\n'
-                                  f'you\'re not an admin, and therefore cannot use the /{command} command!')
-        return False
-
-    if publicity == 'private' and str(update.message.chat.id) == TELEGRAM_CHAT_ID:
-        update.message.reply_text(get_command_in_public_warning(user, command))
-        return False
-
-    if publicity == 'public' and str(update.message.chat.id) != TELEGRAM_CHAT_ID:
-        update.message.reply_text(get_command_in_private_warning(user, command))
-        return False
-
-    return True
-
-
-def is_group_member(update, context, user):
-    """Check if user is a group member"""
-    try:
-        chat_member = context.bot.get_chat_member(TELEGRAM_CHAT_ID, user.id)
-        if chat_member.status in ('left', 'kicked'):
-            update.message.reply_text(f'Hi {user.full_name},\n'
-                                      f'you are not a part of the Technion FC group anymore...\n\n'
-                                      f'To rejoin our group, please use {TELEGRAM_GROUP_INVITE_LINK}')
-            return False
-        return True
-    except TelegramError:
-        update.message.reply_text(f'Hi {user.full_name},\n'
-                                  f'you are not a part of the Technion FC group...\n\n'
-                                  f'To join our group, please use {TELEGRAM_GROUP_INVITE_LINK}')
-        return False
-
-def is_group_admin(update, context, user):
-    """Check if user is a group admin"""
-    try:
-        chat_member = context.bot.get_chat_member(TELEGRAM_CHAT_ID, user.id)
-        if chat_member.status in ('creator', 'administrator'):
-            return True
-        return False
-    except TelegramError:
-        update.message.reply_text(f'Hi {user.full_name},\n'
-                                  f'you are not a part of the Technion FC group...\n\n'
-                                  f'To join our group, please use {TELEGRAM_GROUP_INVITE_LINK}')
-        return False
-
-def user_full_name_is_valid(user):
-    """Check if user's full name is valid"""
-    if len(user.first_name) <= 1 or user.last_name is None or len(user.last_name) <= 1:
-        return False
-
-    regex = re.compile('[.,@_\-!#$%^&*()<>?/\|}{~:0123456789]')
-    if regex.search(user.full_name) is not None:
-        return False
-
-    return True
-
-
-def get_command_in_public_warning(user, command):
-    """Return a warning message for users who publicly send a command that should be sent in private"""
-    return f'Hi {user.first_name},\n'\
-           f'Please send the /{command} command using the bot\'s private chat @ https://t.me/FCTechnionBot.\n\n'\
-           f'If you have any questions, feel free to ask :)'
-
-
-def get_command_in_private_warning(user, command):
-    """Return a warning message for users who privately send a command that should be sent in public"""
-    return f'Hi {user.first_name},\n'\
-           f'Please send the /{command} command using the group public chat!\n\n'\
-           f'If you have any questions, feel free to ask :)'
-
-
-def get_lists():
-    """Return playing and waiting lists"""
-    day = datetime.now(tz=timezone('Asia/Jerusalem')).weekday()
-    if 1 <= day <= 3:  # Tuesday - Thursday
-        text = f'{CALENDAR_EMOJI_CODE}  *Thursday 20:30*  {CALENDAR_EMOJI_CODE}\n\n'
-    else:  # Friday - Monday
-        text = f'{CALENDAR_EMOJI_CODE}  *Monday 20:30*  {CALENDAR_EMOJI_CODE}\n\n'
-
-    waiting_flag = False
-    text += f'{STOPWATCH_EMOJI_CODE}{STOPWATCH_EMOJI_CODE}  Playing list  ' \
-            f'{STOPWATCH_EMOJI_CODE}{STOPWATCH_EMOJI_CODE}\n\n'
-
-    for player in playing:
-        index = playing.index(player)
-        if index >= LIST_MAX_SIZE and not waiting_flag:
-            text += f'\n{HOURGLASS_EMOJI_CODE}{HOURGLASS_EMOJI_CODE}  Waiting list  ' \
-                    f'{HOURGLASS_EMOJI_CODE}{HOURGLASS_EMOJI_CODE}\n\n'
-            waiting_flag = True
-        if not waiting_flag:
-            text += f'{index + 1}\. {player.user.full_name}'
-        else:
-            text += f'{index + 1 - LIST_MAX_SIZE}\. {player.user.full_name}'
-        if player.liable:
-            text += f'  {POINTING_EMOJI_CODE}'
-        if player.approved:
-            text += f'  {CHECK_MARK_EMOJI_CODE}'
-        if player.match_ball:
-            text += f'  {FOOTBALL_EMOJI_CODE}'
-        text += '\n'
-    return text
-
-
-def remove_player_from_list(context, index, player):
-    """Remove a player from a given index on the list"""
-    day = datetime.now(tz=timezone('Asia/Jerusalem')).weekday()
-    current_time = datetime.now(tz=timezone('Asia/Jerusalem'))
-    if day in MATCHDAYS and current_time.hour >= 17:
-        # prioritizing players on the waiting list who've already approved their attendance
-        first_in_line = next((player_waiting for player_waiting in playing
-                              if playing.index(player_waiting) >= LIST_MAX_SIZE and player_waiting.approved),
-                             playing[LIST_MAX_SIZE] if len(playing) > LIST_MAX_SIZE else None)
-    else:
-        first_in_line = playing[LIST_MAX_SIZE] if len(playing) > LIST_MAX_SIZE else None
-
-    playing.remove(player)
-    if index < LIST_MAX_SIZE and first_in_line is not None:
-        playing.remove(first_in_line)
-        playing.insert(LIST_MAX_SIZE - 1, first_in_line)  # first in line becomes last on the list
-        if first_in_line.user.id != FAKE_USER_ID:
-            context.bot.send_message(first_in_line.user.id, f'Congratulations {first_in_line.user.full_name}, '
-                                                            f'you\'re on the playing list!')
-        else:
-            context.bot.send_message(TELEGRAM_CHAT_ID, f'Congratulations @{first_in_line.user.username}, '
-                                                       f'you\'re onr the playing list!')
-
-
-def addUser_by_username(user, index, update, context):
-    """Add player to the playing list using tagged username"""
-    tagged_username = context.args[0]
-    username = tagged_username.replace('@', '')
-
-    if username in invited:
-        return update.message.reply_text(f'Hi {user.full_name},\n'
-                                         f'Bot is currently waiting for {username} to accept your invitation!')
-
-    fake_user = User(id=FAKE_USER_ID, first_name='Reserved for', is_bot=False, last_name=username, username=username)
-    fake_player = TechnionFCPlayer(fake_user)
-    text = f'Hi @{username},\n{user.full_name} is trying to add you to the playing list\n\n'
-
-    invited.append(username)
-    if index is not None:
-        playing.insert(index, fake_player)
-    else:
-        playing.append(fake_player)
-
-    text += f'Your spot is reserved for the next 24 hours.\n' \
-            f'Please respond to this message with /accept'
-
-    context.job_queue.run_once(check_accepted, ACCEPT_TIMEFRAME, context=username)
-    return update.message.reply_text(text)
-
-
-def get_player_from_entity_id(update, context, entity_id):
-    """Get player (and player name) using message entity id"""
-    tagged_user = update.message.entities[entity_id].user   # second message entity is a TEXT_MENTION or a MENTION
-    if tagged_user is None:                                 # if message entity is a MENTION
-        tagged_username = context.args[entity_id-1]
-        username = tagged_username.replace('@', '')
-        fake_user = User(FAKE_USER_ID, first_name='', is_bot=False, username=username)
-        player = TechnionFCPlayer(fake_user)
-        player_name = username
-    else:                                                   # message entity is a TEXT_MENTION
-        player = TechnionFCPlayer(tagged_user)
-        player_name = tagged_user.full_name
-    return player, player_name
-
-
-def error(update, context):
-    """Log Errors caused by Updates."""
-    logger.warning('Update "%s" caused error "%s"', update, context.error)
-
-
-def restore_from_database():
-    """Restore playing list from database back up"""
-    try:
-        db_connection = sql_database.get_connection()
-        with db_connection.cursor() as cur:
-            cur.execute("SELECT * FROM PLAYING")
-            players_data = cur.fetchall()
-            cur.execute("SELECT * FROM INVITED")
-            invited_data = cur.fetchall()
-            cur.execute("SELECT * FROM ASKED")
-            asked_data = cur.fetchall()
-    except OperationalError as err:
-        logger.error(f"Operational error during restore: {err}")
-        sql_database.restart_connection()
-        return
-    except DatabaseError as err:
-        logger.error(f"Database error during restore: {err}")
-        db_connection.rollback()
-        return
-
-    for player_data in players_data:
-        (user_id, user_first_name, user_last_name, user_username,
-         player_liable, player_approved, player_match_ball) = player_data
-        user = User(user_id, first_name=user_first_name, is_bot=False, last_name=user_last_name, username=user_username)
-        player = TechnionFCPlayer(user, player_liable, player_approved, player_match_ball)
-        playing.append(player)
-
-    for invited_tuple in invited_data:
-        (invited_player,) = invited_tuple
-        invited.append(invited_player)
-
-    for asked_tuple in asked_data:
-        (asked_player,) = asked_tuple
-        asked.append(asked_player)
-
-# endregion
-
-
-def main():
-    """The official Technion FC Telegram bot"""
-
-    updater = Updater(TELEGRAM_BOT_TOKEN, use_context=True, request_kwargs={'read_timeout': 60, 'connect_timeout': 60})
-
-    # Get the dispatcher to register handlers
-    dp = updater.dispatcher
-
-    # on different commands - answer in Telegram
-    dp.add_handler(CommandHandler("start", start_command, pass_job_queue=True))
-    dp.add_handler(CommandHandler("help", help_command))
-    dp.add_handler(CommandHandler("create", create_command))
-    dp.add_handler(CommandHandler("add", add_command))
-    dp.add_handler(CommandHandler("remove", remove_command))
-    dp.add_handler(CommandHandler("liable", liable_command))
-    dp.add_handler(CommandHandler("accept", accept_command))
-    dp.add_handler(CommandHandler("approve", approve_command))
-    dp.add_handler(CommandHandler("assume", assume_command))
-    dp.add_handler(CommandHandler("ball", ball_command))
-    dp.add_handler(CommandHandler("print", print_command))
-    dp.add_handler(CommandHandler("shuffle", shuffle_command))
-    dp.add_handler(CommandHandler("rules", rules_command))
-    dp.add_handler(CommandHandler("schedule", schedule_command))
-    dp.add_handler(CommandHandler("addUser", addUser_command))
-    dp.add_handler(CommandHandler("addExternal", addExternal_command))
-    dp.add_handler(CommandHandler("removeUser", removeUser_command))
-    dp.add_handler(CommandHandler("createList", createList_command))
-    dp.add_handler(CommandHandler("clearAll", clearAll_command))
-    dp.add_handler(CommandHandler("transferLiability", transferLiability_command))
-    dp.add_handler(CommandHandler("liableUser", liableUser_command))
-
-    # log all errors
-    dp.add_error_handler(error)
-
-    # restore data from back up
-    restore_from_database()
-
-    # run backup_to_database at backup time intervals
-    dp.job_queue.run_repeating(backup_to_database, BACKUP_INTERVAL)
-
-    # run kindly_reminder every matchday @ 12:30
-    dp.job_queue.run_daily(kindly_reminder,
-                           time(hour=12, minute=30, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-
-    # run final_reminder every matchday @ 15:00
-    dp.job_queue.run_daily(final_reminder,
-                           time(hour=15, minute=0, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-
-    # run remove_non_attenders every matchday @ 16:00, 16:30, 17:00, 17:30, 18:00
-    dp.job_queue.run_daily(remove_non_attenders,
-                           time(hour=16, minute=0, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(remove_non_attenders,
-                           time(hour=16, minute=30, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(remove_non_attenders,
-                           time(hour=17, minute=0, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(remove_non_attenders,
-                           time(hour=17, minute=30, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(remove_non_attenders,
-                           time(hour=18, minute=0, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-
-    # run print_list every matchday @ 11:15, 13:15, 15:15, 17:15, 18:15, and 19:15
-    dp.job_queue.run_daily(print_lists,
-                           time(hour=11, minute=15, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(print_lists,
-                           time(hour=13, minute=15, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(print_lists,
-                           time(hour=15, minute=15, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(print_lists,
-                           time(hour=17, minute=15, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(print_lists,
-                           time(hour=18, minute=15, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS)
-    dp.job_queue.run_daily(print_lists,
-                           time(hour=19, minute=15, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS,
-                           context=True)
-
-    # run clear_list every matchday @ 23:59:59
-    dp.job_queue.run_daily(list_cleanup,
-                           time(hour=23, minute=59, second=59, tzinfo=timezone('Asia/Jerusalem')),
-                           days=MATCHDAYS,
-                           context=TELEGRAM_CHAT_ID)
-
-    # Start the Bot
-    # updater.start_polling()
-    updater.start_webhook(listen="0.0.0.0",
-                          port=int(PORT),
-                          url_path=TELEGRAM_BOT_TOKEN,
-                          webhook_url='https://technionfc-telegram-bot.herokuapp.com/' + TELEGRAM_BOT_TOKEN)
-
-    # Run the bot until you press Ctrl-C or the process receives SIGINT,
-    # SIGTERM or SIGABRT. This should be used most of the time, since
-    # start_polling() is non-blocking and will stop the bot gracefully.
-    updater.idle()
-
-
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    main()
+import os
+import logging
+from time import perf_counter, sleep
+from signal import signal, SIGINT, SIGTERM, SIGABRT
+try:
+    from signal import SIGUSR1
+except ImportError:         # not available on Windows
+    SIGUSR1 = None
+from threading import Event, Thread
+from functools import wraps
+from contextlib import contextmanager
+from tempfile import TemporaryDirectory
+from datetime import datetime, date, time, timedelta
+from pytz import timezone
+from itertools import islice
+from collections import deque, Counter
+from psycopg import OperationalError, DatabaseError, Error
+
+from telegram import User, Update, TelegramError, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Updater, ExtBot, CommandHandler, CallbackQueryHandler, TypeHandler, DispatcherHandlerStop
+
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_GROUP_INVITE_LINK, PORT, TELEGRAM_API_BASE_URL, \
+    DM_REMINDERS, DM_REMINDER_WORKERS, DM_REMINDER_RATE, RATE_LIMITS, RATE_LIMIT_DEFAULT, RATE_LIMIT_ADMIN, \
+    RATE_LIMIT_POLICY, SHARED_STATE, LEADER_LOCK_KEY, ROSTER_ENDPOINT, ROSTER_LONG_POLL_TIMEOUT, ANNOUNCEMENT_WINDOW, \
+    LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE, PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS, \
+    PROFILE_DIRECTORY, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, PLAYER_DIRECTORY_FLUSH_INTERVAL, WAITING_LIST_PRIORITY, \
+    CHANGE_NOTIFICATIONS, RECORD_TRAFFIC_PATH, RECORD_TRAFFIC_SALT
+from postgres import PostgreSqlDb
+from TechnionFCPlayer import TechnionFCPlayer
+from direct_messages import DirectMessageFanOut
+from announcements import AnnouncementBatcher
+from clock import Clock, ISRAEL_TIMEZONE
+from ratelimit import CommandRateLimiter, parse_limits, parse_limit
+from shared_state import SharedRoster, LeaderLease, DeferringRequest
+from db_writer import DatabaseWriter
+from invitations import InvitationRegistry
+from roster_feed import RosterFeed
+from export import export_tables
+from diagnostics import diagnose
+from audit import AuditLog, fetch_page
+from player_directory import PlayerDirectory
+from player_index import PlayerIndex
+from fairness import FairnessLedger
+from teams import TeamRules, split_teams, KINDS
+from notifications import ChangeFeed
+from traffic import TrafficRecorder
+from matches import Match, MatchBook, match_key, next_weekday, parse_match_date
+import promotion
+from structured_logging import setup_logging
+
+# Enable logging, written by a background thread
+log_listener = setup_logging(LOG_LEVEL, LOG_LEVELS, LOG_FORMAT == 'json', LOG_DEBUG_SAMPLE_RATE)
+
+logger = logging.getLogger(__name__)
+
+# SQL Database
+sql_database = PostgreSqlDb()
+db_connection = sql_database.get_connection()
+
+# Tells other bot processes which cached rows this one wrote, and patches its caches with theirs
+change_feed = ChangeFeed(CHANGE_NOTIFICATIONS)
+
+# Runs database writes from handlers and jobs in the background
+db_writer = DatabaseWriter(sql_database, change_feed)
+
+# Durable trace of admin and roster actions, written in batches by the database writer
+audit_log = AuditLog(db_writer, AUDIT_BATCH_SIZE)
+
+# Constants
+MATCHDAYS = (0, 3)                  # regular matchdays are Monday and Thursday
+EVERY_DAY = tuple(range(7))         # matchday jobs run every day, for the matches held that day
+LIST_MAX_SIZE = 15                  # there are 3 teams, each team has 5 players (set by pitch size)
+BACKUP_INTERVAL = 600               # backup interval set to 10 minutes
+ACCEPT_TIMEFRAME = 86400            # accept timeframe is set to 24 hours
+EXPIRY_CHECK_INTERVAL = 60         # expired invitations are checked for every minute
+SHUTDOWN_TIMEOUT = 25               # Heroku kills the dyno 30 seconds after asking it to stop
+FAKE_USER_ID = -1
+ADMIN_PRIVILEGE = 'admin'
+MEMBER_PRIVILEGE = 'member'
+PUBLIC_COMMAND = 'public'
+PRIVATE_COMMAND = 'private'
+LIST_MESSAGE = 'list'
+REMINDER_MESSAGE = 'reminder'
+CONFIRM_REMOVAL = 'confirm'
+CANCEL_REMOVAL = 'cancel'
+
+# Emojis
+ALARM_EMOJI_CODE = '\U000023F0'
+BIB_EMOJI_CODE = '\U0001F3BD'
+CALENDAR_EMOJI_CODE = '\U0001F4C5'
+CHECK_MARK_EMOJI_CODE = '\U00002705'
+CIRCLE_BLUE_EMOJI_CODE = '\U0001F535'
+CIRCLE_GREEN_EMOJI_CODE = '\U0001F7E2'
+CIRCLE_RED_EMOJI_CODE = '\U0001F534'
+CLIPBOARD_EMOJI_CODE = '\U0001F4CB'
+CLOCK_EMOJI_CODE = '\U0001F55A'
+HOURGLASS_EMOJI_CODE = '\U000023F3'
+FOOTBALL_EMOJI_CODE = '\U000026BD'
+NO_ENTRY_EMOJI_CODE = '\U000026D4'
+OK_SIGN_EMOJI_CODE = '\U0001F44C'
+POINTING_EMOJI_CODE = '\U0000261D'
+POINTING_DOWN_EMOJI_CODE = '\U0001F447'
+SCROLL_EMOJI_CODE = '\U0001F4DC'
+STOPWATCH_EMOJI_CODE = '\U000023F1'
+
+# Matches whose lists are open, each with its own playing list, invited users and asked users
+matches = MatchBook()
+
+# Roster of the match the running handler or job works on (see active_match). Handlers and jobs run one at a time
+current_match = None
+
+# Playing list. This data structure functions as a waiting list as well
+playing = deque()
+
+# Users to be added by admins, keyed by username and linked to their reserved spot on the playing list
+invited = InvitationRegistry()
+
+# Possible users to assume match liability, keyed by username (or user id)
+asked = InvitationRegistry()
+
+# Known players by username and full name, resolving plain-text names and mentions in admin commands
+player_index = PlayerIndex()
+
+# Latest profiles of the users the bot sees, with their cached name validation, written behind to PLAYERS
+player_directory = PlayerDirectory(db_writer, player_index)
+
+# Players' bumps, attendance and approval history, scoring their waiting list priority when promoting by fairness
+fairness_ledger = FairnessLedger(db_writer)
+
+# Goalkeepers and pairs kept apart or together when shuffling teams, along with every player's last match's team
+team_rules = TeamRules(db_writer)
+
+# Time source for all schedule logic. Replaced by a simulated clock when simulating the bot's week
+clock = Clock()
+
+# Sends personal reminders when direct message reminders are enabled
+direct_messages = DirectMessageFanOut(DM_REMINDER_WORKERS, DM_REMINDER_RATE)
+
+def get_traffic_recorder():
+    """Return the traffic recorder, or None if recording is off or its salt is too short to keep players anonymous"""
+    if not RECORD_TRAFFIC_PATH:
+        return None
+    try:
+        return TrafficRecorder(RECORD_TRAFFIC_PATH, RECORD_TRAFFIC_SALT, TELEGRAM_CHAT_ID)
+    except ValueError as err:
+        logger.error(f"Not recording traffic, RECORD_TRAFFIC_SALT is not set right: {err}")
+        return None
+
+
+# Anonymized log of the updates received and the jobs run, replayed by replay.py (opt-in)
+traffic_recorder = get_traffic_recorder()
+
+# Merges group announcements made in quick succession (e.g. by sweeps and bulk edits) into a single message
+announcements = AnnouncementBatcher(ANNOUNCEMENT_WINDOW)
+
+# Per user and command token buckets, checked before any command handler runs. Admin list commands get the admin limit,
+# unless RATE_LIMITS sets their own
+ADMIN_LIST_COMMANDS = ('addUser', 'addExternal', 'removeUser', 'createList', 'clearAll', 'transferLiability',
+                       'liableUser', 'addUsers', 'removeUsers', 'approveUsers', 'unapproveUsers', 'reorderWaiting',
+                       'addMatch', 'teamRule')
+rate_limits = dict.fromkeys((command.lower() for command in ADMIN_LIST_COMMANDS), parse_limit(RATE_LIMIT_ADMIN))
+rate_limits.update(parse_limits(RATE_LIMITS))
+rate_limiter = CommandRateLimiter(rate_limits, parse_limit(RATE_LIMIT_DEFAULT), RATE_LIMIT_POLICY)
+throttled_logged = Counter()
+
+
+
+def roster_snapshot():
+    """Return the open matches with their playing lists, invited users and asked users as a JSON serializable dict"""
+    return {'matches': [{'id': match.match_id, 'date': match.date.isoformat(), 'kickoff': match.kickoff.isoformat(),
+                         'pitch': match.pitch, 'pinned': match.pinned,
+                         'playing': [player.to_dict() for player in match.playing],
+                         'invited': match.invited.to_list(), 'asked': match.asked.to_list()}
+                        for match in matches]}
+
+
+def restore_roster_snapshot(state):
+    """Replace the open matches with the ones in a roster snapshot"""
+    matches.clear()
+    for match_state in state.get('matches', ()):
+        match = Match(date.fromisoformat(match_state['date']), time.fromisoformat(match_state['kickoff']),
+                      match_state['pitch'], match_state['pinned'])
+        restore_match_roster(match, match_state)
+        matches.add(match)
+    if 'playing' in state:      # a single list shared before there were several matches
+        match = Match(get_next_matchday(clock.now().date()))
+        restore_match_roster(match, state)
+        matches.add(match)
+
+
+def restore_match_roster(match, state):
+    """Replace the playing list, invited users and asked users of a match with the ones in its snapshot"""
+    match.playing.clear()
+    match.playing.extend(TechnionFCPlayer.from_dict(player) for player in state['playing'])
+    players = {player.user.username: player for player in match.playing if player.user.id == FAKE_USER_ID}
+    match.invited.restore(state['invited'], players)
+    players = {get_user_id_or_name(player.user): player for player in match.playing if player.user.id != FAKE_USER_ID}
+    match.asked.restore(state['asked'], players)
+
+
+def get_public_roster(state):
+    """Return the open matches of a roster snapshot as served by the roster endpoint (no user ids)
+
+    The next match's lists are also kept at the top level, for consumers written before there were several matches"""
+    public_matches = [dict({key: match_state[key] for key in ('id', 'date', 'kickoff', 'pitch')},
+                           **get_public_lists(match_state))
+                      for match_state in state['matches']]
+    next_lists = get_public_lists(state['matches'][0]) if state['matches'] else {'playing': [], 'waiting': []}
+    return dict(next_lists, matches=public_matches)
+
+
+def get_public_lists(match_state):
+    """Return the playing and waiting lists of a match's snapshot as served by the roster endpoint"""
+    players = []
+    for player in match_state['playing']:
+        user = player['user']
+        reserved = user['id'] == FAKE_USER_ID
+        full_name = ' '.join(filter(None, (user['first_name'], user.get('last_name'))))
+        players.append({'name': None if reserved else full_name,
+                        'username': user.get('username') or None, 'reserved': reserved, 'liable': player['liable'],
+                        'approved': player['approved'], 'match_ball': player['match_ball']})
+    return {'playing': players[:LIST_MAX_SIZE], 'waiting': players[LIST_MAX_SIZE:]}
+
+
+def reply_conflict(update, *args):
+    """Tell a user their command or button press was dropped, as other bot processes kept changing the list"""
+    if not isinstance(update, Update):      # a job, which runs again on its next schedule
+        return
+    text = 'The list changed while handling your request, please try again!'
+    if update.callback_query is not None:
+        update.callback_query.answer(text)
+    elif update.effective_message is not None:
+        update.effective_message.reply_text(text)
+
+
+# JSON rendering of the roster served next to the webhook, re-rendered whenever the roster changes
+roster_feed = RosterFeed()
+
+# Roster shared by all bot processes when running several of them, and the lease deciding which one runs the jobs
+shared_roster = SharedRoster(sql_database, roster_snapshot, restore_roster_snapshot, SHARED_STATE,
+                             on_change=lambda state, version: roster_feed.publish(get_public_roster(state), version),
+                             feed=change_feed, on_conflict=reply_conflict)
+leader_lease = LeaderLease(sql_database, LEADER_LOCK_KEY, SHARED_STATE)
+
+# Side effects outside the roster, held back until the changes of the handler or job making them are committed (the
+# Bot API calls are held back by the updater's DeferringRequest)
+db_writer.submit = shared_roster.deferred(db_writer.submit)
+audit_log.record = shared_roster.deferred(audit_log.record)
+audit_log.flush = shared_roster.deferred(audit_log.flush)
+announcements.announce = shared_roster.deferred(announcements.announce)
+for method in ('record_match', 'record_removal', 'record_approval', 'flush'):
+    setattr(fairness_ledger, method, shared_roster.deferred(getattr(fairness_ledger, method)))
+
+
+def leader_job(callback):
+    """Wrap a job callback so it runs only on the leader, on the latest roster"""
+    return leader_lease.leader_only(shared_roster.transaction(callback))
+
+
+@contextmanager
+def active_match(match):
+    """Point playing, invited and asked at the roster of a match while a handler or job works on it
+
+    Afterwards, a match whose list was started is added to the open matches, and one whose list was emptied (unless an
+    admin opened it) is closed."""
+    global current_match, playing, invited, asked
+    previous = current_match, playing, invited, asked
+    current_match, playing, invited, asked = match, match.playing, match.invited, match.asked
+    try:
+        yield match
+    finally:
+        if match.is_empty() and not match.pinned:
+            matches.remove(match)
+        elif match in matches:
+            matches.reindex(match)
+        else:
+            matches.add(match)
+        current_match, playing, invited, asked = previous
+
+
+def match_handler(callback):
+    """Wrap a handler callback so it runs on the roster of the match its update refers to"""
+    @wraps(callback)
+    def wrapper(update, context):
+        match = select_match(update, context, creating=callback in (create_command, createList_command))
+        if match is None:
+            text = 'This list is closed, or there is no such match! Please use /matches to list the open matches'
+            if update.callback_query is not None:
+                return update.callback_query.answer(text)
+            return update.message.reply_text(text)
+        with active_match(match):
+            return callback(update, context)
+    return wrapper
+
+
+def log_request(callback):
+    """Wrap a handler callback so each command or button press is logged with its user and latency"""
+    @wraps(callback)
+    def wrapper(update, context):
+        started = perf_counter()
+        try:
+            return callback(update, context)
+        finally:
+            fields = get_request_fields(update)
+            fields['latency_ms'] = round((perf_counter() - started) * 1000, 2)
+            logger.info(f"Handled /{fields['command']} in {fields['latency_ms']} ms", extra=fields)
+    return wrapper
+
+
+def match_job(callback, held_today=True):
+    """Wrap a job callback so it runs once for each match held today (or for each open match), on its own roster"""
+    @wraps(callback)
+    def wrapper(context):
+        today = clock.now().date()
+        for match in (matches.on(today) if held_today else list(matches)):
+            with active_match(match):
+                callback(context)
+    return wrapper
+
+# region ADMIN COMMANDS
+
+
+def start_command(update, context):
+    """Send bot welcome message and add jobs to the context's JobQueue"""
+    user = update.message.from_user
+    message = 'TechnionFC Bot has started operating\.\.\.\n\nPlease use the /help command to list your options'
+
+    user.send_message(message, parse_mode='MarkdownV2')
+
+
+def addUser_command(update, context):
+    """Add tagged user to the playing list
+
+    When provided with an index, place the tagged user accordingly"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'addUser'):
+        return
+
+    # a known player may be named in plain text, optionally followed by the list index
+    if len(update.message.entities) == 1 and context.args:
+        name_args = context.args[:-1] if len(context.args) > 1 and context.args[-1].isdigit() else context.args
+        tagged_user = player_index.resolve(' '.join(name_args))
+        if tagged_user is None:
+            return update.message.reply_text(get_unknown_name_text(user, ' '.join(name_args)))
+        index = int(context.args[-1]) - 1 if len(name_args) < len(context.args) else None
+        return addUser_by_user(user, tagged_user, index, update)
+
+    # otherwise, message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
+    if len(update.message.entities) != 2:
+        return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag the user you wish to add!')
+
+    tagged_user = update.message.entities[1].user   # second message entity is a TEXT_MENTION or a MENTION
+
+    # in case admin wants to add a player in a specific place on the list, two arguments are provided.
+    index = None
+    if len(context.args) == 2:
+        index_str = context.args[1]                 # second argument agreed to be said place on the list
+        try:
+            index = int(index_str) - 1              # decreased index to accommodate "natural" indexing
+        except ValueError:
+            return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag the user you wish '
+                                             f'to add first, and the list index second!')
+
+    if tagged_user is None:  # if second message entity is a MENTION
+        # mentions of known players add the player themselves rather than inviting the username
+        tagged_user = player_index.by_username(context.args[0])
+        if tagged_user is None:
+            return addUser_by_username(user, index, update, context)
+    return addUser_by_user(user, tagged_user, index, update)
+
+
+def addExternal_command(update, context):
+    """Add a non-group member to the playing list"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'addExternal'):
+        return
+
+    # message MUST have at least two arguments to be valid (Full names must include both first and last names)
+    if len(context.args) < 2:
+        return update.message.reply_text(f'Hi {user.full_name}, please provide the full name '
+                                         f'of the external player you wish to add!')
+
+    ext_player_first_name = context.args[0]
+    ext_player_last_name = ' '.join(str(arg) for arg in context.args[1:])
+    ext_player_full_name = f'{ext_player_first_name} {ext_player_last_name}'
+    ext_user = User(-int(round(datetime.now().timestamp())), first_name=ext_player_first_name, is_bot=False,
+                    last_name=ext_player_last_name)
+    ext_player = TechnionFCPlayer(ext_user, approved=True)
+
+    if ext_player in playing:
+        return update.message.reply_text(f'Hi {user.full_name}, {ext_player_full_name} is already on the playing list!')
+
+    playing.append(ext_player)
+    audit_log.record(user, 'addExternal', ext_player_full_name, current_match.match_id)
+    update.message.reply_text(f'External player named {ext_player_full_name} added to the playing list '
+                              f'by {user.full_name}!')
+
+
+def removeUser_command(update, context):
+    """Remove tagged user from the playing list"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'removeUser'):
+        return
+
+    if len(update.message.entities) == 1 and context.args:     # a known player named in plain text
+        player, player_name = get_player_from_name(' '.join(context.args))
+        if player is None:
+            return update.message.reply_text(get_unknown_name_text(user, player_name))
+    # otherwise, message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
+    elif len(update.message.entities) != 2:
+        return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag the user you wish to remove!')
+    else:
+        player, player_name = get_player_from_entity_id(update, context, entity_id=1)
+
+    if player not in playing:
+        return update.message.reply_text(f'Hi {user.full_name}, the player you wish to remove, '
+                                         f'{player_name}, is not listed...\n\n'
+                                         f'Please make sure to tag the correct user you wish to remove!')
+    index = playing.index(player)
+    if playing[index].liable:
+        return update.message.reply_text(f'Hi {user.full_name}, {player_name} is liable for the match. Therefore, '
+                                         f'you cannot remove him from the list until he ensures another player assumes '
+                                         f'match liability!')
+
+    # if the player hasn't accepted yet, he needs to be removed from invited too
+    invited.pop(playing[index].user.username)
+
+    audit_log.record(user, 'removeUser', player_name, current_match.match_id, {'user_id': player.user.id})
+    update.message.reply_text(f'{player_name} was removed from the playing list by {user.full_name}!')
+    remove_player_from_list(context, index, player)
+
+
+def createList_command(update, context):
+    """Build list with tagged users"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'createList'):
+        return
+
+    if len(context.args) != len(set(context.args)):         # not all entities are unique
+        return update.message.reply_text(f'Hi {user.full_name}, please make sure not to tag the same user twice!')
+
+    invalids = []
+    for entity in update.message.entities:                  # MENTION or TEXT_MENTION are types of MessageEntity
+        if entity.type not in ('mention', 'text_mention'):
+            continue
+
+        tagged_user = entity.user
+        if tagged_user is None:
+            continue
+        if not user_full_name_is_valid(tagged_user):
+            invalids.append(tagged_user)
+
+    if invalids:
+        text = f'Hi {user.full_name}, the following users have invalid telegram name:\n\n'
+        for invalid in invalids:
+            text += f'{invalid.full_name}\n'
+        text += f'\nPlease advise them to change it and then try again!'
+        return update.message.reply_text(text)
+
+    playing.clear()                                         # clearing both queues prior to population
+    invited.clear()
+    added, invited_usernames = [], []
+    for entity in update.message.entities[1:]:              # first MessageEntity is of type 'bot_command'
+        tagged_user = entity.user
+        if tagged_user is None:
+            index = update.message.entities.index(entity)
+            tagged_username = context.args[index - 1]       # argument index = entity index - 1
+            username = tagged_username.replace('@', '')
+            fake_user = User(FAKE_USER_ID, 'Reserved for', is_bot=False, last_name=username, username=username)
+            fake_player = TechnionFCPlayer(fake_user)
+            invited.add(username, fake_player, clock.now() + timedelta(seconds=ACCEPT_TIMEFRAME))
+            playing.append(fake_player)
+            invited_usernames.append(username)
+        else:
+            tagged_player = TechnionFCPlayer(tagged_user)
+            playing.append(tagged_player)
+            added.append(tagged_user.full_name)
+
+    # a single reply for the whole list
+    text = f'{user.full_name} has created a new playing list!\n\n'
+    if added:
+        text += f'Congratulations {", ".join(added)}, you were added to the playing list!\n\n'
+    if invited_usernames:
+        text += f'{" ".join(f"@{username}" for username in invited_usernames)}, your spots are reserved for the ' \
+                f'next 24 hours.\nPlease respond to this message with /accept'
+    audit_log.record(user, 'createList', ', '.join(get_player_name(player) for player in playing),
+                     current_match.match_id, {'players': len(playing)})
+    save_match(current_match)
+    update.message.reply_text(text.strip())
+
+
+def clearAll_command(update, context):
+    """Clear both playing and waiting lists"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'clearAll'):
+        return
+
+    audit_log.record(user, 'clearAll', None, current_match.match_id, {'players': len(playing), 'invited': len(invited)})
+    playing.clear()
+    invited.clear()
+    asked.clear()
+    current_match.pinned = False        # closing the list, even if an admin opened it
+    clear_database_tables(current_match)
+    return update.message.reply_text('Both lists were cleared by an admin')
+
+
+def transferLiability_command(update, context):
+    """Transfer match liability from one player to another"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'transferLiability'):
+        return
+
+    # message MUST have exactly three entities to be valid: BOT_COMMAND and two TEXT_MENTION or MENTION
+    if len(update.message.entities) != 3:
+        return update.message.reply_text(f'Hi {user.full_name}, please make sure to tag both users!')
+
+    liable_player, liable_player_name = get_player_from_entity_id(update, context, entity_id=1)
+    assuming_player, assuming_player_name = get_player_from_entity_id(update, context, entity_id=2)
+
+    for player, player_name in (liable_player, liable_player_name), (assuming_player, assuming_player_name):
+        if player not in playing:
+            return update.message.reply_text(f'Hi {user.full_name}, {player_name} is not listed...\n\n'
+                                             f'Please make sure to tag the correct users!')
+    index_liable = playing.index(liable_player)
+    if not playing[index_liable].liable:
+        return update.message.reply_text(f'Hi {user.full_name}, {liable_player_name} is not liable for the match. '
+                                         f'Please make sure to tag the correct users!')
+
+    index_assuming = playing.index(assuming_player)
+    playing[index_liable].liable = False
+    playing[index_assuming].liable = True
+    audit_log.record(user, 'transferLiability', assuming_player_name, current_match.match_id,
+                     {'from': liable_player_name})
+    text = f'{user.full_name} has transferred match liability from {liable_player_name} to {assuming_player_name}!'
+    update.message.reply_text(text)
+
+
+def liableUser_command(update, context):
+    """Grant match liability to a specific player"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'liableUser'):
+        return
+
+    # message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
+    if len(update.message.entities) != 2:
+        return update.message.reply_text(f'Hi {user.full_name}, '
+                                         f'please make sure to tag the user you wish to grant match liability to!')
+
+    liable_player, liable_player_name = get_player_from_entity_id(update, context, entity_id=1)
+
+    if liable_player not in playing:
+        return update.message.reply_text(f'Hi {user.full_name}, {liable_player_name} is not listed...\n\n'
+                                         f'Please make sure to tag the correct user!')
+
+    for player in playing:
+        if player.liable:
+            return update.message.reply_text(f'Hi {user.full_name}, '
+                                             f'{player.user.full_name} is already liable for the match...\n\n'
+                                             f'Please use the /transferLiability command to transfer match liability!')
+
+    index_liable = playing.index(liable_player)
+    playing[index_liable].liable = True
+    audit_log.record(user, 'liableUser', liable_player_name, current_match.match_id)
+    update.message.reply_text(f'{liable_player_name} is now liable for the match!')
+
+
+def removeUsers_command(update, context):
+    """Remove several tagged users from the playing list at once
+
+    Usage: /removeUsers @user1 @user2 ..."""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'removeUsers'):
+        return
+
+    targets = get_tagged_players(update)
+    problems = get_bulk_problems(targets)
+    for player, player_name, _ in targets:
+        if player not in playing:
+            problems.append(f'{player_name} is not listed')
+        elif playing[playing.index(player)].liable:
+            problems.append(f'{player_name} is liable for the match')
+    if problems:
+        return update.message.reply_text(get_bulk_problems_text(user, 'remove', problems))
+
+    removed = [playing[playing.index(player)] for player, _, _ in targets]
+    for player in removed:
+        invited.pop(player.user.username)       # players who haven't accepted yet are removed from invited too
+        audit_log.record(user, 'removeUser', get_player_name(player), current_match.match_id,
+                         {'user_id': player.user.id})
+    remove_players_from_list(context, removed)
+    save_match(current_match)
+    update.message.reply_text(f'{", ".join(player_name for _, player_name, _ in targets)} '
+                              f'{"were" if len(targets) > 1 else "was"} removed from the playing list '
+                              f'by {user.full_name}!')
+
+
+def addUsers_command(update, context):
+    """Add several tagged users to the playing list at once, each optionally followed by its place on the list
+
+    Usage: /addUsers @user1 [index] @user2 [index] ..."""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'addUsers'):
+        return
+
+    targets = get_tagged_players(update)
+    problems = get_bulk_problems(targets)
+    placed, appended = [], []
+    for player, player_name, following in targets:
+        place = following.split()[0] if following else None
+        if player in playing:
+            problems.append(f'{player_name} is already on the playing list')
+        elif player.user.id == FAKE_USER_ID and player.user.username in invited:
+            problems.append(f'the bot is already waiting for {player_name} to accept an invitation')
+        elif player.user.id != FAKE_USER_ID and not user_full_name_is_valid(player.user):
+            problems.append(f'{player_name} has an invalid telegram name')
+        if place is None or place.startswith('#'):
+            appended.append(player)
+        elif not place.isdigit() or not 1 <= int(place) <= len(playing) + len(targets):
+            problems.append(f'{place} is not a place on the list')
+        else:
+            placed.append((int(place), player))
+    if problems:
+        return update.message.reply_text(get_bulk_problems_text(user, 'add', problems))
+
+    # inserting by ascending place leaves every player at the place asked for
+    for place, player in sorted(placed, key=lambda pair: pair[0]):
+        playing.insert(place - 1, player)
+    playing.extend(appended)
+    invited_usernames = []
+    for player, player_name, _ in targets:
+        if player.user.id == FAKE_USER_ID:
+            invited.add(player.user.username, player, clock.now() + timedelta(seconds=ACCEPT_TIMEFRAME))
+            invited_usernames.append(player.user.username)
+        audit_log.record(user, 'addUser', get_player_name(player), current_match.match_id,
+                         {'user_id': player.user.id, 'position': playing.index(player) + 1})
+    save_match(current_match)
+
+    text = f'{user.full_name} has added to the playing list:\n\n'
+    for player, player_name, _ in targets:
+        text += f'{playing.index(player) + 1}. {player_name}\n'
+    if invited_usernames:
+        text += f'\n{" ".join(f"@{username}" for username in invited_usernames)}, your spots are reserved for the ' \
+                f'next 24 hours.\nPlease respond to this message with /accept'
+    update.message.reply_text(text)
+
+
+def approveUsers_command(update, context):
+    """Approve the attendance of several tagged users at once
+
+    Usage: /approveUsers @user1 @user2 ..."""
+    set_bulk_approval(update, context, approved=True, command='approveUsers')
+
+
+def unapproveUsers_command(update, context):
+    """Cancel the attendance approval of several tagged users at once
+
+    Usage: /unapproveUsers @user1 @user2 ..."""
+    set_bulk_approval(update, context, approved=False, command='unapproveUsers')
+
+
+def reorderWaiting_command(update, context):
+    """Move tagged users to the front of the waiting list, in the given order
+
+    Usage: /reorderWaiting @user1 @user2 ..."""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'reorderWaiting'):
+        return
+
+    targets = get_tagged_players(update)
+    problems = get_bulk_problems(targets)
+    waiting = list(islice(playing, LIST_MAX_SIZE, None))
+    for player, player_name, _ in targets:
+        if player not in waiting:
+            problems.append(f'{player_name} is not on the waiting list')
+    if problems:
+        return update.message.reply_text(get_bulk_problems_text(user, 'reorder', problems))
+
+    moved = [waiting[waiting.index(player)] for player, _, _ in targets]
+    moved_ids = {id(player) for player in moved}
+    playing_part = list(islice(playing, LIST_MAX_SIZE))
+    playing.clear()
+    playing.extend(playing_part)
+    playing.extend(moved)
+    playing.extend(player for player in waiting if id(player) not in moved_ids)
+    audit_log.record(user, 'reorderWaiting', ', '.join(get_player_name(player) for player in moved),
+                     current_match.match_id)
+    save_match(current_match)
+    update.message.reply_text(f'{user.full_name} has reordered the waiting list!\n\n{get_lists()}',
+                              parse_mode='MarkdownV2')
+
+
+def export_command(update, context):
+    """Send the admin an export of the bot's tables
+
+    Use /export parquet for parquet files instead of compressed CSV files"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PRIVATE_COMMAND, 'export'):
+        return
+
+    export_format = context.args[0].lower() if context.args else 'csv'
+    update.message.reply_text(f'Hi {user.full_name}, exporting the tables, this may take a while...')
+    with TemporaryDirectory() as directory:
+        try:
+            paths = export_tables(sql_database, directory, export_format=export_format)
+        except (ValueError, Error) as err:
+            logger.error(f"Export failed: {err}")
+            return update.message.reply_text(f'Hi {user.full_name}, the export failed: {err}')
+        for path in paths:
+            with open(path, 'rb') as file:
+                context.bot.send_document(user.id, file, filename=os.path.basename(path))
+
+
+def profile_command(update, context):
+    """Profile the bot for a few seconds and send the admin the report and the collapsed stacks
+
+    Usage: /profile [seconds]. The report lists memory use, GC counts, thread states and the top allocation sites,
+    and the stacks file can be turned into a flamegraph (e.g. with flamegraph.pl or speedscope)"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PRIVATE_COMMAND, 'profile'):
+        return
+
+    try:
+        duration = min(float(context.args[0]), PROFILE_MAX_SECONDS) if context.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        return update.message.reply_text(f'Hi {user.full_name}, please provide the profiling duration in seconds!')
+    update.message.reply_text(f'Hi {user.full_name}, profiling the bot for {duration:g} seconds...')
+    with TemporaryDirectory() as directory:
+        try:
+            paths = diagnose(duration, directory)
+        except RuntimeError as err:
+            return update.message.reply_text(f'Hi {user.full_name}, {err}. Please try again later')
+        for path in paths:
+            with open(path, 'rb') as file:
+                context.bot.send_document(user.id, file, filename=os.path.basename(path))
+
+
+def audit_command(update, context):
+    """Send the admin a page of the audit log, newest first
+
+    Usage: /audit [@user or user id] [before <entry id>]"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PRIVATE_COMMAND, 'audit'):
+        return
+
+    args = list(context.args)
+    before_id = actor_id = None
+    try:
+        if len(args) >= 2 and args[-2].lower() == 'before':
+            before_id = int(args.pop())
+            args.pop()
+        if args:
+            actor = next((entity.user for entity in update.message.entities if entity.user is not None), None) \
+                or player_index.resolve(' '.join(args))
+            actor_id = actor.id if actor is not None else int(args[0])
+    except ValueError:
+        return update.message.reply_text(f'Hi {user.full_name}, please use /audit [@user or user id] '
+                                         f'[before <entry id>]')
+
+    connection = None
+    try:
+        connection = sql_database.new_connection()      # not the main one, as this runs alongside the dispatcher
+        rows = fetch_page(connection, actor_id, before_id)
+    except Error as err:
+        logger.error(f"Audit query failed: {err}")
+        return update.message.reply_text(f'Hi {user.full_name}, the audit log is unavailable at the moment')
+    finally:
+        if connection is not None:
+            if not connection.closed:
+                connection.rollback()
+            connection.close()
+    if not rows:
+        return update.message.reply_text(f'Hi {user.full_name}, there are no (older) audit log entries')
+
+    text = ''
+    for entry_id, created_at, _, actor_name, action, target, match_id, details in rows:
+        text += f'#{entry_id} {created_at.astimezone(ISRAEL_TIMEZONE):%d/%m %H:%M} {actor_name}: {action}'
+        text += f' {target}' if target else ''
+        text += f' ({match_id})' if match_id else ''
+        text += '\n'
+    actor_arg = f'{actor_id} ' if actor_id is not None else ''
+    text += f'\nOlder entries: /audit {actor_arg}before {rows[-1][0]}'
+    update.message.reply_text(text)
+
+
+def teamRule_command(update, context):
+    """Set, clear or list the rules /shuffle splits teams by
+
+    Usage: /teamRule [@user goalkeeper | @user1 @user2 apart | @user1 @user2 together] [soft]
+           /teamRule @user [@user2] clear"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PRIVATE_COMMAND, 'teamRule'):
+        return
+
+    if not context.args:
+        return update.message.reply_text(get_team_rules_text())
+
+    targets = get_tagged_players(update)
+    problems = get_bulk_problems(targets)
+    for player, player_name, _ in targets:
+        if player.user.id == FAKE_USER_ID:
+            problems.append(f'{player_name} is not a known player')
+    words = targets[-1][2].lower().split() if targets else []
+    kind = words[0] if words else None
+    hard = words[1:] != ['soft']
+    if kind not in KINDS + ('clear',) or words[1:] not in ([], ['soft']) \
+            or (kind == 'clear' and (len(words) > 1 or len(targets) > 2)) \
+            or (kind == 'goalkeeper' and len(targets) != 1) or (kind in ('apart', 'together') and len(targets) != 2):
+        problems.append('please use /teamRule [@user goalkeeper | @user1 @user2 apart | @user1 @user2 together] '
+                        '[soft] or /teamRule @user [@user2] clear')
+    if problems:
+        return update.message.reply_text(get_bulk_problems_text(user, 'set a rule for', problems))
+
+    user_ids = [player.user.id for player, _, _ in targets]
+    names = ' and '.join(player_name for _, player_name, _ in targets)
+    if kind == 'clear':
+        if not team_rules.clear(*user_ids):
+            return update.message.reply_text(f'Hi {user.full_name}, there is no rule for {names}')
+        text = f'{user.full_name} has cleared the rule for {names}'
+    else:
+        team_rules.set(kind, hard, *user_ids)
+        text = f'{user.full_name} has set a {"hard" if hard else "soft"} rule: {get_team_rule_text(kind, names)}'
+    audit_log.record(user, 'teamRule', names, None, {'user_ids': user_ids, 'rule': kind, 'hard': hard})
+    update.message.reply_text(text)
+
+
+def addMatch_command(update, context):
+    """Open a list for another match, e.g. on an extra pitch or on a day other than the regular matchdays
+
+    Usage: /addMatch <weekday or dd/mm> [HH:MM]"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, 'addMatch'):
+        return
+
+    today = clock.now().date()
+    match_date = parse_match_date(context.args[0], today) if context.args else None
+    try:
+        kickoff = time.fromisoformat(context.args[1]) if len(context.args) > 1 else time(hour=20, minute=30)
+    except ValueError:
+        kickoff = None
+    if match_date is None or kickoff is None:
+        return update.message.reply_text(f'Hi {user.full_name}, please provide the match day (e.g. thu or 22/10) '
+                                         f'and optionally its kick off time (e.g. 21:00)!')
+
+    match = matches.new_pitch(match_date, kickoff)
+    audit_log.record(user, 'addMatch', match.match_id, match.match_id)
+    update.message.reply_text(f'{user.full_name} has opened a list for {get_match_title(match)}!\n\n'
+                              f'Please use /add #{match.match_id} to join it')
+
+# endregion
+
+# region USER COMMANDS
+
+
+def help_command(update, context):
+    """Send bot help message"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'help'):
+        return
+
+    message = f'Welcome to the *Technion Football Club*\!\n\n'\
+              f'\n*Club rules* :\n' \
+              f'0\. Club matchdays are: _Monday @ 20:30\-22:30, Thursday @ 20:30\-22:30_\n' \
+              f'If you can not attend the FULL 2 hours, please refrain from adding yourself to the list\.\n\n' \
+              f'1\. Players MUST use their full names in their telegram profiles \(Hebrew or English\)\.\n' \
+              f'NO SPECIAL CHARACTERS ALLOWED\!\!\!\n\n' \
+              f'2\. Players must be either Technion students or Technion Pre\-Academic Prep\. School students\.\n' \
+              f'Group admins must authorize exceptions\.\n\n' \
+              f'3\. External players \(Technion students who are not part of our group\) can only be added if ' \
+              f'the list is not full and with the approval of one of the group admins\.\n\n' \
+              f'4\. Training bibs are *MANDATORY\!*\nPlayers who do not have one, must purchase one to play\.\n' \
+              f'The link for purchasing the agreed\-upon bib can be found here https://t\.me/c/1760505503/5543\n\n' \
+              f'5\. Creating a list for Monday becomes possible on Saturday evening starting at 21:30\.\n' \
+              f'Creating a list for Thursday becomes possible on Tuesday evening starting at 21:30\.\n\n' \
+              f'6\. List creator will be liable for the match, which means he must ensure all players have a ' \
+              f'student card in effect \(every player is responsible for bringing his\)\.\n' \
+              f'In addition, he\'ll be ASAT\'s point of contact regarding any possible match\-related inquiries\.\n\n' \
+              f'7\. If the list creator wishes to remove himself from the list, he must ensure that another player ' \
+              f'assumes match liability\. Failing to do so will force an admin to clear the list\.\n\n' \
+              f'8\. Players can only add themselves, and only once\!\n\n' \
+              f'9\. If the list is already full \(max list size is 15 players\), ' \
+              f'the player will be placed on a waiting list \(will be created automatically\)\.\n\n' \
+              f'10\. Moving from the waiting list to the playing list is possible only if one of the players removes ' \
+              f'himself from the playing list or if an admin removed one of the players\.\n\n' \
+              f'11\. Every matchday, the players on the playing list MUST approve their attendance by 16:00\.\n' \
+              f'Players who fail to do so will be removed from the playing list\!\n\n' \
+              f'12\. Arrival approval for a match becomes mandatory if 15 players approve their arrival before\n' \
+              f'the deadline \(for approving attendance\)\. If fewer than 15 people have approved their attendance,\n' \
+              f'cancellations can be made up to two hours before the game\.\n' \
+              f'Afterward, all players who confirmed their arrival must attend\.\n\n' \
+              f'13\. The @FCTechnionBot was created to ease the players\' registration process\.\n' \
+              f'Please use bot commands in a private chat @ https://t\.me/FCTechnionBot \(when possible\)\.\n\n' \
+              f'\n*Available user commands* :\n' \
+              f'/print \- print the list\n' \
+              f'/create \- create a new list\n' \
+              f'/add \- add yourself to the list\n' \
+              f'/remove \- remove yourself from the list\n' \
+              f'/approve \- approve you\'ll be attending the match\n' \
+              f'/ball \- inform you\'ll be bringing a match ball\n' \
+              f'/shuffle \- shuffle the playing list to create 3 teams, keeping the admins\' team rules\n' \
+              f'/rules \- print match rules\n' \
+              f'/schedule \- print the bot\'s schedule\n' \
+              f'/liable \- ask the tagged user to assume match liability\n' \
+              f'/assume \- assume match liability\n' \
+              f'/accept \- accept admin invitation to join the list\n' \
+              f'/matches \- list the open lists of upcoming matches\n' \
+              f'/help \- view club rules and available bot commands\n' \
+              f'Commands apply to the list you\'re on\. To pick another list, end the command with its id, ' \
+              f'e\.g\. /add \#thu22\n' \
+              f'\n*Available only to admins* :\n' \
+              f'/start \- start the bot\n' \
+              f'/createList \- create a new list with tagged users\n' \
+              f'/clearAll \- clear the list\n' \
+              f'/addUser \- add the tagged user to the list\n' \
+              f'/removeUser \- remove the tagged user from the list\n' \
+              f'/addExternal \- add External player to the list\n' \
+              f'/liableUser \- grant match liability to the tagged user\n' \
+              f'/transferLiability \- transfer match liability between tagged users\n' \
+              f'/addMatch \- open a list for another match \(e\.g\. /addMatch thu 21:00\)\n' \
+              f'/addUsers \- add several tagged users, each optionally followed by its place on the list\n' \
+              f'/removeUsers \- remove several tagged users from the list\n' \
+              f'/approveUsers, /unapproveUsers \- approve or cancel the attendance of several tagged users\n' \
+              f'/reorderWaiting \- move the tagged users to the front of the waiting list\n' \
+              f'/teamRule \- mark a goalkeeper, or keep two tagged users apart or together when shuffling \(add ' \
+              f'soft to prefer it only\)\. With no arguments, list the rules\n'
+
+    user.send_message(message, parse_mode='MarkdownV2')
+
+
+def create_command(update, context):
+    """Create a playing list"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'create'):
+        return
+
+    # a list for a regular matchday opens two days before at 21:30 (lists opened by admins are open right away)
+    opening_day = current_match.date - timedelta(days=2)
+    opening_time = timezone('Asia/Jerusalem').localize(datetime.combine(opening_day, time(hour=21, minute=30)))
+    if not current_match.pinned and clock.now() < opening_time:
+        return user.send_message(f'Hi {user.full_name}, club rules state that creating a list for '
+                                 f'{current_match.date:%A} becomes possible on {opening_day:%A} evening '
+                                 f'starting at 21:30!')
+    if not user_full_name_is_valid(user):
+        return user.send_message(f'Hi {user.full_name}, your telegram name is invalid!\n\n'
+                                 f'Please use /help to read on our naming rules, change it, and try again')
+
+    if playing:
+        return user.send_message(f'Playing list is not empty!\n\n{user.full_name}, '
+                                 f'please add yourself to current queue using the /add command')
+
+    player = TechnionFCPlayer(user, liable=True)
+    playing.append(player)
+    announcements.announce(context, TELEGRAM_CHAT_ID, f'{user.full_name} has created a new playing list for '
+                                                      f'{get_match_title(current_match)}!')
+    user.send_message(f'Congratulations {user.full_name}, you\'ve created a new playing list!\n\n'
+                      f'Please note, you\'re liable for the match!\n'
+                      f'For more information, please see the /help message')
+
+
+def add_command(update, context):
+    """Add player to the playing list"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'add'):
+        return
+
+    if not user_full_name_is_valid(user):
+        return user.send_message(f'Hi {user.full_name}, your telegram name is invalid!\n\n'
+                                 f'Please use /help to read on our naming rules, change it, and try again')
+
+    player = TechnionFCPlayer(user)
+    if playing.count(player) > 0:
+        index = playing.index(player)
+        if index < LIST_MAX_SIZE:
+            return user.send_message(f'{user.full_name}, you\'re already on the playing list!')
+        else:
+            return user.send_message(f'{user.full_name}, you\'re already on the waiting list!')
+    else:
+        if len(playing) == 0:
+            return user.send_message(f'{user.full_name}, please use the /create command '
+                                     f'to create a list first!')
+
+        playing.append(player)
+        index = playing.index(player)
+        if index < LIST_MAX_SIZE:
+            return user.send_message(f'Congratulations {user.full_name}, you\'re on the playing list!\n')
+        else:
+            return user.send_message(f'Playing list is full!\n\n{user.full_name}, you\'re on the waiting list')
+
+
+def remove_command(update, context):
+    """Remove player from the playing list"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'remove'):
+        return
+
+    user.send_message(remove_player(context, user))
+
+
+def liable_command(update, context):
+    """Ask the tagged user to assume match liability"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PUBLIC_COMMAND, 'liable'):
+        return
+
+    player = TechnionFCPlayer(user)
+    if player not in playing:
+        return user.send_message(f'Hi {user.full_name}, you\'re not listed at all and therefore not liable!')
+
+    index = playing.index(player)
+    if not playing[index].liable:
+        return user.send_message(f'Hi {user.full_name}, you\'re not liable and therefore cannot transfer liability!')
+
+    # message MUST have exactly two entities to be valid: BOT_COMMAND and TEXT_MENTION or a MENTION
+    if len(update.message.entities) != 2:
+        return user.send_message(f'Hi {user.full_name}, please tag the user you wish will assume match liability!')
+
+    player, player_name = get_player_from_entity_id(update, context, entity_id=1)
+
+    if player not in playing:
+        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, is not listed...\n\n'
+                                 f'Please tag the correct user you wish will assume match liability!')
+    index = playing.index(player)
+    if playing[index].user.id == FAKE_USER_ID:
+        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, '
+                                 f'has yet to accept the admin\'s invitation to join the list...\n\n'
+                                 f'Please tag a user on the playing list!')
+
+    if index >= LIST_MAX_SIZE:
+        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, '
+                                 f'is on the waiting list...\n\n'
+                                 f'Please tag the correct user you wish will assume match liability!')
+
+    user_id_or_name = get_user_id_or_name(playing[index].user)
+    if user_id_or_name in asked:
+        return user.send_message(f'Hi {user.full_name}, the user you tagged, {player_name}, '
+                                 f'has already been asked to assume match liability!')
+
+    asked.add(user_id_or_name, playing[index])
+    update.message.reply_text(f'Hi {player_name}, {user.full_name} has asked you to assume match liability.\n\n'
+                              f'Please use the /assume command to assume match liability!')
+
+
+def accept_command(update, context):
+    """Accept admin invitation to join the list"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PUBLIC_COMMAND, 'accept'):
+        return
+
+    if user.username not in invited:
+        return user.send_message(f'Hi {user.full_name},\nYou were not invited by an admin!')
+
+    if not user_full_name_is_valid(user):
+        return user.send_message(f'Hi {user.full_name}, your telegram name is invalid!\n\n'
+                                 f'Please use /help to read on our naming rules, change it, and try again')
+
+    # each invitation is linked to its reserved spot, which is handed over to the user in place
+    reserved = invited.pop(user.username).player
+    if reserved is None:            # the reserved spot was lost, e.g. restored from an inconsistent back up
+        reserved = TechnionFCPlayer(user)
+        playing.append(reserved)
+    reserved.user = user
+    if any(player is reserved for player in islice(playing, LIST_MAX_SIZE)):
+        return user.send_message(f'Congratulations {user.full_name}, you\'re on the playing list!\n')
+    user.send_message(f'Hi {user.full_name}, you\'re on the waiting list')
+
+
+def approve_command(update, context):
+    """Mark player approval for attending the match"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'approve'):
+        return
+
+    user.send_message(approve_player(user))
+
+
+def assume_command(update, context):
+    """Assume match liability"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PUBLIC_COMMAND, 'assume'):
+        return
+
+    # a liability request is linked to the asked player, so listed players who were asked are found directly
+    request = asked.get(get_user_id_or_name(user))
+    # only players on the playing list are asked, so checking their spot is still there is bounded by its size
+    if request is None or not any(player is request.player for player in islice(playing, LIST_MAX_SIZE)):
+        if user.username in invited:
+            return user.send_message(f'Hi {user.full_name}, '
+                                     f'please /accept admin invitation before assuming match liability!')
+        if TechnionFCPlayer(user) not in playing:
+            return user.send_message(f'Hi {user.full_name}, you\'re not listed at all.\n\n'
+                                     f'No need to assume match liability!')
+        return user.send_message(f'Hi {user.full_name},\nYou were not asked to assume match liability!')
+
+    if request.player.liable:
+        return user.send_message(f'Hi {user.full_name}, you\'re already liable!\n\nNo need to assume match liability!')
+
+    for player in playing:
+        player.liable = False
+    request.player.liable = True
+
+    asked.clear()
+    db_writer.submit('ASKED', [("DELETE FROM ASKED WHERE match_id = %s", (current_match.match_id,))])
+    announcements.announce(context, TELEGRAM_CHAT_ID, f'{user.full_name} has assumed match liability!')
+
+
+def ball_command(update, context):
+    """Mark player approval for bringing a match ball"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'ball'):
+        return
+
+    user.send_message(toggle_match_ball(user))
+
+
+def print_command(update, context):
+    """Print both playing and waiting lists"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'print'):
+        return
+
+    user.send_message(get_lists(), parse_mode='MarkdownV2', reply_markup=get_roster_keyboard(LIST_MESSAGE))
+
+
+def shuffle_command(update, context):
+    """Shuffle playing list to create 3 unique teams"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'shuffle'):
+        return
+
+    # shuffle is allowed only on matchdays
+    if clock.now().date() != current_match.date:
+        return user.send_message(f'Hi {user.full_name}, shuffle command is reserved only for matchdays!')
+
+    teams = {}
+    colors = ('Red', 'Green', 'Blue')
+    players = [player for player in playing if playing.index(player) < LIST_MAX_SIZE]
+    for i in range(LIST_MAX_SIZE - len(players)):
+        players += [f'External {i}']
+    split = split_teams(players, len(colors), team_rules, key=get_team_key)
+    team_rules.draft(current_match.match_id, [[get_team_key(player) for player in team if get_team_key(player)]
+                                              for team in split.teams])
+
+    text = 'One possible way to divide into 3 teams\n\n'
+    for color in colors:
+        teams[color] = split.teams[colors.index(color)]
+        if color == 'Red':
+            text += f'{CIRCLE_RED_EMOJI_CODE}{CIRCLE_RED_EMOJI_CODE}  {color} Team  ' \
+                   f'{CIRCLE_RED_EMOJI_CODE}{CIRCLE_RED_EMOJI_CODE}\n\n'
+        elif color == 'Green':
+            text += f'{CIRCLE_GREEN_EMOJI_CODE}{CIRCLE_GREEN_EMOJI_CODE}  {color} Team  ' \
+                   f'{CIRCLE_GREEN_EMOJI_CODE}{CIRCLE_GREEN_EMOJI_CODE}\n\n'
+        else:
+            text += f'{CIRCLE_BLUE_EMOJI_CODE}{CIRCLE_BLUE_EMOJI_CODE}  {color} Team  ' \
+                   f'{CIRCLE_BLUE_EMOJI_CODE}{CIRCLE_BLUE_EMOJI_CODE}\n\n'
+        team_players = teams[color]
+        for player in team_players:
+            text += f'{team_players.index(player) + 1}\. '
+            if isinstance(player, str):
+                text += f'{player}\n'
+            else:
+                text += f'{player.user.first_name} {player.user.last_name}\n'
+        text += '\n'
+    if split.broken:
+        text += 'Rules these teams could not keep:\n'
+        for kind, hard, player, other in split.broken:
+            names = f'{player.user.full_name} and {other.user.full_name}'
+            text += f'\- {get_team_rule_text(kind, names)} \\({"hard" if hard else "soft"}\\)\n'
+        text += '\n'
+    if split.repeated:
+        text += f'{split.repeated} pairs of teammates from your last matches play together again\n'
+    user.send_message(text, parse_mode='MarkdownV2')
+
+
+def get_team_key(player):
+    """Return the user id team rules refer to a player by, or None for externals and reserved spots"""
+    if isinstance(player, str) or player.user.id == FAKE_USER_ID:
+        return None
+    return player.user.id
+
+
+def get_team_rule_text(kind, names):
+    """Return a rule's description, given the names of the players it's set for"""
+    if kind == 'goalkeeper':
+        return f'{names} {"are goalkeepers" if " and " in names else "is a goalkeeper"}, kept on different teams'
+    return f'{names} {"never play" if kind == "apart" else "always play"} on the same team'
+
+
+def get_team_rules_text():
+    """Return the list of all team rules"""
+    rules = team_rules.rules()
+    if not rules:
+        return 'There are no team rules. Use /teamRule to set one'
+    text = 'Team rules:\n\n'
+    for user_id, other_id, kind, hard in rules:
+        names = ' and '.join(get_player_name(TechnionFCPlayer(player_directory.get(key) or
+                                                              User(key, str(key), is_bot=False)))
+                             for key in (user_id, other_id) if key)
+        text += f'- {get_team_rule_text(kind, names)} ({"hard" if hard else "soft"})\n'
+    return text
+
+
+def rules_command(update, context):
+    """Prints the match rules"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'rules'):
+        return
+
+    message = f'\n{SCROLL_EMOJI_CODE}{SCROLL_EMOJI_CODE}  *Match Rules*  {SCROLL_EMOJI_CODE}{SCROLL_EMOJI_CODE}\n\n' \
+              f'0\. There are three \(3\) teams\. Each team consists of five \(5\) players\.\n\n' \
+              f'1\. Each player must have a blue and green training bib\.\n\n' \
+              f'2\. A match lasts eight \(8\) minutes or up until one team scores two \(2\) goals\.\n\n' \
+              f'3\. In case of a tie, there will be two \(2\) additional minutes of stoppage time\.\n\n' \
+              f'4\. In case the standard time of play passes and the game is still in play, ' \
+              f'the match will have one last attack\.\n\n' \
+              f'5\. The "last attack" ends when \(whichever comes first\):\n' \
+              f'    a\. A team gets a goal kick\.\n' \
+              f'    b\. The ball has been out for a throw\-out for the third time\.\n' \
+              f'    \* corner\-kicks are considered a part of the attack\.\n\n' \
+              f'6\. In case the stoppage time ends in a tie, there are two options:\n' \
+              f'    a\. The veteran team \(if there is one\) leaves\.\n' \
+              f'    b\. Each team gets two penalty kicks\.\n' \
+              f'        The first team that scores while the other misses, stays\.\n\n' \
+              f'7\. The goalkeeper\'s movement is limited to his team\'s half\.\n\n' \
+              f'8\. The goalkeeper can score a goal\.\n\n' \
+              f'9\. The goalkeeper is replaced in each of the following cases \(whichever comes first\):\n' \
+              f'    a\. He has conceded a goal\.\n' \
+              f'    b\. He has been in goal the entire match \(from start to finish\)\.\n\n'
+
+    user.send_message(message, parse_mode='MarkdownV2')
+
+
+def schedule_command(update, context):
+    """Prints the bot's schedule"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'schedule'):
+        return
+
+    message = f'\n{CLIPBOARD_EMOJI_CODE}{CLIPBOARD_EMOJI_CODE}  *Bot schedule*  ' \
+              f'{CLIPBOARD_EMOJI_CODE}{CLIPBOARD_EMOJI_CODE}\n\n' \
+              f'0\. Each matchday at 12:30, ' \
+              f'the bot will remind players who have yet to approve their attendance to do so\.\n\n' \
+              f'1\. Each matchday at 15:00, ' \
+              f'the bot will give a final reminder for players who have yet to approve their attendance to do so\.\n\n' \
+              f'2\. Each matchday at 16:00, 16:30, 17:00, 17:30, and 18:00, ' \
+              f'the bot will remove from the list players who have yet to approve their attendance\.\n' \
+              f'When promoting players from the waiting list, ' \
+              f'the bot will give preference to players who approved their attendance\.\n\n' \
+              f'3\. Each matchday at 11:15, 13:15, 15:15, 17:15, 18:15, and 19:15, the bot will print ' \
+              f'the current state of the list\.\n\n' \
+              f'4\. Each matchday at 23:59:59, the bot will clean up the list\.\n\n' \
+              f'5\. Each day at 05:00:00, the bot restarts itself\.\n' \
+              f'Please refrain from performing any actions during the 10 minutes before\.\n\n'
+
+    user.send_message(message, parse_mode='MarkdownV2')
+
+
+def matches_command(update, context):
+    """Print the open matches and their ids"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, PRIVATE_COMMAND, 'matches'):
+        return
+
+    if not len(matches):
+        return user.send_message(f'Hi {user.full_name}, there are no open lists at the moment!')
+    text = 'Open lists:\n\n'
+    for match in matches:
+        text += f'#{match.match_id} - {get_match_title(match)}: ' \
+                f'{min(len(match.playing), LIST_MAX_SIZE)}/{LIST_MAX_SIZE} players'
+        if len(match.playing) > LIST_MAX_SIZE:
+            text += f', {len(match.playing) - LIST_MAX_SIZE} waiting'
+        text += '\n'
+    text += '\nCommands apply to the list you\'re on. To pick another list, add its id to the command, ' \
+            'e.g. /add #' + next(iter(matches)).match_id
+    user.send_message(text)
+
+
+def roster_button_callback(update, context):
+    """Handle the approve, ball and remove inline keyboard buttons
+
+    Messages sent privately keep their buttons after their user leaves the group, so presses get the same group
+    membership check commands get. Removal asks for confirmation, and takes effect on a second press."""
+    query = update.callback_query
+    user = query.from_user
+    action, origin = query.data.split(':')[:2]
+    if not valid_command_usage(update, context, user, MEMBER_PRIVILEGE, None, action):
+        return
+
+    if action == 'approve':
+        text = approve_player(user)
+    elif action == 'ball':
+        text = toggle_match_ball(user)
+    elif origin in (CONFIRM_REMOVAL, CANCEL_REMOVAL):
+        return answer_removal_confirmation(context, query, user, origin)
+    else:
+        query.answer()
+        query.message.reply_text(f'{user.full_name}, are you sure you want to remove yourself from the list?',
+                                 reply_markup=get_removal_keyboard(user))
+        return
+
+    query.answer(text)
+    if origin != LIST_MESSAGE:
+        return
+
+    # list messages are edited in place so they always show the current state of the list
+    if str(query.message.chat.id) == TELEGRAM_CHAT_ID:
+        text = get_current_state()
+    else:
+        text = get_lists()
+    try:
+        query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=get_roster_keyboard(LIST_MESSAGE))
+    except TelegramError as err:    # e.g. the list has not changed since the message was sent
+        logger.debug(f"List message was not edited: {err}")
+
+
+def answer_removal_confirmation(context, query, user, origin):
+    """Remove a player who confirmed their removal, or keep them on the list if they canceled it"""
+    if query.data.split(':')[3] != str(user.id):
+        query.answer(f'Hi {user.full_name}, this confirmation is meant for another player!')
+        return
+
+    if origin == CONFIRM_REMOVAL:
+        text = remove_player(context, user)
+    else:
+        text = f'{user.full_name}, you\'re staying on the list!'
+    query.answer(text)
+    query.edit_message_text(text)      # without the confirmation keyboard, so it can't be pressed again
+
+# endregion
+
+# region TELEGRAM JOBS
+
+
+def backup_to_database(context):
+    """Backup list to database"""
+    for table, (delete_query, insert_query, rows) in get_backup().items():
+        db_writer.submit(table, [(delete_query, None)] + [(insert_query, row) for row in rows])
+
+
+def log_throttled_requests(context):
+    """Log how many requests were throttled since the last run, so rate limits can be tuned"""
+    throttled = rate_limiter.throttled.copy()
+    new = throttled - throttled_logged
+    if new:
+        logger.info(f"Throttled requests per command: {dict(new)} (total {dict(throttled)})")
+    throttled_logged.update(new)
+    rate_limiter.prune()
+
+
+def log_database_writer_stats(context):
+    """Log the background database writer's counters"""
+    if db_writer.errors or db_writer.dropped:
+        logger.warning(f"Database writer: written {dict(db_writer.written)}, failed attempts "
+                       f"{dict(db_writer.errors)}, dropped {dict(db_writer.dropped)}")
+    if change_feed.received:
+        logger.debug(f"Change notifications received per table: {dict(change_feed.received)}")
+
+
+def flush_audit_log(context):
+    """Write the buffered audit log entries"""
+    audit_log.flush()
+
+
+def flush_player_directory(context):
+    """Write the new and changed player profiles, and log how often name validation was cached"""
+    player_directory.flush()
+    logger.debug(f"Player directory: {len(player_directory)} profiles, name validation cache hits "
+                 f"{player_directory.hits}, misses {player_directory.misses}")
+
+
+def log_announcement_stats(context):
+    """Log how many group messages batching announcements saved so far"""
+    if announcements.announced:
+        logger.info(f"Announcements: {announcements.announced} batched into {announcements.sent} messages "
+                    f"({announcements.saved} saved), {announcements.urgent} sent right away")
+
+
+def kindly_reminder(context):
+    """Remind players to approve their attendance"""
+    if all(player.approved for player in playing):
+        return
+
+    yet_to_approve = [player for player in playing if not player.approved]
+    if DM_REMINDERS:
+        yet_to_approve = send_direct_reminders(context, yet_to_approve,
+                                               'It\'s 12:30 on matchday, and you have yet to approve your '
+                                               'attendance!\n\nPlease approve you\'ll be attending the match!')
+        if not yet_to_approve:      # all players were reminded privately
+            return
+
+    text = f'{ALARM_EMOJI_CODE}  It\'s 12:30 on matchday  {ALARM_EMOJI_CODE}\n\n' \
+           f'This is a kindly reminder for\n\n'
+    for player in yet_to_approve:
+        if player.user.id == FAKE_USER_ID:
+            text += f'\@{player.user.username}\n'
+        else:
+            text += f'{player.user.mention_markdown_v2()}\n'
+    text += '\nPlease approve you\'ll be attending the match\!'
+
+    context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2',
+                             reply_markup=get_roster_keyboard(REMINDER_MESSAGE))
+
+
+def final_reminder(context):
+    """Final reminder for players to approve their attendance"""
+    if all(player.approved for player in playing):
+        return
+
+    text = ''
+    playing_yet_to_approve = [player for player in playing
+                              if playing.index(player) < LIST_MAX_SIZE and not player.approved]
+    waiting_yet_to_approve = [player for player in playing
+                              if playing.index(player) >= LIST_MAX_SIZE and not player.approved]
+    if DM_REMINDERS:
+        playing_yet_to_approve = send_direct_reminders(context, playing_yet_to_approve,
+                                                       'This is a final reminder to approve you\'ll be attending '
+                                                       'the match!\n\nIf you will not approve your attendance in the '
+                                                       'next hour, you\'ll lose your place on the playing list!')
+        waiting_yet_to_approve = send_direct_reminders(context, waiting_yet_to_approve,
+                                                       'You\'re on the waiting list, and it is advisable to approve '
+                                                       'your attendance!\n\nWhen promoting players from the waiting '
+                                                       'list, the bot will prioritize players who\'ve approved '
+                                                       'their attendance!')
+
+    if playing_yet_to_approve:
+        text += f'{ALARM_EMOJI_CODE}  It\'s 15:00 on matchday  {ALARM_EMOJI_CODE}\n\n' \
+               f'This is a final reminder for\n\n'
+        for player in playing_yet_to_approve:
+            if player.user.id == FAKE_USER_ID:
+                text += f'\@{player.user.username}\n'
+            else:
+                text += f'{player.user.mention_markdown_v2()}\n'
+        text += f'\nPlease approve you\'ll be attending the match\!\n' \
+                f'{NO_ENTRY_EMOJI_CODE}  *If you will not approve your attendance in the next hour, ' \
+                f'you\'ll lose your place on the playing list\!*  {NO_ENTRY_EMOJI_CODE}'
+
+    if waiting_yet_to_approve:
+        if playing_yet_to_approve:
+            text += f'\n\nThis is also a kindly reminder for\n\n'
+        else:
+            text += f'{ALARM_EMOJI_CODE}  It\'s 16:00 on matchday  {ALARM_EMOJI_CODE}\n\n' \
+                    f'This is a kindly reminder for\n\n'
+        for player in waiting_yet_to_approve:
+            if player.user.id == FAKE_USER_ID:
+                text += f'\@{player.user.username}\n'
+            else:
+                text += f'{player.user.mention_markdown_v2()}\n'
+        text += f'\n*It is advisable to approve your attendance\!*\nWhen promoting players from ' \
+                f'the waiting list, the bot will prioritize players who\'ve approved their attendance\!'
+
+    if text:
+        context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2',
+                                 reply_markup=get_roster_keyboard(REMINDER_MESSAGE))
+
+
+def remove_non_attenders(context):
+    """Remove players on the playing list who didn't approve their attendance in time
+
+    Such players will be replaced with players on the waiting list (preferably, ones who've approved) if there are any.
+    All removals and promotions of a sweep are announced in a single message"""
+    if all(player.approved for player in playing):
+        return
+
+    yet_to_approve = [player for index, player in enumerate(playing)
+                      if index < LIST_MAX_SIZE and not player.approved and not player.liable]
+    if not yet_to_approve:
+        return
+
+    promotions = promotion.sweep(playing, yet_to_approve, LIST_MAX_SIZE, prefer_approved=True, rank=get_waiting_rank())
+    for player, first_in_line in promotions:
+        if player.user.id != FAKE_USER_ID:
+            fairness_ledger.record_removal(player.user.id)
+        audit_log.record(None, 'removeNonAttender', get_player_name(player), current_match.match_id,
+                         {'user_id': player.user.id,
+                          'promoted': get_player_name(first_in_line) if first_in_line is not None else None})
+
+    text = ''
+    for player, _ in promotions:
+        text += f'{get_player_mention(player)}\n'
+    text += '\nThe bot removed you from the playing list for failing to approve your attendance in time\.'
+
+    promoted = [first_in_line for _, first_in_line in promotions if first_in_line is not None]
+    if promoted:
+        text += '\n\n'
+        for first_in_line in promoted:
+            text += f'{get_player_mention(first_in_line)}\n'
+        text += '\nCongratulations, you\'ve made the playing list\!'
+        yet_to_approve_promoted = [first_in_line for first_in_line in promoted if not first_in_line.approved]
+        if yet_to_approve_promoted:
+            text += '\n'
+            for first_in_line in yet_to_approve_promoted:
+                text += f'{get_player_mention(first_in_line)} '
+            text += '\- please approve you\'ll be attending the match\!'
+
+    announcements.announce(context, TELEGRAM_CHAT_ID, text, markdown=True)
+
+
+def print_lists(context):
+    """Print both playing and waiting lists"""
+    if not playing:     # playing list is empty. Therefore, no need to print it.
+        return
+    text = get_current_state()
+    if context.job.context:
+        text += f'\n\n{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}' \
+                f'\nDon\'t forget to bring your training bib\!\n' \
+                f'{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}{BIB_EMOJI_CODE}'
+    context.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=text, parse_mode='MarkdownV2',
+                             reply_markup=get_roster_keyboard(LIST_MESSAGE))
+
+
+def list_cleanup(context):
+    """Clear the playing list, closing the match"""
+    current_match.pinned = False
+    if not playing:     # playing list is empty. Therefore, no need to clear it.
+        return
+    text = f'{CLOCK_EMOJI_CODE}  It\'s time for the bot\'s scheduled cleanup\.\.\.  {CLOCK_EMOJI_CODE}\n\n'
+    team_rules.close(current_match.match_id)
+    player_ids = [player.user.id for player in playing]
+    fairness_ledger.record_match([user_id for user_id in player_ids[:LIST_MAX_SIZE] if user_id > 0],
+                                 [user_id for user_id in player_ids[LIST_MAX_SIZE:] if user_id > 0], current_match.date)
+    fairness_ledger.flush()
+    playing.clear()
+    invited.clear()
+    asked.clear()
+    clear_database_tables(current_match)
+    text += 'List was cleared by the bot\!'
+    # sent right away, as the day's last word on the match
+    announcements.announce(context, context.job.context, text, markdown=True, urgent=True)
+
+
+def check_accepted(context):
+    """Remove the reserved spots of users who haven't accepted the administrator's invitation in time"""
+    expired = invited.expire(clock.now())
+    if not expired:
+        return
+
+    listed = {id(player) for player in playing}
+    for invitation in expired:
+        text = f'Hi @{invitation.key}, timeframe for accepting the admin\'s invitation has passed!\n' \
+               f'Please contact an admin to get re-invited.'
+        announcements.announce(context, TELEGRAM_CHAT_ID, text)
+
+    # all expired spots are removed in a single pass over the list
+    remove_players_from_list(context, [invitation.player for invitation in expired if id(invitation.player) in listed])
+
+# endregion
+
+# region HELPER FUNCTIONS
+
+
+def rate_limit_check(update, context):
+    """Drop commands and button presses of users who exceeded their rate limit
+
+    Runs before all other handlers, so throttled requests never reach valid_command_usage and its Bot API calls."""
+    if update.callback_query is not None:
+        user = update.callback_query.from_user
+        command = update.callback_query.data.split(':')[0]
+    elif update.message is not None and update.message.text and update.message.text.startswith('/'):
+        user = update.message.from_user
+        command = update.message.text.split()[0][1:].split('@')[0]     # strip a possible @FCTechnionBot suffix
+    else:
+        return
+
+    allowed, warn = rate_limiter.allow(user.id, command)
+    if allowed:
+        return
+    if warn:
+        text = f'Hi {user.full_name}, you\'re sending too many /{command} requests. Please try again in a minute!'
+        if update.callback_query is not None:
+            update.callback_query.answer(text)
+        else:
+            update.message.reply_text(text)
+    raise DispatcherHandlerStop
+
+
+def valid_command_usage(update, context, user, privilege, publicity, command):
+    """Check for proper command usage
+
+    For example, check if a command that meant to be sent privately was sent publicly.
+    """
+    if not is_group_member(update, context, user):
+        return False
+
+    if privilege == 'admin' and not is_group_admin(update, context, user):
+        update.message.reply_text(f'Hi {user.full_name},\n'
+                                  f'you\'re not an admin, and therefore cannot use the /{command} command!')
+        return False
+
+    if publicity == 'private' and str(update.message.chat.id) == TELEGRAM_CHAT_ID:
+        update.message.reply_text(get_command_in_public_warning(user, command))
+        return False
+
+    if publicity == 'public' and str(update.message.chat.id) != TELEGRAM_CHAT_ID:
+        update.message.reply_text(get_command_in_private_warning(user, command))
+        return False
+
+    return True
+
+
+def is_group_member(update, context, user):
+    """Check if user is a group member"""
+    try:
+        chat_member = context.bot.get_chat_member(TELEGRAM_CHAT_ID, user.id)
+        if chat_member.status in ('left', 'kicked'):
+            reply_rejection(update, f'Hi {user.full_name},\n'
+                                    f'you are not a part of the Technion FC group anymore...\n\n'
+                                    f'To rejoin our group, please use {TELEGRAM_GROUP_INVITE_LINK}')
+            return False
+        return True
+    except TelegramError:
+        reply_rejection(update, f'Hi {user.full_name},\n'
+                                f'you are not a part of the Technion FC group...\n\n'
+                                f'To join our group, please use {TELEGRAM_GROUP_INVITE_LINK}')
+        return False
+
+
+def reply_rejection(update, text):
+    """Reply to a rejected command, or answer a rejected button press"""
+    if update.callback_query is not None:
+        update.callback_query.answer(text, show_alert=True)
+    else:
+        update.message.reply_text(text)
+
+
+def is_group_admin(update, context, user):
+    """Check if user is a group admin"""
+    try:
+        chat_member = context.bot.get_chat_member(TELEGRAM_CHAT_ID, user.id)
+        if chat_member.status in ('creator', 'administrator'):
+            return True
+        return False
+    except TelegramError:
+        update.message.reply_text(f'Hi {user.full_name},\n'
+                                  f'you are not a part of the Technion FC group...\n\n'
+                                  f'To join our group, please use {TELEGRAM_GROUP_INVITE_LINK}')
+        return False
+
+def user_full_name_is_valid(user):
+    """Check if user's full name is valid (each full name of a user is validated once)"""
+    return player_directory.name_is_valid(user)
+
+
+def get_command_in_public_warning(user, command):
+    """Return a warning message for users who publicly send a command that should be sent in private"""
+    return f'Hi {user.first_name},\n'\
+           f'Please send the /{command} command using the bot\'s private chat @ https://t.me/FCTechnionBot.\n\n'\
+           f'If you have any questions, feel free to ask :)'
+
+
+def get_command_in_private_warning(user, command):
+    """Return a warning message for users who privately send a command that should be sent in public"""
+    return f'Hi {user.first_name},\n'\
+           f'Please send the /{command} command using the group public chat!\n\n'\
+           f'If you have any questions, feel free to ask :)'
+
+
+def get_next_matchday(today):
+    """Return the date of the regular matchday lists are currently made for
+
+    From Tuesday to Thursday, that is Thursday. From Friday to Monday, that is Monday."""
+    return next_weekday(today, MATCHDAYS[1] if 1 <= today.weekday() <= 3 else MATCHDAYS[0])
+
+
+def get_match_title(match):
+    """Return a match's day and kick off time, e.g. 'Thursday 20:30', with its pitch if there are several"""
+    title = f'{match.date:%A} {match.kickoff:%H:%M}'
+    return title if match.pitch == 1 else f'{title}, pitch {match.pitch}'
+
+
+def select_match(update, context, creating=False):
+    """Return the match an update refers to, or None if it refers to a closed or unknown match
+
+    A match can be picked with a '#<match id>' last argument (button data carry the match id). Otherwise, it is the
+    earliest match listing the tagged users or the sender, looked up in the match book's player index, or else the
+    earliest open match. When creating a list, or if no list is open, it is the match of the next regular matchday."""
+    today = clock.now().date()
+    if update.callback_query is not None:
+        data = update.callback_query.data.split(':')
+        if len(data) > 2:
+            return matches.get(data[2])
+        users = [update.callback_query.from_user]
+    else:
+        if context.args and context.args[-1].startswith('#'):
+            # commands validate their entities, and telegram tags the match id as a hashtag
+            update.message.entities = [entity for entity in update.message.entities if entity.type != 'hashtag']
+            return matches.find(context.args.pop(), today)
+        users = []
+        for entity in update.message.entities:
+            if entity.type == 'text_mention':
+                users.append(entity.user)
+            elif entity.type == 'mention':
+                username = update.message.parse_entity(entity).lstrip('@')
+                users.append(player_index.by_username(username) or User(FAKE_USER_ID, '', False, username=username))
+        users.append(update.message.from_user)
+
+    if not creating:
+        for user in users:
+            keys = [match_key(user)] if user.id == FAKE_USER_ID else [user.id, f'@{user.username}']
+            for key in keys:
+                listing = matches.of_player(key)
+                if listing:
+                    return listing[0]
+        if matches.next_open(today) is not None:
+            return matches.next_open(today)
+
+    next_matchday = get_next_matchday(today)
+    return next(iter(matches.on(next_matchday)), None) or Match(next_matchday)
+
+
+def get_lists():
+    """Return playing and waiting lists"""
+    text = f'{CALENDAR_EMOJI_CODE}  *{get_match_title(current_match)}*  {CALENDAR_EMOJI_CODE}\n\n'
+
+    waiting_flag = False
+    text += f'{STOPWATCH_EMOJI_CODE}{STOPWATCH_EMOJI_CODE}  Playing list  ' \
+            f'{STOPWATCH_EMOJI_CODE}{STOPWATCH_EMOJI_CODE}\n\n'
+
+    for player in playing:
+        index = playing.index(player)
+        if index >= LIST_MAX_SIZE and not waiting_flag:
+            text += f'\n{HOURGLASS_EMOJI_CODE}{HOURGLASS_EMOJI_CODE}  Waiting list  ' \
+                    f'{HOURGLASS_EMOJI_CODE}{HOURGLASS_EMOJI_CODE}\n\n'
+            waiting_flag = True
+        if not waiting_flag:
+            text += f'{index + 1}\. {player.user.full_name}'
+        else:
+            text += f'{index + 1 - LIST_MAX_SIZE}\. {player.user.full_name}'
+        if player.liable:
+            text += f'  {POINTING_EMOJI_CODE}'
+        if player.approved:
+            text += f'  {CHECK_MARK_EMOJI_CODE}'
+        if player.match_ball:
+            text += f'  {FOOTBALL_EMOJI_CODE}'
+        text += '\n'
+    return text
+
+
+def get_current_state():
+    """Return playing and waiting lists headed by a current state title"""
+    text = f'{POINTING_DOWN_EMOJI_CODE}  Current state of the list  {POINTING_DOWN_EMOJI_CODE}\n\n'
+    return text + get_lists()
+
+
+def get_roster_keyboard(origin):
+    """Return the approve, ball and remove inline keyboard for a list or reminder message of the current match"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(f'{CHECK_MARK_EMOJI_CODE} Approve',
+                             callback_data=f'approve:{origin}:{current_match.match_id}'),
+        InlineKeyboardButton(f'{FOOTBALL_EMOJI_CODE} Ball', callback_data=f'ball:{origin}:{current_match.match_id}'),
+        InlineKeyboardButton(f'{NO_ENTRY_EMOJI_CODE} Remove',
+                             callback_data=f'remove:{origin}:{current_match.match_id}'),
+    ]])
+
+
+def get_removal_keyboard(user):
+    """Return the inline keyboard confirming a player's removal from the list of the current match"""
+    data = f'{current_match.match_id}:{user.id}'
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(f'{NO_ENTRY_EMOJI_CODE} Yes, remove me', callback_data=f'remove:{CONFIRM_REMOVAL}:{data}'),
+        InlineKeyboardButton('Cancel', callback_data=f'remove:{CANCEL_REMOVAL}:{data}'),
+    ]])
+
+
+def send_direct_reminders(context, players, text):
+    """Privately remind players and return the ones who should be mentioned in the group instead
+
+    Reserved spots have no user to message, and a direct message fails if the user never started the bot's private
+    chat. In both cases, the group mention is kept as a fallback."""
+    user_ids = [player.user.id for player in players if player.user.id != FAKE_USER_ID]
+    receipts = direct_messages.send_all(context.bot, user_ids, text,
+                                        reply_markup=get_roster_keyboard(REMINDER_MESSAGE))
+    for receipt in receipts.values():
+        if not receipt.delivered:
+            logger.info(f"Direct reminder to {receipt.chat_id} failed: {receipt.error}")
+    return [player for player in players
+            if player.user.id == FAKE_USER_ID or not receipts[player.user.id].delivered]
+
+
+def approve_player(user):
+    """Mark player approval for attending the match and return the reply text"""
+    if clock.now().date() != current_match.date:
+        return f'Hi {user.full_name}, please wait for matchday to approve your attendance!'
+
+    player = TechnionFCPlayer(user)
+    if player not in playing:
+        return f'Hi {user.full_name}, you\'re not listed at all.\n\nNo need to approve!'
+
+    index = playing.index(player)
+    if not playing[index].approved:
+        kickoff = ISRAEL_TIMEZONE.localize(datetime.combine(current_match.date, current_match.kickoff))
+        fairness_ledger.record_approval(user.id, (kickoff - clock.now()).total_seconds() / 3600)
+    playing[index].approved = True
+    return f'{user.full_name}, you\'ve approved you\'ll be attending the match!'
+
+
+def toggle_match_ball(user):
+    """Toggle player approval for bringing a match ball and return the reply text"""
+    player = TechnionFCPlayer(user)
+    if player not in playing:
+        return f'Hi {user.full_name}, you\'re not listed at all.\n\nNo need to bring a match ball!'
+    index = playing.index(player)
+    playing[index].match_ball = not playing[index].match_ball
+    if playing[index].match_ball:
+        return f'Hi {user.full_name}, you\'re in charge of bringing a match ball!'
+    return f'Hi {user.full_name}, you\'re not in charge of bringing a match ball anymore'
+
+
+def remove_player(context, user):
+    """Remove player from the playing list and return the reply text"""
+    player = TechnionFCPlayer(user)
+    if player not in playing:
+        return f'{user.full_name}, you\'re not listed at all!'
+
+    index = playing.index(player)
+    if playing[index].liable:
+        return f'Hi {user.full_name}, you are liable for the match. Therefore, you cannot remove ' \
+               f'yourself from the list until you ensure another player assumes match liability!'
+
+    remove_player_from_list(context, index, player)
+    return f'{user.full_name}, the bot has removed you from the playing list!'
+
+
+def remove_player_from_list(context, index, player):
+    """Remove a player from a given index on the list"""
+    remove_players_from_list(context, [playing[index]])
+
+
+def remove_players_from_list(context, players):
+    """Remove listed players (the exact objects on the list) and promote waiting players in their place"""
+    if not players:
+        return
+    current_time = clock.now()
+    # prioritizing players on the waiting list who've already approved their attendance
+    prefer_approved = current_time.date() == current_match.date and current_time.hour >= 17
+
+    for _, first_in_line in promotion.sweep(playing, players, LIST_MAX_SIZE, prefer_approved, get_waiting_rank()):
+        if first_in_line is None:
+            continue
+        if first_in_line.user.id != FAKE_USER_ID:
+            context.bot.send_message(first_in_line.user.id, f'Congratulations {first_in_line.user.full_name}, '
+                                                            f'you\'re on the playing list!')
+        else:
+            announcements.announce(context, TELEGRAM_CHAT_ID, f'Congratulations @{first_in_line.user.username}, '
+                                                              f'you\'re on the playing list!')
+
+
+def get_waiting_rank():
+    """Return the function ranking waiting players for promotion, or None to promote them in order"""
+    if WAITING_LIST_PRIORITY != 'fairness':
+        return None
+    today = clock.now().date()
+    return lambda player: fairness_ledger.score(player.user.id, today)
+
+
+def get_user_id_or_name(user):
+    """Return the key a user is asked to assume match liability by: the username, or the user id if there is none"""
+    return str(user.id) if not user.username else user.username
+
+
+# Insert queries of the back up tables, in the order they are written
+BACKUP_INSERT_QUERIES = {
+    'MATCHES': "INSERT INTO MATCHES (match_id, match_date, kickoff, pitch, pinned) VALUES(%s, %s, %s, %s, %s)",
+    'PLAYING': "INSERT INTO PLAYING (match_id, user_id, reservation_key, position, user_first_name, "
+               "user_last_name, user_username, player_liable, player_approved, player_match_ball)"
+               "VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+    'INVITED': "INSERT INTO INVITED (match_id, username, expires_at) VALUES(%s, %s, %s)",
+    'ASKED': "INSERT INTO ASKED (match_id, user_id_or_name) VALUES(%s, %s)",
+}
+
+
+def get_match_backup(match):
+    """Return a match's back up rows per table
+
+    Invitations are backed up with their expiry time, so they still expire on time after restarts"""
+    playing_rows = []
+    for position, player in enumerate(match.playing):
+        user_id = player.user.id
+        user_first_name = player.user.first_name
+        user_last_name = player.user.last_name
+        user_username = player.user.username if player.user.username is not None else ''
+        player_liable = player.liable
+        player_approved = player.approved
+        player_match_ball = player.match_ball
+        reservation_key = user_username if user_id == FAKE_USER_ID else ''
+        playing_rows.append((match.match_id, user_id, reservation_key, position, user_first_name, user_last_name,
+                             user_username, player_liable, player_approved, player_match_ball))
+
+    return {
+        'MATCHES': [(match.match_id, match.date, match.kickoff, match.pitch, match.pinned)],
+        'PLAYING': playing_rows,
+        'INVITED': [(match.match_id, username, match.invited.get(username).expires_at) for username in match.invited],
+        # inserted values must be tuples
+        'ASKED': [(match.match_id, user_id_or_name) for user_id_or_name in match.asked],
+    }
+
+
+def get_backup():
+    """Return the open matches' back up as a (delete query, insert query, rows) triplet per table"""
+    rows = {table: [] for table in BACKUP_INSERT_QUERIES}
+    for match in matches:
+        for table, match_rows in get_match_backup(match).items():
+            rows[table] += match_rows
+    return {table: (f"DELETE FROM {table}", insert_query, rows[table])
+            for table, insert_query in BACKUP_INSERT_QUERIES.items()}
+
+
+def save_match(match):
+    """Back up a match's rows right away, in the background (e.g. after a bulk edit)"""
+    replace_match_rows(match, get_match_backup(match))
+
+
+def clear_database_tables(match):
+    """Clear a match's rows from the back up tables in the background"""
+    replace_match_rows(match, {})
+
+
+def replace_match_rows(match, backup):
+    """Replace a match's rows in every back up table with the given rows per table, one write per table
+
+    Saving and clearing a match submit the same per table writes, so the database writer runs them in order."""
+    for table, insert_query in BACKUP_INSERT_QUERIES.items():
+        statements = [(f"DELETE FROM {table} WHERE match_id = %s", (match.match_id,))]
+        statements += [(insert_query, row) for row in backup.get(table, ())]
+        db_writer.submit(table, statements)
+
+
+def get_player_name(player):
+    """Return a player's latest known full name, or the username a reserved spot is kept for"""
+    if player.user.id == FAKE_USER_ID:
+        return f'@{player.user.username}'
+    user = player_directory.get(player.user.id) or player.user
+    return user.full_name
+
+
+def get_player_mention(player):
+    """Return a MarkdownV2 mention of a player (or of a reserved spot's username)"""
+    if player.user.id == FAKE_USER_ID:
+        return f'\@{player.user.username}'
+    return player.user.mention_markdown_v2()
+
+
+def addUser_by_user(user, tagged_user, index, update):
+    """Add a known user to the playing list"""
+    if not user_full_name_is_valid(tagged_user):
+        return update.message.reply_text(f'Hi {user.full_name}, you\'ve tried adding a user with an invalid '
+                                         f'telegram name!\n\nPlease advise him to change it and try again...')
+
+    tagged_player = TechnionFCPlayer(tagged_user)
+    if tagged_player in playing:
+        return update.message.reply_text(f'Hi {user.full_name}, '
+                                         f'user {tagged_user.full_name} is already on the playing list!')
+
+    if index is not None:
+        playing.insert(index, tagged_player)
+    else:
+        playing.append(tagged_player)
+    audit_log.record(user, 'addUser', tagged_user.full_name, current_match.match_id,
+                     {'user_id': tagged_user.id, 'position': index + 1 if index is not None else len(playing)})
+    update.message.reply_text(f'Congratulations {tagged_user.full_name}, '
+                              f'you were added to the playing list by {user.full_name}!')
+
+
+def addUser_by_username(user, index, update, context):
+    """Add player to the playing list using tagged username"""
+    tagged_username = context.args[0]
+    username = tagged_username.replace('@', '')
+
+    if username in invited:
+        return update.message.reply_text(f'Hi {user.full_name},\n'
+                                         f'Bot is currently waiting for {username} to accept your invitation!')
+
+    fake_user = User(id=FAKE_USER_ID, first_name='Reserved for', is_bot=False, last_name=username, username=username)
+    fake_player = TechnionFCPlayer(fake_user)
+    text = f'Hi @{username},\n{user.full_name} is trying to add you to the playing list\n\n'
+
+    invited.add(username, fake_player, clock.now() + timedelta(seconds=ACCEPT_TIMEFRAME))
+    if index is not None:
+        playing.insert(index, fake_player)
+    else:
+        playing.append(fake_player)
+    audit_log.record(user, 'addUser', f'@{username}', current_match.match_id,
+                     {'position': index + 1 if index is not None else len(playing)})
+
+    text += f'Your spot is reserved for the next 24 hours.\n' \
+            f'Please respond to this message with /accept'
+
+    return update.message.reply_text(text)
+
+
+def get_tagged_players(update):
+    """Return a (player, player name, text following the tag) triplet per user tagged in a message, in order
+
+    Tagged usernames of unknown users are returned as reserved spots."""
+    message = update.message
+    tags = [entity for entity in message.entities if entity.type in ('mention', 'text_mention')]
+    text = message.text.encode('utf-16-le')     # entity offsets count UTF-16 code units
+    targets = []
+    for position, entity in enumerate(tags):
+        end = tags[position + 1].offset if position + 1 < len(tags) else len(text) // 2
+        following = text[(entity.offset + entity.length) * 2:end * 2].decode('utf-16-le').strip()
+        tagged_user = entity.user or player_index.by_username(message.parse_entity(entity))
+        if tagged_user is None:
+            username = message.parse_entity(entity).lstrip('@')
+            fake_user = User(FAKE_USER_ID, 'Reserved for', is_bot=False, last_name=username, username=username)
+            targets.append((TechnionFCPlayer(fake_user), username, following))
+        else:
+            targets.append((TechnionFCPlayer(tagged_user), tagged_user.full_name, following))
+    return targets
+
+
+def get_bulk_problems(targets):
+    """Return the problems common to all bulk commands' targets: none tagged, or the same user tagged twice"""
+    if not targets:
+        return ['no users were tagged']
+    names = [player_name for _, player_name, _ in targets]
+    return [f'{name} was tagged more than once' for name in sorted(set(names)) if names.count(name) > 1]
+
+
+def get_bulk_problems_text(user, action, problems):
+    """Return the single reply listing every problem found with a bulk command's targets"""
+    text = f'Hi {user.full_name}, the bot did not {action} anyone, as:\n\n'
+    text += ''.join(f'- {problem}\n' for problem in problems)
+    return text + '\nPlease fix the command and try again!'
+
+
+def set_bulk_approval(update, context, approved, command):
+    """Approve (or cancel the approval of) several tagged listed players at once"""
+    user = update.message.from_user
+    if not valid_command_usage(update, context, user, ADMIN_PRIVILEGE, PUBLIC_COMMAND, command):
+        return
+
+    targets = get_tagged_players(update)
+    problems = get_bulk_problems(targets)
+    for player, player_name, _ in targets:
+        if player not in playing:
+            problems.append(f'{player_name} is not listed')
+    if problems:
+        return update.message.reply_text(get_bulk_problems_text(user, 'approve' if approved else 'unapprove',
+                                                                problems))
+
+    for player, player_name, _ in targets:
+        playing[playing.index(player)].approved = approved
+        audit_log.record(user, command, player_name, current_match.match_id, {'user_id': player.user.id})
+    save_match(current_match)
+    update.message.reply_text(f'{user.full_name} has {"approved" if approved else "cancelled"} the attendance of '
+                              f'{", ".join(player_name for _, player_name, _ in targets)}')
+
+
+def get_player_from_entity_id(update, context, entity_id):
+    """Get player (and player name) using message entity id"""
+    tagged_user = update.message.entities[entity_id].user   # second message entity is a TEXT_MENTION or a MENTION
+    if tagged_user is None:                                 # if message entity is a MENTION of a known player
+        tagged_user = player_index.by_username(context.args[entity_id-1])
+    if tagged_user is None:                                 # if message entity is a MENTION of an unknown username
+        tagged_username = context.args[entity_id-1]
+        username = tagged_username.replace('@', '')
+        fake_user = User(FAKE_USER_ID, first_name='', is_bot=False, username=username)
+        player = TechnionFCPlayer(fake_user)
+        player_name = username
+    else:                                                   # message entity is a TEXT_MENTION
+        player = TechnionFCPlayer(tagged_user)
+        player_name = tagged_user.full_name
+    return player, player_name
+
+
+def get_player_from_name(name):
+    """Get player (and player name) using a plain-text name. The player is None if the name is unknown or ambiguous"""
+    tagged_user = player_index.resolve(name)
+    if tagged_user is None:
+        return None, name
+    return TechnionFCPlayer(tagged_user), tagged_user.full_name
+
+
+def get_unknown_name_text(user, name):
+    """Return the reply to an admin naming a player the bot cannot tell, suggesting similar known players"""
+    text = f'Hi {user.full_name}, the bot could not tell who {name} is...\n\n'
+    matches = player_index.search(name)
+    if matches:
+        text += 'Did you mean:\n' + ''.join(f'{match.full_name}\n' for _, match in matches) + '\n'
+    return text + 'Please make sure to tag the user, or write their full name!'
+
+
+def index_users(update, context):
+    """Keep the player directory (and index) current with the users the bot sees, including the ones tagged by
+    TEXT_MENTIONs. A changed name replaces the cached profile"""
+    player_directory.observe(update.effective_user)
+    if update.message is not None:
+        for entity in update.message.entities:
+            player_directory.observe(entity.user)
+
+
+def load_player_index():
+    """Load the known players into the player directory and index, along with the players on the restored lists"""
+    try:
+        db_connection = sql_database.get_connection()
+        with db_connection.cursor() as cur:
+            cur.execute("SELECT user_id, user_first_name, user_last_name, user_username FROM PLAYERS")
+            player_directory.load(User(user_id, first_name=user_first_name or '', is_bot=False,
+                                       last_name=user_last_name, username=user_username or None)
+                                  for user_id, user_first_name, user_last_name, user_username in cur)
+        db_connection.commit()
+    except Error as err:
+        logger.error(f"Error loading the player index: {err}")
+        sql_database.restart_connection()
+
+    for match in matches:
+        for player in match.playing:
+            player_directory.observe(player.user)
+    logger.info(f"Indexed {len(player_index)} players")
+
+
+def load_player_history():
+    """Load the players' history, which waiting list priority is scored by"""
+    try:
+        db_connection = sql_database.get_connection()
+        with db_connection.cursor() as cur:
+            cur.execute("SELECT user_id, recent_bumps, last_bumped, attended, removed, approvals, approval_lead_hours "
+                        "FROM PLAYER_HISTORY")
+            fairness_ledger.load(cur.fetchall())
+        db_connection.commit()
+    except Error as err:
+        logger.error(f"Error loading the player history: {err}")
+        sql_database.restart_connection()
+    logger.info(f"Loaded the history of {len(fairness_ledger)} players")
+
+
+def load_team_rules():
+    """Load the team rules, and every player's last match's team"""
+    try:
+        db_connection = sql_database.get_connection()
+        with db_connection.cursor() as cur:
+            cur.execute("SELECT user_id, other_id, kind, hard FROM TEAM_RULES")
+            rules = cur.fetchall()
+            cur.execute("SELECT user_id, match_id, team FROM LAST_TEAMS")
+            team_rules.load(rules, cur.fetchall())
+        db_connection.commit()
+    except Error as err:
+        logger.error(f"Error loading the team rules: {err}")
+        sql_database.restart_connection()
+    logger.info(f"Loaded {len(team_rules)} team rules")
+
+
+def subscribe_to_changes(job_queue):
+    """Patch the cached tables with the changes other bot processes notify of, reloading them on the job queue when
+    notifications may have been missed"""
+    change_feed.subscribe('PLAYERS', lambda op, rows: player_directory.load(
+        User(user_id, first_name=first_name or '', is_bot=False, last_name=last_name, username=username or None)
+        for user_id, first_name, last_name, username in rows))
+    change_feed.subscribe('PLAYER_HISTORY', lambda op, rows: fairness_ledger.load(rows))
+    change_feed.subscribe('TEAM_RULES', team_rules.patch_rules)
+    change_feed.subscribe('LAST_TEAMS', team_rules.patch_last_teams)
+    change_feed.subscribe('ROSTER_STATE', lambda op, rows: job_queue.run_once(refresh_roster, 0))
+    change_feed.on_reconnect(lambda: job_queue.run_once(reload_caches, 0))
+
+
+def refresh_roster(context):
+    """Load the roster another bot process changed, so the roster endpoint serves its version right away"""
+    shared_roster.refresh()
+
+
+def reload_caches(context):
+    """Reload the cached tables"""
+    load_player_index()
+    load_player_history()
+    load_team_rules()
+
+
+def get_request_fields(update):
+    """Return the command, user id and chat id of an update, as structured log fields"""
+    if update.callback_query is not None:
+        return {'command': update.callback_query.data.split(':')[0], 'user_id': update.callback_query.from_user.id,
+                'chat_id': update.effective_chat.id if update.effective_chat else None}
+    message = update.effective_message
+    command = message.text.split()[0][1:].split('@')[0] if message and message.text else None
+    return {'command': command, 'user_id': update.effective_user.id if update.effective_user else None,
+            'chat_id': update.effective_chat.id if update.effective_chat else None}
+
+
+def error(update, context):
+    """Log Errors caused by Updates (or jobs), with their traceback"""
+    fields = get_request_fields(update) if isinstance(update, Update) else {}
+    logger.warning(f"Update {getattr(update, 'update_id', None)} caused error {context.error!r}",
+                   exc_info=context.error, extra=fields)
+
+
+def restore_from_database():
+    """Restore the open matches from database back up, linking pending invitations to their reserved spots"""
+    try:
+        db_connection = sql_database.get_connection()
+        with db_connection.cursor() as cur:
+            cur.execute("SELECT match_date, kickoff, pitch, pinned FROM MATCHES")
+            matches_data = cur.fetchall()
+            cur.execute("SELECT match_id, user_id, user_first_name, user_last_name, user_username, "
+                        "player_liable, player_approved, player_match_ball FROM PLAYING ORDER BY match_id, position")
+            players_data = cur.fetchall()
+            cur.execute("SELECT match_id, username, expires_at FROM INVITED")
+            invited_data = cur.fetchall()
+            cur.execute("SELECT match_id, user_id_or_name FROM ASKED")
+            asked_data = cur.fetchall()
+    except OperationalError as err:
+        logger.error(f"Operational error during restore: {err}")
+        sql_database.restart_connection()
+        return
+    except DatabaseError as err:
+        logger.error(f"Database error during restore: {err}")
+        db_connection.rollback()
+        return
+
+    restored = {}
+    for match_date, kickoff, pitch, pinned in matches_data:
+        match = Match(match_date, kickoff, pitch, pinned)
+        restored[match.match_id] = match
+
+    def get_match(match_id):
+        # rows backed up before there were several matches belong to the next regular matchday's match
+        if match_id not in restored:
+            restored[match_id] = Match(get_next_matchday(clock.now().date()))
+        return restored[match_id]
+
+    for player_data in players_data:
+        (match_id, user_id, user_first_name, user_last_name, user_username,
+         player_liable, player_approved, player_match_ball) = player_data
+        user = User(user_id, first_name=user_first_name, is_bot=False, last_name=user_last_name, username=user_username)
+        player = TechnionFCPlayer(user, player_liable, player_approved, player_match_ball)
+        get_match(match_id).playing.append(player)
+
+    for invited_tuple in invited_data:
+        (match_id, invited_player, expires_at) = invited_tuple
+        match = get_match(match_id)
+        reserved = next((player for player in match.playing
+                         if player.user.id == FAKE_USER_ID and player.user.username == invited_player), None)
+        if expires_at is None:      # backed up before invitations had an expiry time
+            expires_at = clock.now() + timedelta(seconds=ACCEPT_TIMEFRAME)
+        match.invited.add(invited_player, reserved, expires_at)
+
+    for asked_tuple in asked_data:
+        (match_id, asked_player) = asked_tuple
+        match = get_match(match_id)
+        listed = next((player for player in match.playing
+                       if player.user.id != FAKE_USER_ID and get_user_id_or_name(player.user) == asked_player), None)
+        match.asked.add(asked_player, listed)
+
+    for match in restored.values():
+        if not match.is_empty() or match.pinned:
+            matches.add(match)
+
+# endregion
+
+
+@contextmanager
+def shutdown_phase(name):
+    """Log the time a shutdown phase takes"""
+    started = perf_counter()
+    yield
+    logger.info(f"Shutdown phase '{name}' took {perf_counter() - started:.2f} seconds")
+
+
+def profile_on_signal(signum, frame):
+    """Profile the bot in the background, writing the results to the profile directory (e.g. on kill -USR1)"""
+    def run():
+        try:
+            diagnose(PROFILE_DEFAULT_SECONDS, PROFILE_DIRECTORY)
+        except (RuntimeError, OSError) as err:
+            logger.error(f"Profiling on signal failed: {err}")
+    Thread(target=run, name='profiler', daemon=True).start()
+
+
+def graceful_shutdown(updater):
+    """Stop the bot within Heroku's grace period without losing changes made since the last back up"""
+    started = perf_counter()
+    deadline = started + SHUTDOWN_TIMEOUT
+
+    with shutdown_phase('stop ingesting webhook updates'):
+        if updater.httpd is not None:
+            updater.httpd.shutdown()
+
+    with shutdown_phase('drain in-flight updates'):
+        while not updater.update_queue.empty() and perf_counter() < deadline - 15:
+            sleep(0.05)
+        updater.stop()      # waits for the running handlers and jobs to finish
+
+    with shutdown_phase('send pending announcements'):
+        try:
+            announcements.flush(updater.bot)
+        except TelegramError as err:
+            logger.error(f"Error sending pending announcements on shutdown: {err}")
+
+    with shutdown_phase('flush pending database writes'):
+        audit_log.flush()
+        player_directory.flush()
+        fairness_ledger.flush()
+        if not db_writer.stop(timeout=max(deadline - perf_counter() - 5, 0)):
+            logger.error("Database writer did not finish its pending writes in time")
+        sql_database.stop_listening(timeout=2)
+
+    with shutdown_phase('flush list and pending timers'):
+        try:
+            db_connection = sql_database.get_connection()
+            with db_connection.cursor() as cur:
+                for delete_query, insert_query, rows in get_backup().values():
+                    cur.execute(delete_query)
+                    cur.executemany(insert_query, rows)
+            db_connection.commit()
+        except Error as err:
+            logger.error(f"Error flushing list on shutdown: {err}")
+
+    if traffic_recorder is not None:
+        traffic_recorder.stop(timeout=2)
+    logger.info(f"Shutdown took {perf_counter() - started:.2f} seconds")
+    log_listener.stop()     # writes the records still queued
+
+
+def register_handlers(dispatcher):
+    """Register the bot's command, callback query and error handlers"""
+    # record every update when recording traffic, index every user the bot sees, then drop rate limited commands and
+    # button presses before other handlers see them
+    if traffic_recorder is not None:
+        dispatcher.add_handler(TypeHandler(Update, record_update), group=-3)
+    dispatcher.add_handler(TypeHandler(Update, index_users), group=-2)
+    dispatcher.add_handler(TypeHandler(Update, rate_limit_check), group=-1)
+
+    # on different commands - answer in Telegram
+    dispatcher.add_handler(CommandHandler("start", start_command, pass_job_queue=True))
+    dispatcher.add_handler(CommandHandler("help", help_command))
+    dispatcher.add_handler(CommandHandler("create", create_command))
+    dispatcher.add_handler(CommandHandler("add", add_command))
+    dispatcher.add_handler(CommandHandler("remove", remove_command))
+    dispatcher.add_handler(CommandHandler("liable", liable_command))
+    dispatcher.add_handler(CommandHandler("accept", accept_command))
+    dispatcher.add_handler(CommandHandler("approve", approve_command))
+    dispatcher.add_handler(CommandHandler("assume", assume_command))
+    dispatcher.add_handler(CommandHandler("ball", ball_command))
+    dispatcher.add_handler(CommandHandler("print", print_command))
+    dispatcher.add_handler(CommandHandler("shuffle", shuffle_command))
+    dispatcher.add_handler(CommandHandler("rules", rules_command))
+    dispatcher.add_handler(CommandHandler("schedule", schedule_command))
+    dispatcher.add_handler(CommandHandler("addUser", addUser_command))
+    dispatcher.add_handler(CommandHandler("addExternal", addExternal_command))
+    dispatcher.add_handler(CommandHandler("removeUser", removeUser_command))
+    dispatcher.add_handler(CommandHandler("createList", createList_command))
+    dispatcher.add_handler(CommandHandler("clearAll", clearAll_command))
+    dispatcher.add_handler(CommandHandler("transferLiability", transferLiability_command))
+    dispatcher.add_handler(CommandHandler("liableUser", liableUser_command))
+    dispatcher.add_handler(CommandHandler("addUsers", addUsers_command))
+    dispatcher.add_handler(CommandHandler("removeUsers", removeUsers_command))
+    dispatcher.add_handler(CommandHandler("approveUsers", approveUsers_command))
+    dispatcher.add_handler(CommandHandler("unapproveUsers", unapproveUsers_command))
+    dispatcher.add_handler(CommandHandler("reorderWaiting", reorderWaiting_command))
+    dispatcher.add_handler(CommandHandler("addMatch", addMatch_command))
+    dispatcher.add_handler(CommandHandler("matches", matches_command))
+
+    # on inline keyboard buttons - answer the callback query
+    dispatcher.add_handler(CallbackQueryHandler(roster_button_callback, pattern='^(approve|ball|remove):'))
+
+    # run every command and button press on the latest roster of the match it refers to, publishing its changes to
+    # other bot processes
+    for handler in dispatcher.handlers[0]:
+        handler.callback = log_request(shared_roster.transaction(match_handler(handler.callback)))
+
+    # exports only read the database, so they run in the background without holding the roster
+    dispatcher.add_handler(CommandHandler("export", export_command, run_async=True))
+    # profiles watch the other threads, so they must not hold the roster either
+    dispatcher.add_handler(CommandHandler("profile", profile_command, run_async=True))
+    dispatcher.add_handler(CommandHandler("audit", audit_command, run_async=True))
+    # team rules are kept apart from the rosters
+    dispatcher.add_handler(CommandHandler("teamRule", teamRule_command, run_async=True))
+
+    # log all errors
+    dispatcher.add_error_handler(error)
+
+
+def recorded_job(callback):
+    """Wrap a job callback so its runs are recorded when recording traffic"""
+    return traffic_recorder.job(callback) if traffic_recorder is not None else callback
+
+
+def record_update(update, context):
+    """Record every update the bot receives, when recording traffic"""
+    traffic_recorder.record_update(update.to_dict())
+
+
+def register_jobs(job_queue):
+    """Schedule the bot's jobs
+
+    Jobs changing the roster run only on the process holding the leader lease when several bot processes are running"""
+    # run backup_to_database at backup time intervals
+    job_queue.run_repeating(recorded_job(leader_job(backup_to_database)), BACKUP_INTERVAL)
+
+    # run log_throttled_requests, log_database_writer_stats and log_announcement_stats at backup time intervals
+    job_queue.run_repeating(recorded_job(log_throttled_requests), BACKUP_INTERVAL)
+    job_queue.run_repeating(recorded_job(log_database_writer_stats), BACKUP_INTERVAL)
+    job_queue.run_repeating(recorded_job(log_announcement_stats), BACKUP_INTERVAL)
+
+    # run flush_audit_log at audit flush intervals, writing the entries recorded since
+    job_queue.run_repeating(recorded_job(flush_audit_log), AUDIT_FLUSH_INTERVAL)
+
+    # run flush_player_directory at player directory flush intervals, writing the profiles changed since
+    job_queue.run_repeating(recorded_job(flush_player_directory), PLAYER_DIRECTORY_FLUSH_INTERVAL)
+
+    # run check_accepted every minute, removing all invitations that expired since
+    job_queue.run_repeating(recorded_job(leader_job(match_job(check_accepted, held_today=False))),
+                            EXPIRY_CHECK_INTERVAL)
+
+    # run kindly_reminder every matchday @ 12:30
+    job_queue.run_daily(recorded_job(leader_job(match_job(kindly_reminder))),
+                        time(hour=12, minute=30, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+
+    # run final_reminder every matchday @ 15:00
+    job_queue.run_daily(recorded_job(leader_job(match_job(final_reminder))),
+                        time(hour=15, minute=0, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+
+    # run remove_non_attenders every matchday @ 16:00, 16:30, 17:00, 17:30, 18:00
+    job_queue.run_daily(recorded_job(leader_job(match_job(remove_non_attenders))),
+                        time(hour=16, minute=0, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(remove_non_attenders))),
+                        time(hour=16, minute=30, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(remove_non_attenders))),
+                        time(hour=17, minute=0, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(remove_non_attenders))),
+                        time(hour=17, minute=30, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(remove_non_attenders))),
+                        time(hour=18, minute=0, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+
+    # run print_list every matchday @ 11:15, 13:15, 15:15, 17:15, 18:15, and 19:15
+    job_queue.run_daily(recorded_job(leader_job(match_job(print_lists))),
+                        time(hour=11, minute=15, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(print_lists))),
+                        time(hour=13, minute=15, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(print_lists))),
+                        time(hour=15, minute=15, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(print_lists))),
+                        time(hour=17, minute=15, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(print_lists))),
+                        time(hour=18, minute=15, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY)
+    job_queue.run_daily(recorded_job(leader_job(match_job(print_lists))),
+                        time(hour=19, minute=15, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY,
+                        context=True)
+
+    # run clear_list every matchday @ 23:59:59
+    job_queue.run_daily(recorded_job(leader_job(match_job(list_cleanup))),
+                        time(hour=23, minute=59, second=59, tzinfo=timezone('Asia/Jerusalem')),
+                        days=EVERY_DAY,
+                        context=TELEGRAM_CHAT_ID)
+
+
+def main():
+    """The official Technion FC Telegram bot"""
+
+    request = DeferringRequest(shared_roster, con_pool_size=8, read_timeout=60, connect_timeout=60)
+    updater = Updater(bot=ExtBot(TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_BASE_URL, request=request), use_context=True)
+
+    # Get the dispatcher to register handlers
+    dp = updater.dispatcher
+    register_handlers(dp)
+
+    # restore data from back up, unless other bot processes are already sharing a more recent roster
+    restore_from_database()
+    shared_roster.start()
+    load_player_index()
+    load_player_history()
+    load_team_rules()
+    subscribe_to_changes(dp.job_queue)
+    if CHANGE_NOTIFICATIONS:
+        sql_database.listen(change_feed)
+    roster_feed.publish(get_public_roster(roster_snapshot()), shared_roster.version)
+    if traffic_recorder is not None:
+        traffic_recorder.record_snapshot(roster_snapshot())
+
+    register_jobs(dp.job_queue)
+
+    # Start the Bot
+    # updater.start_polling()
+    updater.start_webhook(listen="0.0.0.0",
+                          port=int(PORT),
+                          url_path=TELEGRAM_BOT_TOKEN,
+                          webhook_url='https://technionfc-telegram-bot.herokuapp.com/' + TELEGRAM_BOT_TOKEN)
+
+    # serve the roster as JSON to the club site and members' scripts, so they don't have to /print it
+    if ROSTER_ENDPOINT:
+        roster_feed.mount(updater.httpd, ROSTER_ENDPOINT, ROSTER_LONG_POLL_TIMEOUT)
+
+    # Run the bot until you press Ctrl-C or the process receives SIGINT, SIGTERM or SIGABRT (Heroku sends SIGTERM
+    # when restarting the dyno), then shut it down gracefully
+    stop_requested = Event()
+    for signum in (SIGINT, SIGTERM, SIGABRT):
+        signal(signum, lambda signum, frame: stop_requested.set())
+    if SIGUSR1 is not None:
+        signal(SIGUSR1, profile_on_signal)
+    while not stop_requested.wait(1):
+        pass
+    graceful_shutdown(updater)
+
+
+# Press the green button in the gutter to run the script.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+from datetime import datetime
+from pytz import timezone
+
+ISRAEL_TIMEZONE = timezone('Asia/Jerusalem')
+
+
+class Clock:
+    """This object tells the bot what time it is in Israel"""
+    def now(self):
+        """Return the current time in Israel"""
+        return datetime.now(tz=ISRAEL_TIMEZONE)
+
+
+class SimulatedClock(Clock):
+    """This object represents a clock that only moves when it is told to"""
+    def __init__(self, start):
+        self._now = ISRAEL_TIMEZONE.normalize(start)
+
+    def now(self):
+        return self._now
+
+    def set(self, moment):
+        """Move the clock to the given (timezone aware) moment"""
+        self._now = ISRAEL_TIMEZONE.normalize(moment)
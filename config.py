@@ -1,10 +1,71 @@
-import os
-
-# Telegram bot
-TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
-TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '')
-TELEGRAM_GROUP_INVITE_LINK = os.environ.get('TELEGRAM_GROUP_INVITE_LINK', '')
-PORT = int(os.environ.get('PORT', 8443))
-
-# Postgres connection
-DATABASE_URL = os.environ.get('DATABASE_URL', '')
+import os
+import tempfile
+
+# Telegram bot
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
+TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '')
+TELEGRAM_GROUP_INVITE_LINK = os.environ.get('TELEGRAM_GROUP_INVITE_LINK', '')
+PORT = int(os.environ.get('PORT', 8443))
+# Bot API server, replaced by a local stand-in when load testing (see loadtest.py)
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+
+# Opt-in recording of the updates received and the jobs run to gzip compressed logs, for replay.py, one per process
+# start named after the path. Ids and names are replaced by pseudonyms derived from the salt, which must be a secret of
+# at least 16 bytes (recording is off otherwise)
+RECORD_TRAFFIC_PATH = os.environ.get('RECORD_TRAFFIC_PATH', '')
+RECORD_TRAFFIC_SALT = os.environ.get('RECORD_TRAFFIC_SALT', '')
+
+# Logging: root level, per logger levels as '<logger>=<level>' pairs, 'json' or 'text' lines, and how many debug
+# records are written per one kept (debug records of busy loggers are sampled)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('LOG_LEVELS', 'telegram=WARNING,apscheduler=WARNING,psycopg=WARNING,tornado=WARNING')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_DEBUG_SAMPLE_RATE = int(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 10))
+
+# Admin profiling (/profile or kill -USR1): default and maximal duration in seconds, and where signal triggered
+# profiles are written
+PROFILE_DEFAULT_SECONDS = float(os.environ.get('PROFILE_DEFAULT_SECONDS', 15))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+PROFILE_DIRECTORY = os.environ.get('PROFILE_DIRECTORY', tempfile.gettempdir())
+
+# Audit log entries are written in batches of this size, or every this many seconds
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 50))
+AUDIT_FLUSH_INTERVAL = int(os.environ.get('AUDIT_FLUSH_INTERVAL', 30))
+
+# New and changed player profiles are written to PLAYERS every this many seconds
+PLAYER_DIRECTORY_FLUSH_INTERVAL = int(os.environ.get('PLAYER_DIRECTORY_FLUSH_INTERVAL', 60))
+
+# Waiting list promotion order: 'fifo' (first come, first promoted) or 'fairness' (recently bumped, reliable and early
+# approving players first)
+WAITING_LIST_PRIORITY = os.environ.get('WAITING_LIST_PRIORITY', 'fifo').lower()
+
+# Postgres connection
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+# Direct message reminders
+DM_REMINDERS = os.environ.get('DM_REMINDERS', '').lower() == 'true'
+DM_REMINDER_WORKERS = int(os.environ.get('DM_REMINDER_WORKERS', 8))
+DM_REMINDER_RATE = int(os.environ.get('DM_REMINDER_RATE', 25))     # Telegram allows about 30 messages per second
+
+# Group announcements made within this many seconds of each other are merged into a single message (0 to disable)
+ANNOUNCEMENT_WINDOW = float(os.environ.get('ANNOUNCEMENT_WINDOW', 10))
+
+# Command rate limits, as '<command>=<commands>/<seconds>' pairs. Policy is either 'silent' or 'warn'
+RATE_LIMITS = os.environ.get('RATE_LIMITS', 'print=3/60,shuffle=3/60,ball=4/60,approve=4/60,schedule=2/60,rules=2/60')
+RATE_LIMIT_DEFAULT = os.environ.get('RATE_LIMIT_DEFAULT', '6/60')
+# Admins edit the list in bursts (e.g. when tidying it after a game), so their list commands have a higher limit
+RATE_LIMIT_ADMIN = os.environ.get('RATE_LIMIT_ADMIN', '30/60')
+RATE_LIMIT_POLICY = os.environ.get('RATE_LIMIT_POLICY', 'warn')
+
+# Several bot processes sharing the roster through the database, with scheduled jobs run by a single leader
+SHARED_STATE = os.environ.get('SHARED_STATE', '').lower() == 'true'
+LEADER_LOCK_KEY = int(os.environ.get('LEADER_LOCK_KEY', 7140611))
+
+# Cached tables (the roster, player profiles and history, team rules) patched by the Postgres change notifications of
+# other bot processes, instead of being read again. On by default when sharing the roster
+CHANGE_NOTIFICATIONS = os.environ.get('CHANGE_NOTIFICATIONS', str(SHARED_STATE)).lower() == 'true'
+
+# Read-only JSON roster endpoint served next to the webhook (empty to disable). Long polls are capped below Heroku's
+# 30 seconds router timeout
+ROSTER_ENDPOINT = os.environ.get('ROSTER_ENDPOINT', '/roster.json')
+ROSTER_LONG_POLL_TIMEOUT = int(os.environ.get('ROSTER_LONG_POLL_TIMEOUT', 25))
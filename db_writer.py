@@ -0,0 +1,125 @@
+import time
+import logging
+from collections import Counter
+from threading import Thread, Event
+from queue import Queue, Full
+
+from psycopg import OperationalError, InterfaceError, DatabaseError, Error
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseWriter:
+    """This class runs database writes on a background thread, so handlers don't wait on the database
+
+    Writes run one at a time in submission order (and therefore in order per table), each in its own transaction,
+    on a connection owned by the writer. Writes failing on connection errors are retried after reconnecting. Writes of
+    cached rows notify other bot processes of them through the change feed, in the same transaction."""
+
+    def __init__(self, database, feed=None, max_queue_size=1000, max_attempts=5, retry_delay=1.0):
+        self._database = database
+        self._feed = feed
+        self._queue = Queue(maxsize=max_queue_size)
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._connection = None
+        self.written = Counter()        # number of writes committed per table
+        self.errors = Counter()         # number of failed attempts per table
+        self.dropped = Counter()        # number of writes given up on per table
+        self._thread = Thread(target=self._run, name='database-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, table, statements, changed=None, op='upsert', timeout=1.0):
+        """Queue a list of (query, params) statements to be run in a single transaction on the given table
+
+        Other bot processes caching the table are notified of the `changed` rows (upserted or deleted) on commit."""
+        if changed and self._feed is not None:
+            statements = statements + self._feed.statements(table, changed, op)
+        try:
+            self._queue.put((table, statements), timeout=timeout)
+        except Full:
+            logger.error(f"Database writer queue is full, dropping write to {table}")
+            self.dropped[table] += 1
+
+    def flush(self, timeout=None):
+        """Wait until all writes submitted so far are done. Return False if the timeout expired first"""
+        deadline = get_deadline(timeout)
+        done = Event()
+        try:
+            self._queue.put((None, done), timeout=get_remaining(deadline))
+        except Full:
+            return False
+        return done.wait(get_remaining(deadline))
+
+    def stop(self, timeout=None):
+        """Flush pending writes and stop the writer thread, within the timeout. Return False if writes were left"""
+        deadline = get_deadline(timeout)
+        flushed = self.flush(timeout)
+        try:
+            self._queue.put((None, None), timeout=get_remaining(deadline))
+        except Full:        # the (daemon) thread is still busy writing, and ends with the process
+            logger.error(f"Database writer is stuck with {self._queue.qsize()} writes queued, not waiting for it")
+            return False
+        self._thread.join(get_remaining(deadline))
+        return flushed and not self._thread.is_alive()
+
+    def _run(self):
+        while True:
+            table, statements = self._queue.get()
+            if table is None:
+                if statements is None:      # stop request
+                    break
+                statements.set()            # flush request
+                continue
+            self._write(table, statements)
+        self._close()
+
+    def _write(self, table, statements):
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                connection = self._get_connection()
+                with connection.cursor() as cur:
+                    for query, params in statements:
+                        cur.execute(query, params)
+                connection.commit()
+                self.written[table] += 1
+                return
+            except (OperationalError, InterfaceError) as err:
+                logger.error(f"Operational error writing to {table} (attempt {attempt}): {err}")
+                self.errors[table] += 1
+                self._close()
+                time.sleep(self._retry_delay * attempt)
+            except DatabaseError as err:
+                logger.error(f"Database error writing to {table}: {err}")
+                self.errors[table] += 1
+                self._rollback()
+                break
+        self.dropped[table] += 1
+
+    def _get_connection(self):
+        if self._connection is None or self._connection.closed:
+            self._connection = self._database.new_connection()
+        return self._connection
+
+    def _rollback(self):
+        try:
+            self._connection.rollback()
+        except Error:
+            self._close()
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Error as err:
+                logger.error(f"Error closing database writer connection: {err}")
+            self._connection = None
+
+
+def get_deadline(timeout):
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def get_remaining(deadline):
+    """Return the seconds left until a deadline (None for no deadline)"""
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
@@ -0,0 +1,159 @@
+import os
+import gc
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:         # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005         # seconds between two stack samples
+TOP_ALLOCATIONS = 25            # allocation sites listed in the memory report
+TRACEMALLOC_FRAMES = 10         # frames kept per traced allocation
+
+_running = threading.Lock()     # one profile at a time, however it was requested
+
+
+class SamplingProfiler:
+    """This class samples the stacks of the process' threads at a fixed interval
+
+    Unlike cProfile, which only sees the thread that enabled it, sampling sees the dispatcher, its async workers and
+    the job queue threads at once, at a cost independent of how many calls they make. Stacks are counted in the
+    collapsed format ('thread;outer;...;inner count' lines) taken by flamegraph tools."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_prefixes=None):
+        self._interval = interval
+        self._thread_prefixes = tuple(thread_prefixes) if thread_prefixes else None
+        self.stacks = Counter()
+        self.samples = 0
+
+    def run(self, duration):
+        """Sample the other threads' stacks for the given number of seconds"""
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == me or (self._thread_prefixes and not name.startswith(self._thread_prefixes)):
+                    continue
+                self.stacks[f'{name};{collapse(frame)}'] += 1
+            self.samples += 1
+            time.sleep(self._interval)
+
+    def collapsed(self):
+        """Return the sampled stacks in the collapsed format, most frequent first"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def collapse(frame):
+    """Return a frame's stack as 'outer;...;inner' function names"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def get_rss():
+    """Return the (current, peak) resident set size in bytes, None where unknown"""
+    current = peak = None
+    try:
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == 'darwin' else 1024         # kilobytes on Linux, bytes on macOS
+    return current, peak
+
+
+def get_thread_states():
+    """Return a line per thread with its name, flags and the function it's currently in"""
+    frames = sys._current_frames()
+    lines = []
+    for thread in sorted(threading.enumerate(), key=lambda thread: thread.name):
+        frame = frames.get(thread.ident)
+        where = f'{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})' \
+            if frame is not None else 'unknown'
+        flags = ', '.join(flag for flag, on in (('daemon', thread.daemon), ('alive', thread.is_alive())) if on)
+        lines.append(f'{thread.name} [{flags}] in {where}')
+    return lines
+
+
+def diagnose(duration, directory, thread_prefixes=None):
+    """Profile the process for the given number of seconds and write a report and collapsed stacks to a directory
+
+    Memory allocations are traced for the same time, unless tracemalloc is already tracing (then it keeps tracing).
+    Return the paths of the written files. Raise RuntimeError if another profile is running."""
+    if not _running.acquire(blocking=False):
+        raise RuntimeError('another profile is already running')
+    try:
+        return _diagnose(duration, directory, thread_prefixes)
+    finally:
+        _running.release()
+
+
+def _diagnose(duration, directory, thread_prefixes):
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    before = tracemalloc.take_snapshot()
+    gc_before = [stats['collections'] for stats in gc.get_stats()]
+
+    profiler = SamplingProfiler(thread_prefixes=thread_prefixes)
+    started = time.monotonic()
+    profiler.run(duration)
+    elapsed = time.monotonic() - started
+
+    after = tracemalloc.take_snapshot()
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    if started_tracing:
+        tracemalloc.stop()
+    current_rss, peak_rss = get_rss()
+    gc_after = [stats['collections'] for stats in gc.get_stats()]
+
+    lines = [f'Profiled for {elapsed:.1f} seconds: {profiler.samples} samples, {len(profiler.stacks)} distinct stacks',
+             '',
+             f'RSS: {format_size(current_rss)} (peak {format_size(peak_rss)})',
+             f'Traced memory: {format_size(traced)} (peak {format_size(traced_peak)})',
+             f'GC counts: {gc.get_count()}, collections per generation during profiling: '
+             f'{[after_count - before_count for before_count, after_count in zip(gc_before, gc_after)]}',
+             f'GC objects tracked: {len(gc.get_objects())}',
+             '',
+             f'Threads ({threading.active_count()}):']
+    lines += [f'  {line}' for line in get_thread_states()]
+    lines += ['', f'Top {TOP_ALLOCATIONS} allocation sites growing during profiling:']
+    lines += [f'  {stat}' for stat in after.compare_to(before, 'lineno')[:TOP_ALLOCATIONS]]
+    lines += ['', f'Top {TOP_ALLOCATIONS} allocation sites:']
+    lines += [f'  {stat}' for stat in after.statistics('lineno')[:TOP_ALLOCATIONS]]
+
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    report_path = os.path.join(directory, f'diagnostics-{timestamp}.txt')
+    stacks_path = os.path.join(directory, f'stacks-{timestamp}.collapsed')
+    with open(report_path, 'w', encoding='utf-8') as report:
+        report.write('\n'.join(lines) + '\n')
+    with open(stacks_path, 'w', encoding='utf-8') as stacks:
+        stacks.write(profiler.collapsed())
+    logger.info(f"Wrote diagnostics to {report_path} and {stacks_path}")
+    return [report_path, stacks_path]
+
+
+def format_size(size):
+    if size is None:
+        return 'unknown'
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
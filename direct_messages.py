@@ -0,0 +1,71 @@
+import time
+import logging
+from threading import Lock
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.error import RetryAfter, Unauthorized, BadRequest, NetworkError, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Delivery receipt of a single direct message
+Receipt = namedtuple('Receipt', ('chat_id', 'delivered', 'attempts', 'error'))
+
+
+class RateLimiter:
+    """Space out calls made by several threads so no more than `rate` calls per second are made"""
+    def __init__(self, rate):
+        self._interval = 1.0 / rate
+        self._next_slot = time.monotonic()
+        self._lock = Lock()
+
+    def wait(self):
+        """Block until the calling thread is allowed to make its call"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DirectMessageFanOut:
+    """This class sends personal messages to many users on a bounded thread pool"""
+
+    def __init__(self, max_workers, rate, max_attempts=3):
+        self._max_workers = max_workers
+        self._rate_limiter = RateLimiter(rate)
+        self._max_attempts = max_attempts
+
+    def send_all(self, bot, chat_ids, text, **kwargs):
+        """Send text to every chat id and return a delivery receipt per chat id"""
+        if not chat_ids:
+            return {}
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='direct-message') as executor:
+            receipts = list(executor.map(lambda chat_id: self._send(bot, chat_id, text, **kwargs), chat_ids))
+
+        failed = sum(not receipt.delivered for receipt in receipts)
+        logger.info(f"Sent {len(receipts) - failed}/{len(receipts)} direct messages "
+                    f"in {time.monotonic() - start:.2f} seconds")
+        return {receipt.chat_id: receipt for receipt in receipts}
+
+    def _send(self, bot, chat_id, text, **kwargs):
+        """Send a single message, retrying when Telegram asks us to slow down or the network fails"""
+        error = None
+        for attempt in range(1, self._max_attempts + 1):
+            self._rate_limiter.wait()
+            try:
+                bot.send_message(chat_id, text, **kwargs)
+                return Receipt(chat_id, True, attempt, None)
+            except RetryAfter as err:
+                error = err
+                time.sleep(err.retry_after)
+            except (Unauthorized, BadRequest) as err:   # e.g. the user has never started a chat with the bot
+                return Receipt(chat_id, False, attempt, str(err))
+            except NetworkError as err:                 # includes TimedOut
+                error = err
+            except TelegramError as err:
+                return Receipt(chat_id, False, attempt, str(err))
+        return Receipt(chat_id, False, self._max_attempts, str(error))
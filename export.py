@@ -0,0 +1,108 @@
+import os
+import csv
+import gzip
+import logging
+import argparse
+from datetime import datetime
+
+from psycopg import sql
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:         # parquet exports are optional, CSV exports only need the standard library
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Tables exported by default: the players with their ratings and history, the lists' back up, the audit log, and the
+# rules teams are split by with the last split. The shared roster (ROSTER_STATE) is a copy of the lists, so it isn't
+EXPORT_TABLES = ('PLAYERS', 'MATCHES', 'PLAYING', 'INVITED', 'ASKED', 'AUDIT', 'PLAYER_HISTORY', 'TEAM_RULES',
+                 'LAST_TEAMS')
+EXPORT_FORMATS = ('csv', 'parquet')
+BATCH_SIZE = 5000           # rows fetched from the server (and held in memory) at a time
+
+
+def export_table(connection, table, path, export_format='csv', batch_size=BATCH_SIZE):
+    """Stream a table into a gzip compressed CSV or a parquet file, a batch at a time. Return the number of rows
+
+    Rows are read through a server-side cursor, so memory use is bounded by the batch size however large the table."""
+    query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(table.lower()))
+    rows = 0
+    with connection.cursor(name=f'export_{table.lower()}') as cur:
+        cur.itersize = batch_size
+        cur.execute(query)
+        columns = [column.name for column in cur.description]
+        if export_format == 'csv':
+            with gzip.open(path, 'wt', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                for batch in iter(lambda: cur.fetchmany(batch_size), []):
+                    writer.writerows(batch)
+                    rows += len(batch)
+        else:
+            writer = None
+            try:
+                for batch in iter(lambda: cur.fetchmany(batch_size), []):
+                    table_batch = _to_arrow(columns, batch, writer.schema if writer else None)
+                    if writer is None:
+                        writer = pyarrow.parquet.ParquetWriter(path, table_batch.schema, compression='zstd')
+                    writer.write_table(table_batch)
+                    rows += len(batch)
+                if writer is None:      # empty table, still write its columns
+                    writer = pyarrow.parquet.ParquetWriter(path, _to_arrow(columns, []).schema, compression='zstd')
+            finally:
+                if writer is not None:
+                    writer.close()
+    connection.commit()     # server-side cursors live in a transaction
+    return rows
+
+
+def _to_arrow(columns, batch, schema=None):
+    """Return a batch of rows as an arrow table, typing columns by the first batch (all-null columns as strings)"""
+    data = {column: [row[index] for row in batch] for index, column in enumerate(columns)}
+    if schema is not None:
+        return pyarrow.Table.from_pydict(data, schema=schema)
+    table = pyarrow.Table.from_pydict(data)
+    fields = [pyarrow.field(field.name, pyarrow.string()) if pyarrow.types.is_null(field.type) else field
+              for field in table.schema]
+    return table.cast(pyarrow.schema(fields))
+
+
+def export_tables(database, directory, tables=EXPORT_TABLES, export_format='csv', batch_size=BATCH_SIZE):
+    """Export tables into a directory on a dedicated connection. Return the paths of the written files"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, expected one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'parquet' and pyarrow is None:
+        raise ValueError("Parquet exports require pyarrow, which is not installed")
+
+    extension = 'csv.gz' if export_format == 'csv' else 'parquet'
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    paths = []
+    connection = database.new_connection()
+    try:
+        for table in tables:
+            path = os.path.join(directory, f'{table.lower()}-{timestamp}.{extension}')
+            rows = export_table(connection, table, path, export_format, batch_size)
+            logger.info(f"Exported {rows} rows of {table} to {path}")
+            paths.append(path)
+    finally:
+        connection.close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the bot\'s tables to compressed CSV or parquet files')
+    parser.add_argument('tables', nargs='*', default=EXPORT_TABLES, help='tables to export (default: all)')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--output', default='.', help='directory to write the files to')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from postgres import PostgreSqlDb
+    for path in export_tables(PostgreSqlDb(), args.output, args.tables, args.format, args.batch_size):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import logging
+from datetime import date
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+BUMP_HALF_LIFE_DAYS = 14        # a bump weighs half as much two weeks later
+BUMP_WEIGHT = 2.0               # being bumped recently weighs most
+RELIABILITY_WEIGHT = 1.0        # then showing up (approving in time) when on the playing list
+APPROVAL_WEIGHT = 0.5           # then approving early
+APPROVAL_LEAD_HOURS = 12        # approving this many hours before kick off (or earlier) earns the full approval weight
+UPSERT_QUERY = "INSERT INTO PLAYER_HISTORY (user_id, recent_bumps, last_bumped, attended, removed, approvals, " \
+               "approval_lead_hours) VALUES "
+UPSERT_CONFLICT = " ON CONFLICT (user_id) DO UPDATE SET recent_bumps = EXCLUDED.recent_bumps, " \
+                  "last_bumped = EXCLUDED.last_bumped, attended = EXCLUDED.attended, removed = EXCLUDED.removed, " \
+                  "approvals = EXCLUDED.approvals, approval_lead_hours = EXCLUDED.approval_lead_hours"
+
+
+class IndexedHeap:
+    """This class is a binary min-heap of keys by priority, which also tracks the position of every key
+
+    Tracking positions lets a key's priority be changed, or the key removed, in O(log n) without searching the heap."""
+
+    def __init__(self, items=()):
+        self._heap = [(priority, key) for key, priority in items]
+        self._positions = {key: position for position, (_, key) in enumerate(self._heap)}
+        for position in reversed(range(len(self._heap) // 2)):
+            self._sift_down(position)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def push(self, key, priority):
+        """Add a key, or change its priority if it's already in the heap"""
+        if key in self._positions:
+            return self.update(key, priority)
+        self._heap.append((priority, key))
+        self._positions[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, key, priority):
+        position = self._positions[key]
+        old_priority, _ = self._heap[position]
+        self._heap[position] = (priority, key)
+        if priority < old_priority:
+            self._sift_up(position)
+        else:
+            self._sift_down(position)
+
+    def remove(self, key):
+        """Remove a key from the heap. Does nothing if it isn't there"""
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        last = self._heap.pop()
+        if position < len(self._heap):
+            self._heap[position] = last
+            self._positions[last[1]] = position
+            self._sift_up(position)
+            self._sift_down(self._positions[last[1]])
+
+    def pop(self):
+        """Remove and return the key of the lowest priority, or None if the heap is empty"""
+        if not self._heap:
+            return None
+        key = self._heap[0][1]
+        self.remove(key)
+        return key
+
+    def _swap(self, i, j):
+        self._heap[i], self._heap[j] = self._heap[j], self._heap[i]
+        self._positions[self._heap[i][1]] = i
+        self._positions[self._heap[j][1]] = j
+
+    def _sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+            if self._heap[position][0] >= self._heap[parent][0]:
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position):
+        size = len(self._heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._heap[child][0] < self._heap[smallest][0]:
+                    smallest = child
+            if smallest == position:
+                return
+            self._swap(position, smallest)
+            position = smallest
+
+
+class History:
+    """This object represents the record a player's waiting list priority is computed from"""
+    def __init__(self, recent_bumps=0.0, last_bumped=None, attended=0, removed=0, approvals=0,
+                 approval_lead_hours=0.0):
+        self.recent_bumps = recent_bumps        # times left on the waiting list on matchday, decayed since the last
+        self.last_bumped = last_bumped          # date of the last bump
+        self.attended = attended                # matches played (on the playing list at cleanup)
+        self.removed = removed                  # removals for failing to approve attendance in time
+        self.approvals = approvals
+        self.approval_lead_hours = approval_lead_hours      # mean hours between approving and kick off
+
+    def bumps_on(self, day):
+        """Return the bumps weight as of the given date"""
+        if self.last_bumped is None:
+            return 0.0
+        return self.recent_bumps * 0.5 ** ((day - self.last_bumped).days / BUMP_HALF_LIFE_DAYS)
+
+
+class FairnessLedger:
+    """This class keeps the players' history, scores their waiting list priority and writes it to PLAYER_HISTORY
+
+    Changed histories are written by the database writer in one multi-row upsert when flushed."""
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._histories = {}        # user id -> history
+        self._dirty = set()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._histories)
+
+    def load(self, rows):
+        """Load histories read from PLAYER_HISTORY, or changed by another bot process (with ISO formatted dates)
+
+        Histories changed here but not written yet are kept, as they are newer."""
+        with self._lock:
+            for user_id, recent_bumps, last_bumped, *fields in rows:
+                if user_id in self._dirty:
+                    continue
+                if isinstance(last_bumped, str):
+                    last_bumped = date.fromisoformat(last_bumped)
+                self._histories[user_id] = History(recent_bumps, last_bumped, *fields)
+
+    def _history(self, user_id):
+        self._dirty.add(user_id)
+        return self._histories.setdefault(user_id, History())
+
+    def score(self, user_id, day):
+        """Return a player's priority score as of the given date: the higher, the sooner promoted"""
+        history = self._histories.get(user_id)
+        if history is None:
+            return RELIABILITY_WEIGHT / 2       # newcomers are assumed half reliable
+        reliability = history.attended / (history.attended + history.removed) if history.attended or history.removed \
+            else 0.5
+        approval = min(history.approval_lead_hours, APPROVAL_LEAD_HOURS) / APPROVAL_LEAD_HOURS \
+            if history.approvals else 0.0
+        return BUMP_WEIGHT * history.bumps_on(day) + RELIABILITY_WEIGHT * reliability + APPROVAL_WEIGHT * approval
+
+    def record_match(self, played, bumped, day):
+        """Record the players who played a match, and the ones left on its waiting list"""
+        with self._lock:
+            for user_id in played:
+                self._history(user_id).attended += 1
+            for user_id in bumped:
+                history = self._history(user_id)
+                history.recent_bumps = history.bumps_on(day) + 1
+                history.last_bumped = day
+
+    def record_removal(self, user_id):
+        """Record a removal for failing to approve attendance in time"""
+        with self._lock:
+            self._history(user_id).removed += 1
+
+    def record_approval(self, user_id, lead_hours):
+        """Record an approval made the given number of hours before kick off"""
+        with self._lock:
+            history = self._history(user_id)
+            history.approvals += 1
+            history.approval_lead_hours += (max(lead_hours, 0.0) - history.approval_lead_hours) / history.approvals
+
+    def flush(self):
+        """Upsert the changed histories into PLAYER_HISTORY in one statement"""
+        with self._lock:
+            rows = []
+            for user_id in self._dirty:
+                history = self._histories[user_id]
+                rows.append((user_id, history.recent_bumps, history.last_bumped, history.attended, history.removed,
+                             history.approvals, history.approval_lead_hours))
+            self._dirty.clear()
+        if not rows:
+            return
+        query = UPSERT_QUERY + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows)) + UPSERT_CONFLICT
+        self._writer.submit('PLAYER_HISTORY', [(query, [value for row in rows for value in row])], changed=rows)
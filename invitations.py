@@ -0,0 +1,76 @@
+import heapq
+from itertools import count
+from datetime import datetime
+
+from clock import ISRAEL_TIMEZONE
+
+
+class Invitation:
+    """This object represents a pending admin invitation or liability request"""
+    def __init__(self, key, player=None, expires_at=None):
+        self.key = key                      # username (or user id) of the invited or asked user
+        self.player = player                # reserved spot on the playing list, if any
+        self.expires_at = expires_at        # timezone aware expiry time, or None if it never expires
+
+
+class InvitationRegistry:
+    """This class holds pending invitations keyed by username (or user id)
+
+    Lookups, additions and removals take constant time. Expiry times are kept in a heap, so expiring all overdue
+    invitations only touches the expired ones."""
+
+    def __init__(self):
+        self._invitations = {}
+        self._expiries = []
+        self._sequence = count()
+
+    def __contains__(self, key):
+        return key in self._invitations
+
+    def __iter__(self):
+        return iter(self._invitations)
+
+    def __len__(self):
+        return len(self._invitations)
+
+    def get(self, key):
+        """Return the invitation of the given key, or None if there is none"""
+        return self._invitations.get(key)
+
+    def add(self, key, player=None, expires_at=None):
+        """Add (or replace) the invitation of the given key"""
+        invitation = Invitation(key, player, expires_at)
+        self._invitations[key] = invitation
+        if expires_at is not None:
+            heapq.heappush(self._expiries, (expires_at, next(self._sequence), invitation))
+        return invitation
+
+    def pop(self, key):
+        """Remove and return the invitation of the given key, or None if there is none"""
+        return self._invitations.pop(key, None)
+
+    def clear(self):
+        self._invitations.clear()
+        self._expiries.clear()
+
+    def expire(self, now):
+        """Remove and return all invitations that expired by the given time, oldest first"""
+        expired = []
+        while self._expiries and self._expiries[0][0] <= now:
+            _, _, invitation = heapq.heappop(self._expiries)
+            if self._invitations.get(invitation.key) is invitation:     # skip removed or replaced invitations
+                del self._invitations[invitation.key]
+                expired.append(invitation)
+        return expired
+
+    def to_list(self):
+        """Return a JSON serializable list of [key, expiry timestamp] pairs"""
+        return [[key, invitation.expires_at.timestamp() if invitation.expires_at is not None else None]
+                for key, invitation in self._invitations.items()]
+
+    def restore(self, items, players=None):
+        """Replace all invitations with the ones in a to_list representation, linking them to reserved spots"""
+        self.clear()
+        for key, timestamp in items:
+            expires_at = datetime.fromtimestamp(timestamp, tz=ISRAEL_TIMEZONE) if timestamp is not None else None
+            self.add(key, (players or {}).get(key), expires_at)
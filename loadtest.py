@@ -0,0 +1,316 @@
+"""Full-stack load test against a local stand-in for the Telegram Bot API
+
+Serves the Bot API methods the bot calls, with configurable latency, rate limiting (429) and error injection, and
+POSTs synthetic webhook updates to the bot at a target rate. Every update is a private command from one of the
+synthetic users, so its end-to-end latency is the time until the bot's first Bot API call to that user's chat is
+answered. Start the load test (which waits for the bot's webhook), then the bot against its stand-in and a local
+database:
+
+    python loadtest.py --webhook-url http://localhost:8443/<token> --rate 50 --duration 60
+    TELEGRAM_API_BASE_URL=http://localhost:8081/bot PORT=8443 DATABASE_URL=postgresql://localhost/technionfc \\
+        python bot.py
+"""
+import json
+import time
+import socket
+import random
+import logging
+import argparse
+import http.client
+from threading import Thread, Lock, Event, local
+from itertools import count
+from collections import Counter, deque
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+GROUP_CHAT_ID = -1001760505503
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Technion FC', 'username': 'FCTechnionBot'}
+FIRST_NAMES = ('Daniel', 'Omer', 'Yossi', 'Itay', 'Noam', 'Amit', 'Eitan', 'Ariel', 'Tomer', 'Guy')
+LAST_NAMES = ('Cohen', 'Levi', 'Mizrahi', 'Peretz', 'Biton', 'Friedman', 'Avraham', 'Katz', 'Shapira', 'Golan')
+# Commands sent by the synthetic users, with their relative weights
+COMMAND_WEIGHTS = {'/print': 4, '/approve': 2, '/ball': 1, '/add': 1, '/remove': 1, '/schedule': 1, '/matches': 1}
+
+
+class BotApiStandIn:
+    """This class serves the Bot API methods the bot calls, and records the time of each call per chat
+
+    Each call waits `latency` seconds (give or take `jitter`), then fails with a 429 at `rate_limit_rate` (asking to
+    retry after `retry_after` seconds), fails with a 500 at `error_rate`, or succeeds."""
+
+    def __init__(self, port, latency=0.0, jitter=0.0, rate_limit_rate=0.0, retry_after=1, error_rate=0.0,
+                 admins=(), seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.admins = set(admins)
+        self.calls = Counter()              # calls per method
+        self.rate_limited = Counter()       # injected 429s per method
+        self.errors = Counter()             # injected 500s per method
+        self.on_chat_call = None            # called with the chat id and the time of every call to a chat
+        self._random = random.Random(seed)
+        self._message_ids = count(1)
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever, name='bot-api-stand-in', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Bot API stand-in listening on http://127.0.0.1:{self._server.server_port}/bot")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'       # keeps the bot's pooled connections alive
+
+            def do_POST(self):
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, result = stand_in.call(method, parse_params(self.headers.get('Content-Type', ''), body))
+                payload = json.dumps(result).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def call(self, method, params):
+        """Answer a Bot API call, returning the HTTP status and the response body"""
+        with self._lock:
+            self.calls[method] += 1
+            draw = self._random.random()
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0)
+        if delay:
+            time.sleep(delay)
+        if draw < self.rate_limit_rate:
+            with self._lock:
+                self.rate_limited[method] += 1
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+        if draw < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.errors[method] += 1
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+        chat_id = params.get('chat_id')
+        if chat_id is not None and self.on_chat_call is not None:       # only answered calls reach the user
+            self.on_chat_call(int(chat_id), time.perf_counter())
+        return 200, {'ok': True, 'result': self._result(method, params)}
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+            chat_id = int(params.get('chat_id', GROUP_CHAT_ID))
+            return {'message_id': params.get('message_id') or next(self._message_ids), 'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+                    'from': BOT_USER, 'text': params.get('text', '')}
+        if method == 'getChatMember':
+            user_id = int(params['user_id'])
+            return self._chat_member(user_id)
+        if method == 'getChatAdministrators':
+            return [self._chat_member(user_id) for user_id in sorted(self.admins)]
+        return True         # setWebhook, deleteWebhook, answerCallbackQuery and the like
+
+    def _chat_member(self, user_id):
+        return {'user': {'id': user_id, 'is_bot': False, 'first_name': str(user_id)},
+                'status': 'administrator' if user_id in self.admins else 'member'}
+
+
+def parse_params(content_type, body):
+    """Return the parameters of a Bot API call sent as JSON or as a form (files are ignored)"""
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        return dict(parse_qsl(body.decode('utf-8')))
+    return {}
+
+
+class LoadGenerator:
+    """This class POSTs synthetic webhook updates at a target rate and matches them with the bot's replies
+
+    Updates are sent open loop: on schedule, however long earlier ones take, so a slow bot shows up as latency rather
+    than as a lower offered rate. An update's end-to-end latency is the time from sending it until the bot's first
+    Bot API call to the sender's chat is answered."""
+
+    def __init__(self, webhook_url, users, seed=None, senders=32):
+        self._url = urlsplit(webhook_url)
+        self._random = random.Random(seed)
+        self._users = [self._make_user(user_id) for user_id in range(1000001, 1000001 + users)]
+        self._commands, self._weights = zip(*COMMAND_WEIGHTS.items())
+        self._senders = ThreadPoolExecutor(max_workers=senders, thread_name_prefix='load-sender')
+        self._connections = local()
+        self._update_ids = count(1)
+        self._pending = {}              # chat id -> send times of the updates not replied to yet
+        self._lock = Lock()
+        self.sent = 0
+        self.failed = Counter()         # webhook POSTs failed per HTTP status (or exception name)
+        self.post_latencies = []        # seconds the webhook took to accept each update
+        self.latencies = []             # end-to-end seconds per replied update
+        self.replied_at = []
+        self.lag = 0.0                  # latest seconds the sender was behind schedule
+
+    def _make_user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': self._random.choice(FIRST_NAMES),
+                'last_name': self._random.choice(LAST_NAMES), 'username': f'load{user_id}'}
+
+    def on_chat_call(self, chat_id, called):
+        """Match a Bot API call to a chat with the oldest update of its user not replied to yet"""
+        with self._lock:
+            pending = self._pending.get(chat_id)
+            if not pending:
+                return
+            self.latencies.append(called - pending.popleft())
+            self.replied_at.append(called)
+
+    def run(self, rate, duration):
+        """Send updates at `rate` per second for `duration` seconds. Return when the last one was sent"""
+        started = time.perf_counter()
+        for index in range(int(rate * duration)):
+            due = started + index / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.lag = -delay
+            self._senders.submit(self._send, self._make_update())
+        self._senders.shutdown(wait=True)
+        return started
+
+    def _make_update(self):
+        update_id = next(self._update_ids)
+        user = self._random.choice(self._users)
+        text = self._random.choices(self._commands, self._weights)[0]
+        return {'update_id': update_id,
+                'message': {'message_id': update_id, 'date': int(time.time()), 'from': user, 'text': text,
+                            'chat': {'id': user['id'], 'type': 'private', 'first_name': user['first_name']},
+                            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]}}
+
+    def _send(self, update):
+        body = json.dumps(update).encode('utf-8')
+        chat_id = update['message']['chat']['id']
+        sent = time.perf_counter()
+        with self._lock:
+            self.sent += 1
+            self._pending.setdefault(chat_id, deque()).append(sent)
+        try:
+            connection = self._get_connection()
+            connection.request('POST', self._url.path, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                with self._lock:
+                    self.failed[response.status] += 1
+        except (OSError, http.client.HTTPException) as err:
+            with self._lock:
+                self.failed[type(err).__name__] += 1
+            self._connections.connection = None
+            return
+        with self._lock:
+            self.post_latencies.append(time.perf_counter() - sent)
+
+    def _get_connection(self):
+        connection = getattr(self._connections, 'connection', None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self._url.hostname, self._url.port or 80, timeout=30)
+            self._connections.connection = connection
+        return connection
+
+    def report(self, started, stand_in):
+        """Return a textual report of the latencies and sustained throughput"""
+        replied = len(self.latencies)
+        lines = [f'Sent {self.sent} updates, {replied} replied, {self.sent - replied} without a reply, '
+                 f'failed POSTs: {dict(self.failed) or 0}, worst send lag: {self.lag * 1000:.0f} ms',
+                 f'Webhook POST latency (ms): {format_percentiles(self.post_latencies)}',
+                 f'End-to-end latency (ms): {format_percentiles(self.latencies)}']
+        if replied:
+            elapsed = max(self.replied_at) - started
+            lines.append(f'Sustained throughput: {replied / elapsed:,.1f} updates per second over {elapsed:.1f} s')
+        lines += [f'Bot API calls: {dict(stand_in.calls)}',
+                  f'Injected 429s: {dict(stand_in.rate_limited)}, injected errors: {dict(stand_in.errors)}']
+        return '\n'.join(lines)
+
+
+def wait_for_webhook(webhook_url, timeout):
+    """Wait until the bot accepts connections on its webhook URL. Return False if the timeout expired first"""
+    url = urlsplit(webhook_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((url.hostname, url.port or 80), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def format_percentiles(samples):
+    if not samples:
+        return 'no samples'
+    ordered = sorted(samples)
+    values = [ordered[min(int(len(ordered) * quantile), len(ordered) - 1)] * 1000 for quantile in (0.5, 0.95, 0.99)]
+    return f'p50 {values[0]:.1f}, p95 {values[1]:.1f}, p99 {values[2]:.1f}, max {ordered[-1] * 1000:.1f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the Technion FC bot through a local Bot API stand-in')
+    parser.add_argument('--webhook-url', required=True, help='URL the bot serves its webhook on')
+    parser.add_argument('--api-port', type=int, default=8081, help='port of the Bot API stand-in')
+    parser.add_argument('--rate', type=float, default=20, help='updates sent per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to send updates for')
+    parser.add_argument('--drain', type=float, default=10, help='seconds to wait for replies after the last update')
+    parser.add_argument('--users', type=int, default=200, help='number of synthetic users sending updates')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stand-in takes per call')
+    parser.add_argument('--jitter', type=float, default=0.02, help='random variation of the latency, in seconds')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='seconds to retry after, in injected 429s')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 500')
+    parser.add_argument('--admins', type=int, nargs='*', default=(), help='user ids the stand-in reports as admins')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the updates and injected failures')
+    parser.add_argument('--startup-timeout', type=float, default=120, help='seconds to wait for the bot to start')
+    parser.add_argument('--stand-in-only', action='store_true', help='serve the Bot API stand-in until interrupted')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    stand_in = BotApiStandIn(args.api_port, args.latency, args.jitter, args.rate_limit_rate, args.retry_after,
+                             args.error_rate, args.admins, args.seed)
+    stand_in.start()
+    try:
+        if args.stand_in_only:
+            Event().wait()
+        if not wait_for_webhook(args.webhook_url, args.startup_timeout):
+            raise SystemExit(f'The bot did not start serving {args.webhook_url} in time')
+        time.sleep(1)       # the webhook server starts listening just before the bot is done starting
+
+        generator = LoadGenerator(args.webhook_url, args.users, args.seed)
+        stand_in.on_chat_call = generator.on_chat_call
+        started = generator.run(args.rate, args.duration)
+        time.sleep(args.drain)
+        print(generator.report(started, stand_in))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stand_in.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+from collections import deque, defaultdict
+from datetime import date, time, timedelta
+
+from invitations import InvitationRegistry
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+KICKOFF = time(hour=20, minute=30)          # default kick off time of a match
+
+
+class Match:
+    """This object represents a single match: its date, kick off time and pitch, and its own roster"""
+    def __init__(self, match_date, kickoff=KICKOFF, pitch=1, pinned=False):
+        self.date = match_date
+        self.kickoff = kickoff
+        self.pitch = pitch                      # matches held on the same day are told apart by their pitch number
+        self.pinned = pinned                    # opened by an admin, so kept even while its list is empty
+        self.playing = deque()                  # playing list, which functions as a waiting list as well
+        self.invited = InvitationRegistry()     # users to be added by admins
+        self.asked = InvitationRegistry()       # possible users to assume match liability
+
+    @property
+    def match_id(self):
+        """Return a short id users can type to pick the match, e.g. 'thu22-11', or 'thu22-11-2' for a second pitch.
+        Typing its start (e.g. 'thu22') is enough, see MatchBook.find"""
+        match_id = f'{WEEKDAYS[self.date.weekday()]}{self.date.day}-{self.date.month}'
+        return match_id if self.pitch == 1 else f'{match_id}-{self.pitch}'
+
+    @property
+    def sort_key(self):
+        return self.date, self.kickoff, self.pitch
+
+    def is_empty(self):
+        return not self.playing and not self.invited and not self.asked
+
+
+def match_key(user):
+    """Return the key a listed user is indexed by: the user id, or '@username' for a reserved spot"""
+    return f'@{user.username}' if user.id == -1 else user.id
+
+
+class MatchBook:
+    """This class holds the matches whose lists are open at the same time
+
+    Matches are indexed by id, by date and by the players on their lists, so a player's command resolves to the right
+    match without scanning the lists of all of them. The player index of a match is refreshed after each change to its
+    list, which only touches that list."""
+
+    def __init__(self):
+        self._matches = {}                      # match id -> match
+        self._by_date = defaultdict(list)       # date -> matches held on it
+        self._by_player = defaultdict(set)      # match key of a listed user -> ids of the matches listing it
+        self._player_keys = {}                  # match id -> match keys indexed for that match
+
+    def __iter__(self):
+        return iter(sorted(self._matches.values(), key=lambda match: match.sort_key))
+
+    def __len__(self):
+        return len(self._matches)
+
+    def __contains__(self, match):
+        return self._matches.get(match.match_id) is match
+
+    def get(self, match_id):
+        return self._matches.get(match_id)
+
+    def add(self, match):
+        """Add a match to the book, and index its players"""
+        self._matches[match.match_id] = match
+        self._by_date[match.date].append(match)
+        self.reindex(match)
+
+    def remove(self, match):
+        """Remove a match (e.g. once it is over) and its players from the book"""
+        if match not in self:
+            return
+        del self._matches[match.match_id]
+        self._by_date[match.date].remove(match)
+        if not self._by_date[match.date]:
+            del self._by_date[match.date]
+        for key in self._player_keys.pop(match.match_id, ()):
+            self._unindex(key, match.match_id)
+
+    def clear(self):
+        self._matches.clear()
+        self._by_date.clear()
+        self._by_player.clear()
+        self._player_keys.clear()
+
+    def reindex(self, match):
+        """Refresh the player index of a match after its list changed"""
+        keys = {match_key(player.user) for player in match.playing}
+        old_keys = self._player_keys.get(match.match_id, set())
+        for key in old_keys - keys:
+            self._unindex(key, match.match_id)
+        for key in keys - old_keys:
+            self._by_player[key].add(match.match_id)
+        self._player_keys[match.match_id] = keys
+
+    def _unindex(self, key, match_id):
+        self._by_player[key].discard(match_id)
+        if not self._by_player[key]:
+            del self._by_player[key]
+
+    def on(self, match_date):
+        """Return the matches held on the given date"""
+        return sorted(self._by_date.get(match_date, ()), key=lambda match: match.sort_key)
+
+    def of_player(self, key):
+        """Return the matches listing the user of the given match key, earliest first"""
+        return sorted((self._matches[match_id] for match_id in self._by_player.get(key, ())),
+                      key=lambda match: match.sort_key)
+
+    def find(self, selector, today):
+        """Return the match a '#<match id>' or '#<weekday>' selector refers to, or None"""
+        selector = selector.lstrip('#').lower()
+        if selector in self._matches:
+            return self._matches[selector]
+        upcoming = [match for match in self if match.date >= today and match.match_id.startswith(selector)]
+        return upcoming[0] if upcoming else None
+
+    def next_open(self, today):
+        """Return the earliest match held today or later, or None"""
+        upcoming = [match for match in self if match.date >= today]
+        return upcoming[0] if upcoming else None
+
+    def new_pitch(self, match_date, kickoff=KICKOFF, pinned=True):
+        """Open another match on the given date, on the next free pitch"""
+        pitch = max((match.pitch for match in self.on(match_date)), default=0) + 1
+        match = Match(match_date, kickoff, pitch, pinned)
+        self.add(match)
+        return match
+
+
+def next_weekday(today, weekday):
+    """Return the next date (today included) falling on the given weekday"""
+    return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+
+def parse_match_date(text, today):
+    """Parse a weekday name (e.g. 'thu') or a 'dd/mm' date into the next matching date, or return None"""
+    text = text.lower()
+    for weekday, name in enumerate(WEEKDAYS):
+        if text.startswith(name):
+            return next_weekday(today, weekday)
+    try:
+        day, month = (int(part) for part in text.split('/'))
+        match_date = date(today.year, month, day)
+        return match_date if match_date >= today else match_date.replace(year=today.year + 1)
+    except ValueError:
+        return None
@@ -0,0 +1,94 @@
+import json
+import uuid
+import logging
+from threading import Lock
+from collections import defaultdict, Counter
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'technionfc_changes'
+MAX_PAYLOAD_SIZE = 7900         # Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_QUERY = "SELECT pg_notify(%s, %s)"
+
+
+class ChangeFeed:
+    """This class tells other bot processes which rows of the cached tables changed, and patches this process' caches
+    with the changes other processes make
+
+    Writers add the feed's NOTIFY statements to the transactions writing the rows, so Postgres delivers them only on
+    commit, and in commit order. Payloads are compact JSON objects: the writing process ('o'), the table ('t'), the
+    operation ('op', either 'upsert' or 'delete') and the changed rows ('r'), as each cache's subscriber expects them.
+    Notifications of this process' own writes are skipped, as it already patched its caches before writing.
+
+    While the listening connection is down notifications are lost, so `listening` is False and caches relying on the
+    feed must check the database themselves. Reconnection callbacks run when it is back up, to refresh them."""
+
+    def __init__(self, enabled, channel=CHANNEL):
+        self.enabled = enabled
+        self.channel = channel
+        self.origin = uuid.uuid4().hex[:8]          # tells this process' notifications apart
+        self.listening = False
+        self.received = Counter()                   # notifications dispatched per table
+        self._subscribers = defaultdict(list)       # table -> callbacks taking the operation and the changed rows
+        self._reconnect_callbacks = []
+        self._connections = 0
+        self._lock = Lock()
+
+    def subscribe(self, table, callback):
+        """Call a callback with the operation and the rows of every change another process makes to a table"""
+        self._subscribers[table].append(callback)
+
+    def on_reconnect(self, callback):
+        """Call a callback whenever listening resumes after the connection was lost"""
+        self._reconnect_callbacks.append(callback)
+
+    def statements(self, table, rows, op='upsert'):
+        """Return the (query, params) statements notifying of changed rows of a table, none if the feed is disabled
+
+        Rows are split between as many notifications as their payloads take."""
+        if not self.enabled or not rows:
+            return []
+        statements, chunk, size = [], [], 0
+        for row in rows:
+            row_size = len(json.dumps(row, default=str)) + 1
+            if chunk and size + row_size > MAX_PAYLOAD_SIZE - 64:       # leaving room for the payload's other keys
+                statements.append(self._statement(table, op, chunk))
+                chunk, size = [], 0
+            chunk.append(row)
+            size += row_size
+        statements.append(self._statement(table, op, chunk))
+        return statements
+
+    def _statement(self, table, op, rows):
+        payload = json.dumps({'o': self.origin, 't': table, 'op': op, 'r': rows}, separators=(',', ':'), default=str)
+        return NOTIFY_QUERY, (self.channel, payload)
+
+    def dispatch(self, payload):
+        """Patch the subscribed caches with a notification's changes, unless this process made them"""
+        try:
+            change = json.loads(payload)
+            if change['o'] == self.origin:
+                return
+            self.received[change['t']] += 1
+            for callback in self._subscribers.get(change['t'], ()):
+                callback(change['op'], change['r'])
+        except Exception as err:
+            logger.error(f"Error dispatching change notification {payload[:200]}: {err}")
+
+    def connected(self):
+        """Mark the feed as listening, refreshing the caches first if notifications may have been missed"""
+        with self._lock:
+            self._connections += 1
+            reconnected = self._connections > 1
+        if reconnected:
+            for callback in self._reconnect_callbacks:
+                try:
+                    callback()
+                except Exception as err:
+                    logger.error(f"Error refreshing caches after reconnecting: {err}")
+        self.listening = True
+        logger.info(f"Listening to change notifications on {self.channel}")
+
+    def disconnected(self):
+        """Mark the feed as not listening, so caches check the database until it's listening again"""
+        self.listening = False
@@ -0,0 +1,103 @@
+import re
+import logging
+from threading import Lock
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Characters not allowed in players' full names (club rule 1)
+FORBIDDEN_NAME_CHARACTERS = re.compile(r'[.,@_\-!#$%^&*()<>?/\|}{~:0-9]')
+BATCH_SIZE = 100            # changed profiles written without waiting for the next flush
+UPSERT_QUERY = "INSERT INTO PLAYERS (user_id, user_first_name, user_last_name, user_username) VALUES "
+UPSERT_CONFLICT = " ON CONFLICT (user_id) DO UPDATE SET user_first_name = EXCLUDED.user_first_name, " \
+                  "user_last_name = EXCLUDED.user_last_name, user_username = EXCLUDED.user_username"
+
+# Cached profile of a player, with the validation result of the full name it was cached with
+Profile = namedtuple('Profile', ('user', 'full_name', 'username', 'name_is_valid'))
+
+
+def full_name_is_valid(user):
+    """Check if a user's full name follows the club's naming rules: first and last names, no special characters"""
+    if len(user.first_name) <= 1 or user.last_name is None or len(user.last_name) <= 1:
+        return False
+    return FORBIDDEN_NAME_CHARACTERS.search(user.full_name) is None
+
+
+class PlayerDirectory:
+    """This class caches the profiles of the users the bot sees, and writes new and changed ones to PLAYERS
+
+    Profiles are keyed by user id, and their name validation result by user id and full name, so a name change seen
+    in any update invalidates it. Changed profiles are written behind by the database writer in a single multi-row
+    upsert, once `batch_size` are waiting or when flushed (periodically and on shutdown). Known users are also fed to
+    the player index, so names resolve in admin commands."""
+
+    def __init__(self, writer, index=None, batch_size=BATCH_SIZE):
+        self._writer = writer
+        self._index = index
+        self._batch_size = batch_size
+        self._profiles = {}         # user id -> profile
+        self._dirty = {}            # user id -> user whose profile was not written yet
+        self._lock = Lock()
+        self.hits = 0               # name validations answered from the cache
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def observe(self, user, persist=True):
+        """Cache a user's profile, replacing it if its name or username changed"""
+        if user is None or user.is_bot or user.id < 0:      # bots, reserved spots and external players
+            return
+        with self._lock:
+            profile = self._profiles.get(user.id)
+            if profile is not None and (profile.full_name, profile.username) == (user.full_name, user.username):
+                return
+            self._profiles[user.id] = Profile(user, user.full_name, user.username, None)
+            if persist:
+                self._dirty[user.id] = user
+            full = len(self._dirty) >= self._batch_size
+        if self._index is not None:
+            self._index.add(user)
+        if full:
+            self.flush()
+
+    def load(self, users):
+        """Cache profiles read from PLAYERS (or changed by another bot process), which need no writing back
+
+        Profiles changed here but not written yet are kept, as they are newer."""
+        for user in users:
+            if user.id not in self._dirty:
+                self.observe(user, persist=False)
+
+    def get(self, user_id):
+        """Return the latest known telegram user of the given id, or None"""
+        profile = self._profiles.get(user_id)
+        return profile.user if profile is not None else None
+
+    def name_is_valid(self, user):
+        """Check if a user's full name is valid, validating each full name of a user only once"""
+        profile = self._profiles.get(user.id)
+        if profile is not None and profile.full_name == user.full_name and profile.name_is_valid is not None:
+            self.hits += 1
+            return profile.name_is_valid
+        self.misses += 1
+        valid = full_name_is_valid(user)
+        if user.is_bot or user.id < 0:
+            return valid
+        self.observe(user)
+        with self._lock:
+            profile = self._profiles[user.id]
+            if profile.full_name == user.full_name:
+                self._profiles[user.id] = profile._replace(name_is_valid=valid)
+        return valid
+
+    def flush(self):
+        """Upsert the new and changed profiles into PLAYERS in one statement"""
+        with self._lock:
+            users, self._dirty = list(self._dirty.values()), {}
+        if not users:
+            return
+        query = UPSERT_QUERY + ', '.join(['(%s, %s, %s, %s)'] * len(users)) + UPSERT_CONFLICT
+        rows = [(user.id, user.first_name, user.last_name, user.username) for user in users]
+        self._writer.submit('PLAYERS', [(query, [value for row in rows for value in row])], changed=rows)
+        logger.debug(f"Wrote {len(users)} player profiles behind")
@@ -0,0 +1,117 @@
+import unicodedata
+from collections import defaultdict, Counter
+from threading import Lock
+
+MIN_SIMILARITY = 0.45       # minimal trigram similarity of a plain-text name to a player's full name
+MIN_MARGIN = 0.1            # how much more similar the best match must be than the next one to be picked
+
+
+def normalize(text):
+    """Case fold a name and strip its diacritics (e.g. Hebrew niqqud), so it matches however it is typed"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def trigrams(text):
+    """Return the trigrams of a normalized name, each word padded like Postgres' pg_trgm does"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class PlayerIndex:
+    """This class resolves usernames and plain-text full names (Hebrew or English) to known telegram users
+
+    Usernames and exact names are looked up in dictionaries. Other names are matched by trigram similarity using an
+    inverted index, so only players sharing a trigram with the searched name are scored."""
+
+    def __init__(self):
+        self._users = {}                        # user id -> telegram User
+        self._usernames = {}                    # normalized username -> user id
+        self._names = defaultdict(set)          # normalized full name -> user ids
+        self._trigrams = defaultdict(set)       # trigram -> user ids
+        self._user_trigrams = {}                # user id -> trigrams of its indexed full name
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def add(self, user):
+        """Index a user, replacing its previously indexed names. Does nothing if they haven't changed"""
+        if user is None or user.is_bot or user.id < 0:      # bots and reserved spots
+            return
+        with self._lock:
+            indexed = self._users.get(user.id)
+            if indexed is not None:
+                if (indexed.full_name, indexed.username) == (user.full_name, user.username):
+                    return
+                self._remove(indexed)
+
+            self._users[user.id] = user
+            if user.username:
+                self._usernames[normalize(user.username)] = user.id
+            name = normalize(user.full_name)
+            self._names[name].add(user.id)
+            grams = self._user_trigrams[user.id] = trigrams(name)
+            for gram in grams:
+                self._trigrams[gram].add(user.id)
+
+    def _remove(self, user):
+        if user.username and self._usernames.get(normalize(user.username)) == user.id:
+            del self._usernames[normalize(user.username)]
+        name = normalize(user.full_name)
+        self._names[name].discard(user.id)
+        if not self._names[name]:
+            del self._names[name]
+        for gram in self._user_trigrams.pop(user.id, ()):
+            self._trigrams[gram].discard(user.id)
+            if not self._trigrams[gram]:
+                del self._trigrams[gram]
+
+    def get(self, user_id):
+        """Return the indexed user of the given id, or None"""
+        return self._users.get(user_id)
+
+    def by_username(self, username):
+        """Return the indexed user of the given username (with or without a leading @), or None"""
+        with self._lock:
+            user_id = self._usernames.get(normalize(username.lstrip('@')))
+            return self._users.get(user_id)
+
+    def search(self, text, limit=5):
+        """Return up to `limit` (similarity, user) pairs of players with a full name similar to the text, best first"""
+        query = trigrams(normalize(text))
+        if not query:
+            return []
+        with self._lock:
+            common = Counter()
+            for gram in query:
+                common.update(self._trigrams.get(gram, ()))
+            scored = [(shared / (len(query) + len(self._user_trigrams[user_id]) - shared), self._users[user_id])
+                      for user_id, shared in common.items()]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [pair for pair in scored[:limit] if pair[0] >= MIN_SIMILARITY]
+
+    def resolve(self, text):
+        """Return the single user a mention or plain-text name refers to, or None if it is unknown or ambiguous"""
+        text = text.strip()
+        if text.startswith('@') or ' ' not in text:
+            user = self.by_username(text)
+            if user is not None:
+                return user
+
+        with self._lock:
+            exact = self._names.get(normalize(text), ())
+            if len(exact) == 1:
+                return self._users[next(iter(exact))]
+            if exact:           # several players share this exact name
+                return None
+
+        matches = self.search(text, limit=2)
+        if not matches:
+            return None
+        if len(matches) == 2 and matches[0][0] - matches[1][0] < MIN_MARGIN:
+            return None
+        return matches[0][1]
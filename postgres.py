@@ -1,26 +1,182 @@
 import os
 import psycopg
 import logging
+from threading import Thread, Event
 
-from config import DATABASE_URL
+from psycopg import sql
 
-# Enable logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    level=logging.DEBUG)
+from config import DATABASE_URL
 
 logger = logging.getLogger(__name__)
 
+SCHEMA_LOCK_KEY = 7140610       # advisory lock serializing the migrations of bot processes starting together
+LISTEN_POLL_TIMEOUT = 1.0       # seconds between checks of whether to stop listening
+LISTEN_RETRY_DELAY = 1.0        # seconds before reconnecting the listening connection, doubled up to a minute
+
+# Match id of a MATCHES row as Match.match_id has it since migration 8, e.g. 'thu22-11' or 'thu22-11-2'
+NEW_MATCH_ID = "to_char(MATCHES.match_date, 'dy') || EXTRACT(DAY FROM MATCHES.match_date)::INT || '-' || " \
+               "EXTRACT(MONTH FROM MATCHES.match_date)::INT || " \
+               "CASE WHEN MATCHES.pitch > 1 THEN '-' || MATCHES.pitch ELSE '' END"
+
+# Schema migrations as (version, description, statements) triplets, applied in order. Never edit an applied migration,
+# add a new one instead. Migration 1 creates the tables as they were before migrations were versioned.
+MIGRATIONS = [
+    (1, 'create the back up and shared roster tables', [
+        "CREATE TABLE IF NOT EXISTS PLAYERS ("
+        "   user_id BIGINT,"
+        "   user_first_name VARCHAR,"
+        "   user_last_name VARCHAR,"
+        "   user_username VARCHAR,"
+        "   player_banned BOOLEAN NOT NULL,"
+        "   player_ban_duration INT NOT NULL,"
+        "   player_rating NUMERIC(3, 2) NOT NULL CHECK (player_rating BETWEEN 1.00 AND 5.00),"
+        "   player_rated_by BIGINT[] NOT NULL,"
+        "   PRIMARY KEY (user_id, user_first_name, user_last_name, user_username))",
+
+        "CREATE TABLE IF NOT EXISTS PLAYING ("
+        "   user_id BIGINT,"
+        "   user_first_name VARCHAR,"
+        "   user_last_name VARCHAR,"
+        "   user_username VARCHAR,"
+        "   player_liable BOOLEAN NOT NULL,"
+        "   player_approved BOOLEAN NOT NULL,"
+        "   player_match_ball BOOLEAN NOT NULL,"
+        "   PRIMARY KEY (user_id, user_first_name, user_last_name, user_username))",
+
+        "CREATE TABLE IF NOT EXISTS INVITED ("
+        "   username VARCHAR PRIMARY KEY)",
+        "ALTER TABLE INVITED ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ",
+
+        "CREATE TABLE IF NOT EXISTS ASKED ("
+        "   user_id_or_name VARCHAR PRIMARY KEY)",
+
+        # roster state shared by all bot processes, versioned for optimistic concurrency
+        "CREATE TABLE IF NOT EXISTS ROSTER_STATE ("
+        "   id INT PRIMARY KEY,"
+        "   version BIGINT NOT NULL,"
+        "   state JSONB NOT NULL)",
+        "INSERT INTO ROSTER_STATE (id, version, state) VALUES (1, 0, '{}') ON CONFLICT (id) DO NOTHING",
+    ]),
+    (2, 'key players by user id and keep the list order', [
+        # a name change used to add a second row for the same user, keep the latest one
+        "DELETE FROM PLAYERS a USING PLAYERS b WHERE a.user_id = b.user_id AND a.ctid < b.ctid",
+        "ALTER TABLE PLAYERS DROP CONSTRAINT players_pkey,"
+        "   ALTER COLUMN user_first_name DROP NOT NULL,"
+        "   ALTER COLUMN user_last_name DROP NOT NULL,"
+        "   ALTER COLUMN user_username DROP NOT NULL,"
+        "   ADD PRIMARY KEY (user_id)",
+
+        # reserved spots all share the fake user id (-1), so they are told apart by the invited username
+        "ALTER TABLE PLAYING ADD COLUMN reservation_key VARCHAR NOT NULL DEFAULT ''",
+        "UPDATE PLAYING SET reservation_key = user_username WHERE user_id = -1",
+        "DELETE FROM PLAYING a USING PLAYING b "
+        "WHERE a.user_id = b.user_id AND a.reservation_key = b.reservation_key AND a.ctid < b.ctid",
+        # the list order used to be the (unguaranteed) order rows were read in
+        "ALTER TABLE PLAYING ADD COLUMN position INT",
+        "UPDATE PLAYING SET position = ordered.position "
+        "FROM (SELECT ctid, row_number() OVER () - 1 AS position FROM PLAYING) AS ordered "
+        "WHERE PLAYING.ctid = ordered.ctid",
+        "ALTER TABLE PLAYING DROP CONSTRAINT playing_pkey,"
+        "   ALTER COLUMN position SET NOT NULL,"
+        "   ALTER COLUMN user_first_name DROP NOT NULL,"
+        "   ALTER COLUMN user_last_name DROP NOT NULL,"
+        "   ALTER COLUMN user_username DROP NOT NULL,"
+        "   ADD PRIMARY KEY (user_id, reservation_key),"
+        "   ADD CONSTRAINT playing_reservation_key_check CHECK ((user_id = -1) = (reservation_key <> ''))",
+        # the list is restored in order
+        "CREATE UNIQUE INDEX PLAYING_POSITION_IDX ON PLAYING (position)",
+    ]),
+    (3, 'hold a list per match', [
+        "CREATE TABLE MATCHES ("
+        "   match_id VARCHAR PRIMARY KEY,"
+        "   match_date DATE NOT NULL,"
+        "   kickoff TIME NOT NULL,"
+        "   pitch INT NOT NULL,"
+        "   pinned BOOLEAN NOT NULL DEFAULT FALSE)",
+        "CREATE INDEX MATCHES_DATE_IDX ON MATCHES (match_date)",
+
+        # rows backed up before there were several matches keep an empty match id, and are restored into the next
+        # regular matchday's match
+        "ALTER TABLE PLAYING ADD COLUMN match_id VARCHAR NOT NULL DEFAULT '',"
+        "   DROP CONSTRAINT playing_pkey,"
+        "   ADD PRIMARY KEY (match_id, user_id, reservation_key)",
+        "DROP INDEX PLAYING_POSITION_IDX",
+        "CREATE UNIQUE INDEX PLAYING_POSITION_IDX ON PLAYING (match_id, position)",
+        "ALTER TABLE INVITED ADD COLUMN match_id VARCHAR NOT NULL DEFAULT '',"
+        "   DROP CONSTRAINT invited_pkey,"
+        "   ADD PRIMARY KEY (match_id, username)",
+        "ALTER TABLE ASKED ADD COLUMN match_id VARCHAR NOT NULL DEFAULT '',"
+        "   DROP CONSTRAINT asked_pkey,"
+        "   ADD PRIMARY KEY (match_id, user_id_or_name)",
+    ]),
+    (4, 'audit admin and roster actions', [
+        "CREATE TABLE AUDIT ("
+        "   id BIGSERIAL PRIMARY KEY,"
+        "   created_at TIMESTAMPTZ NOT NULL,"
+        "   actor_id BIGINT,"
+        "   actor_name VARCHAR NOT NULL,"
+        "   action VARCHAR NOT NULL,"
+        "   target VARCHAR,"
+        "   match_id VARCHAR,"
+        "   details JSONB)",
+        "CREATE INDEX AUDIT_CREATED_AT_IDX ON AUDIT (created_at)",
+        # an actor's entries are paged by id, newest first
+        "CREATE INDEX AUDIT_ACTOR_IDX ON AUDIT (actor_id, id)",
+    ]),
+    (5, 'let the player directory insert players by their profile alone', [
+        "ALTER TABLE PLAYERS ALTER COLUMN player_banned SET DEFAULT FALSE,"
+        "   ALTER COLUMN player_ban_duration SET DEFAULT 0,"
+        "   ALTER COLUMN player_rating SET DEFAULT 3.00,"
+        "   ALTER COLUMN player_rated_by SET DEFAULT '{}'",
+    ]),
+    (6, 'keep the history waiting list priority is scored by', [
+        "CREATE TABLE PLAYER_HISTORY ("
+        "   user_id BIGINT PRIMARY KEY,"
+        "   recent_bumps DOUBLE PRECISION NOT NULL DEFAULT 0,"
+        "   last_bumped DATE,"
+        "   attended INT NOT NULL DEFAULT 0,"
+        "   removed INT NOT NULL DEFAULT 0,"
+        "   approvals INT NOT NULL DEFAULT 0,"
+        "   approval_lead_hours DOUBLE PRECISION NOT NULL DEFAULT 0)",
+    ]),
+    (7, 'keep the rules teams are split by, and every player\'s last match\'s team', [
+        # goalkeepers' rules have no other player (0), pairs' rules are keyed by their lower user id first
+        "CREATE TABLE TEAM_RULES ("
+        "   user_id BIGINT,"
+        "   other_id BIGINT,"
+        "   kind VARCHAR NOT NULL CHECK (kind IN ('goalkeeper', 'apart', 'together')),"
+        "   hard BOOLEAN NOT NULL,"
+        "   PRIMARY KEY (user_id, other_id),"
+        "   CHECK ((kind = 'goalkeeper') = (other_id = 0)))",
+        "CREATE TABLE LAST_TEAMS ("
+        "   user_id BIGINT PRIMARY KEY,"
+        "   match_id VARCHAR NOT NULL,"
+        "   team INT NOT NULL)",
+    ]),
+    (8, 'add the month to match ids, so matches a month apart don\'t share one', [
+        # rows of the back up refer to their match by id, so they are renamed along with it
+        *(f"UPDATE {table} SET match_id = {NEW_MATCH_ID} FROM MATCHES WHERE {table}.match_id = MATCHES.match_id"
+          for table in ('PLAYING', 'INVITED', 'ASKED')),
+        f"UPDATE MATCHES SET match_id = {NEW_MATCH_ID}",
+    ]),
+]
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
 class PostgreSqlDb:
     """This class holds all relevant SQL database functions"""
 
     def __init__(self):
         self._connection = None
+        self._schema_version = None
+        self._stop_listening = Event()
+        self._listener = None
         self.init_connection()
 
     def init_connection(self):
         """Initialize a new connection to the PostgreSQL database"""
         self._connect()
-        self._create_tables()
+        self._migrate()
 
     def get_connection(self):
         """Get the PostgreSQL database connection with health check"""
@@ -59,22 +215,59 @@ class PostgreSqlDb:
         except (psycopg.OperationalError, psycopg.InterfaceError, AttributeError):
             return False
 
+    def new_connection(self, autocommit=False):
+        """Create an additional connection to the PostgreSQL database, e.g. for holding session level locks"""
+        return psycopg.connect(self._conninfo(), connect_timeout=10, autocommit=autocommit)
+
+    def listen(self, feed):
+        """Keep a dedicated connection listening to the feed's channel, dispatching notifications on a background
+        thread, and reconnecting whenever the connection is lost"""
+        self._stop_listening.clear()
+        self._listener = Thread(target=self._listen, args=(feed,), name='change-listener', daemon=True)
+        self._listener.start()
+
+    def stop_listening(self, timeout=None):
+        """Close the listening connection"""
+        self._stop_listening.set()
+        if self._listener is not None:
+            self._listener.join(timeout)
+
+    def _listen(self, feed):
+        delay = LISTEN_RETRY_DELAY
+        while not self._stop_listening.is_set():
+            try:
+                with self.new_connection(autocommit=True) as connection:
+                    connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(feed.channel)))
+                    feed.connected()
+                    delay = LISTEN_RETRY_DELAY
+                    while not self._stop_listening.is_set():
+                        for notify in connection.notifies(timeout=LISTEN_POLL_TIMEOUT):
+                            feed.dispatch(notify.payload)
+            except (psycopg.OperationalError, psycopg.InterfaceError) as e:
+                logger.error(f"Change notifications connection lost, reconnecting in {delay:.0f} seconds: {e}")
+            feed.disconnected()
+            self._stop_listening.wait(delay)
+            delay = min(delay * 2, 60)
+
+    def _conninfo(self):
+        """Return the connection string of the PostgreSQL database"""
+        # Parse DATABASE_URL if needed for Heroku
+        conninfo = DATABASE_URL
+
+        # psycopg3 automatically handles sslmode if in connection string
+        # For Heroku, ensure sslmode=require is in the URL or add it
+        if os.environ.get("HEROKU"):
+            if "sslmode" not in conninfo:
+                # Add sslmode parameter
+                separator = "&" if "?" in conninfo else "?"
+                conninfo = f"{conninfo}{separator}sslmode=require"
+        return conninfo
+
     def _connect(self):
         """Create a connection to the PostgreSQL database"""
         try:
-            # Parse DATABASE_URL if needed for Heroku
-            conninfo = DATABASE_URL
-
-            # psycopg3 automatically handles sslmode if in connection string
-            # For Heroku, ensure sslmode=require is in the URL or add it
-            if os.environ.get("HEROKU"):
-                if "sslmode" not in conninfo:
-                    # Add sslmode parameter
-                    separator = "&" if "?" in conninfo else "?"
-                    conninfo = f"{conninfo}{separator}sslmode=require"
-
             self._connection = psycopg.connect(
-                conninfo,
+                self._conninfo(),
                 connect_timeout=10,
                 autocommit=False
             )
@@ -84,41 +277,47 @@ class PostgreSqlDb:
             logger.error(f"Failed to connect to database: {e}")
             raise
 
-    def _create_tables(self):
-        """Create database tables"""
+    def _migrate(self):
+        """Apply pending schema migrations, skipping all DDL when the schema is already up to date"""
+        if self._schema_version == LATEST_SCHEMA_VERSION:     # e.g. when restarting the connection
+            return
         try:
             with self._connection.cursor() as cur:
-                # cur.execute("DROP TABLE playing")
-                cur.execute("CREATE TABLE IF NOT EXISTS PLAYERS ("
-                            "   user_id BIGINT,"
-                            "   user_first_name VARCHAR,"
-                            "   user_last_name VARCHAR,"
-                            "   user_username VARCHAR,"
-                            "   player_banned BOOLEAN NOT NULL,"
-                            "   player_ban_duration INT NOT NULL,"
-                            "   player_rating NUMERIC(3, 2) NOT NULL CHECK (player_rating BETWEEN 1.00 AND 5.00),"
-                            "   player_rated_by BIGINT[] NOT NULL,"
-                            "   PRIMARY KEY (user_id, user_first_name, user_last_name, user_username))")
-
-                cur.execute("CREATE TABLE IF NOT EXISTS PLAYING ("
-                            "   user_id BIGINT,"
-                            "   user_first_name VARCHAR,"
-                            "   user_last_name VARCHAR,"
-                            "   user_username VARCHAR,"
-                            "   player_liable BOOLEAN NOT NULL,"
-                            "   player_approved BOOLEAN NOT NULL,"
-                            "   player_match_ball BOOLEAN NOT NULL,"
-                            "   PRIMARY KEY (user_id, user_first_name, user_last_name, user_username))")
-
-                cur.execute("CREATE TABLE IF NOT EXISTS INVITED ("
-                            "   username VARCHAR PRIMARY KEY)")
-
-                cur.execute("CREATE TABLE IF NOT EXISTS ASKED ("
-                            "   user_id_or_name VARCHAR PRIMARY KEY)")
+                self._schema_version = self._read_schema_version(cur)
+                if self._schema_version != LATEST_SCHEMA_VERSION:
+                    # serialize bot processes starting together, then re-read the version under the lock
+                    cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+                    cur.execute("CREATE TABLE IF NOT EXISTS SCHEMA_VERSION ("
+                                "   version INT PRIMARY KEY,"
+                                "   description VARCHAR NOT NULL,"
+                                "   applied_at TIMESTAMPTZ NOT NULL DEFAULT now())")
+                    self._schema_version = self._read_schema_version(cur)
+                    for version, description, statements in MIGRATIONS:
+                        if version <= self._schema_version:
+                            continue
+                        for statement in statements:
+                            cur.execute(statement)
+                        cur.execute("INSERT INTO SCHEMA_VERSION (version, description) VALUES (%s, %s)",
+                                    (version, description))
+                        logger.info(f"Applied schema migration {version}: {description}")
 
+            # all pending migrations are applied in a single transaction, so a failed one leaves no partial schema
             self._connection.commit()
-            logger.info("Database tables created/verified successfully")
+            self._schema_version = LATEST_SCHEMA_VERSION
+            logger.info(f"Database schema is up to date (version {LATEST_SCHEMA_VERSION})")
         except Exception as e:
-            logger.error(f"Error creating tables: {e}")
+            logger.error(f"Error migrating database schema: {e}")
             self._connection.rollback()
+            self._schema_version = None
             raise
+
+    @staticmethod
+    def _read_schema_version(cur):
+        """Return the applied schema version, or 0 if no migration was recorded yet"""
+        cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        (exists,) = cur.fetchone()
+        if not exists:
+            return 0
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM SCHEMA_VERSION")
+        (version,) = cur.fetchone()
+        return version
@@ -0,0 +1,67 @@
+from collections import deque
+from itertools import islice
+
+from fairness import IndexedHeap
+
+
+class WaitingLine:
+    """This object holds the waiting list as two ordered queues: approved and unapproved players"""
+    def __init__(self, waiting, prefer_approved):
+        self.prefer_approved = prefer_approved
+        if prefer_approved:
+            self.approved = deque(player for player in waiting if player.approved)
+            self.unapproved = deque(player for player in waiting if not player.approved)
+        else:
+            self.approved = deque()
+            self.unapproved = deque(waiting)
+
+    def pop_first_in_line(self):
+        """Pop the next player to be promoted, or None if the waiting list is empty"""
+        if self.approved:
+            return self.approved.popleft()
+        if self.unapproved:
+            return self.unapproved.popleft()
+        return None
+
+
+class PriorityLine:
+    """This object holds the waiting list in an indexed heap, by rank (highest first) and then by position
+
+    Players who've approved their attendance still come first when preferred."""
+    def __init__(self, waiting, prefer_approved, rank):
+        self._players = {id(player): player for player in waiting}
+        self._heap = IndexedHeap((id(player), (prefer_approved and not player.approved, -rank(player), position))
+                                 for position, player in enumerate(waiting))
+
+    def pop_first_in_line(self):
+        """Pop the next player to be promoted, or None if the waiting list is empty"""
+        key = self._heap.pop()
+        return self._players[key] if key is not None else None
+
+
+def sweep(playing, removed, list_max_size, prefer_approved=True, rank=None):
+    """Remove players from the list and promote waiting players in their place in a single pass
+
+    Every player removed from the playing list is replaced by the first player in line on the waiting list (preferably
+    one who has approved his attendance), who becomes last on the playing list. Players removed from the waiting list
+    are not replaced. When given a rank function, the player in line is the highest ranked one instead. Return a list
+    of (removed player, promoted player or None) pairs in removal order."""
+    removed_ids = {id(player) for player in removed}
+    playing_part = list(islice(playing, list_max_size))
+    waiting_part = [player for player in islice(playing, list_max_size, None) if id(player) not in removed_ids]
+    playing_ids = {id(player) for player in playing_part}
+
+    line = PriorityLine(waiting_part, prefer_approved, rank) if rank else WaitingLine(waiting_part, prefer_approved)
+    kept = [player for player in playing_part if id(player) not in removed_ids]
+    promotions = []
+    for player in removed:
+        first_in_line = line.pop_first_in_line() if id(player) in playing_ids else None
+        if first_in_line is not None:
+            kept.append(first_in_line)
+        promotions.append((player, first_in_line))
+
+    promoted_ids = {id(first_in_line) for _, first_in_line in promotions if first_in_line is not None}
+    playing.clear()
+    playing.extend(kept)
+    playing.extend(player for player in waiting_part if id(player) not in promoted_ids)
+    return promotions
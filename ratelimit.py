@@ -0,0 +1,80 @@
+import time
+from threading import Lock
+from collections import Counter
+
+SILENT_POLICY = 'silent'
+WARN_POLICY = 'warn'
+
+
+def parse_limit(limit):
+    """Parse a '<commands>/<seconds>' limit, e.g. '3/60' allows 3 commands every 60 seconds"""
+    capacity, period = limit.split('/')
+    return int(capacity), float(period)
+
+
+def parse_limits(limits):
+    """Parse a comma separated list of '<command>=<commands>/<seconds>' limits"""
+    parsed = {}
+    for item in filter(None, (item.strip() for item in limits.split(','))):
+        command, limit = item.split('=')
+        parsed[command.strip().lower()] = parse_limit(limit)
+    return parsed
+
+
+class TokenBucket:
+    """This object holds up to `capacity` tokens, refilled evenly over `period` seconds"""
+    def __init__(self, capacity, period, now):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now):
+        """Take a token if one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CommandRateLimiter:
+    """This class rate limits commands with a token bucket per user and command"""
+
+    def __init__(self, limits, default_limit, policy=WARN_POLICY, clock=time.monotonic):
+        self._limits = limits
+        self._default_limit = default_limit
+        self._policy = policy
+        self._clock = clock
+        self._buckets = {}
+        self._warned = set()
+        self._lock = Lock()
+        self.throttled = Counter()      # number of throttled requests per command
+
+    def allow(self, user_id, command):
+        """Return whether the command may run, and whether the user should be warned it was dropped"""
+        command = command.lower()
+        key = (user_id, command)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                capacity, period = self._limits.get(command, self._default_limit)
+                bucket = self._buckets[key] = TokenBucket(capacity, period, self._clock())
+            if bucket.consume(self._clock()):
+                self._warned.discard(key)
+                return True, False
+
+            self.throttled[command] += 1
+            warn = self._policy == WARN_POLICY and key not in self._warned
+            self._warned.add(key)
+            return False, warn
+
+    def prune(self):
+        """Forget buckets that have refilled completely, as they behave exactly like new ones"""
+        now = self._clock()
+        with self._lock:
+            for key, bucket in list(self._buckets.items()):
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity:
+                    del self._buckets[key]
+                    self._warned.discard(key)
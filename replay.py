@@ -0,0 +1,249 @@
+"""Replay of recorded production traffic, for comparing the latency and Bot API calls of two builds
+
+Pushes the traffic logs recorded by the bot (see RECORD_TRAFFIC_PATH, one log per process start) through the bot's
+real handlers and the jobs it ran, in order, with the clock set to each record's time. Replies go to the Bot API
+stand-in of loadtest.py through a real telegram.Bot, and the handlers talk to the database, so point DATABASE_URL to a
+local database. Records are replayed at the recorded pace (--speed 1), faster, or as fast as possible (--speed 0):
+
+    DATABASE_URL=postgresql://localhost/technionfc python replay.py run traffic-*.jsonl.gz --output base.json
+    git checkout candidate
+    DATABASE_URL=postgresql://localhost/technionfc python replay.py run traffic-*.jsonl.gz --output candidate.json
+    python replay.py compare base.json candidate.json
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import subprocess
+from time import perf_counter
+from datetime import datetime
+from itertools import chain
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+os.environ.setdefault('TELEGRAM_CHAT_ID', '-1001760505503')      # must be set before the bot reads its config
+
+from telegram import Bot, Update
+from telegram.ext import CommandHandler, DispatcherHandlerStop
+
+import bot
+from clock import SimulatedClock, ISRAEL_TIMEZONE
+from simulator import SimulatedJobQueue
+from loadtest import BotApiStandIn
+from traffic import read_records
+
+logger = logging.getLogger(__name__)
+
+
+class Replayer:
+    """This class dispatches recorded updates to the bot's handlers and runs its recorded jobs, timing each"""
+
+    def __init__(self, records, telegram_bot):
+        self.records = records
+        self.telegram_bot = telegram_bot
+        self.clock = SimulatedClock(self._moment(records[0]['time']))
+        self.job_queue = SimulatedJobQueue(self.clock)
+        self.handlers = {}
+        self.group_chat_ids = {record['group_chat_id'] for record in records if record['kind'] == 'header'}
+        self.latencies = defaultdict(list)      # step -> seconds per run
+        self.errors = Counter()                 # step -> failed runs
+        self.api_calls = Counter()              # step -> Bot API calls made while running it
+        self.missing_jobs = Counter()           # recorded jobs the replayed build doesn't have
+
+    # region SETUP
+
+    def add_handler(self, handler, group=0):
+        """Collect the bot's handlers the way a telegram.ext.Dispatcher would"""
+        self.handlers.setdefault(group, []).append(handler)
+
+    def add_error_handler(self, callback):
+        pass
+
+    @staticmethod
+    def _moment(timestamp):
+        return datetime.fromtimestamp(timestamp, ISRAEL_TIMEZONE)
+
+    # endregion
+
+    # region RUN
+
+    def run(self, stand_in, speed):
+        """Replay all records, at `speed` times the recorded pace (as fast as possible if 0). Return the wall time"""
+        bot.clock = self.clock
+        bot.register_handlers(self)
+        bot.register_jobs(self.job_queue)
+        snapshot = next((record['state'] for record in self.records if record['kind'] == 'snapshot'), None)
+        if snapshot is not None:
+            bot.restore_roster_snapshot(snapshot)
+
+        first = self.records[0]['time']
+        started = perf_counter()
+        for record in self.records:
+            if speed:
+                delay = started + (record['time'] - first) / speed - perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.clock.set(self._moment(record['time']))
+            if record['kind'] == 'update':
+                data = map_chat_ids(record['update'], self.group_chat_ids, int(bot.TELEGRAM_CHAT_ID))
+                update = Update.de_json(data, self.telegram_bot)
+                self._measure(get_step(update), stand_in, self.dispatch, update)
+            elif record['kind'] == 'job':
+                job = self._find_job(record)
+                if job is None:
+                    self.missing_jobs[record['job']] += 1
+                    continue
+                self._measure(f'job {job.name}', stand_in, job.callback, self._make_context(job=job))
+        return perf_counter() - started
+
+    def dispatch(self, update):
+        """Run an update through the first matching handler of every group, the way a telegram.ext.Dispatcher would"""
+        for group in sorted(self.handlers):
+            for handler in self.handlers[group]:
+                check = handler.check_update(update)
+                if check is None or check is False:
+                    continue
+                args = check[0] if isinstance(handler, CommandHandler) and isinstance(check, tuple) else None
+                try:
+                    handler.callback(update, self._make_context(args=args))
+                except DispatcherHandlerStop:
+                    return
+                break
+
+    def _find_job(self, record):
+        for job in self.job_queue.jobs:
+            if job.name == record['job'] and ('context' not in record or job.context == record['context']):
+                return job
+        return None
+
+    def _make_context(self, args=None, job=None):
+        return SimpleNamespace(bot=self.telegram_bot, job_queue=self.job_queue, args=args or [], job=job, error=None)
+
+    def _measure(self, step, stand_in, action, *args):
+        api_calls = sum(stand_in.calls.values())
+        started = perf_counter()
+        try:
+            action(*args)
+        except Exception as err:
+            logger.exception(f"Replaying {step} failed: {err}")
+            self.errors[step] += 1
+        self.latencies[step].append(perf_counter() - started)
+        self.api_calls[step] += sum(stand_in.calls.values()) - api_calls
+
+    # endregion
+
+    # region RESULTS
+
+    def results(self, log_paths, speed, wall_seconds, stand_in):
+        """Return the run's results as a JSON serializable dict"""
+        steps = {}
+        for step, latencies in self.latencies.items():
+            steps[step] = {'runs': len(latencies), 'errors': self.errors[step],
+                           'mean_ms': sum(latencies) * 1000 / len(latencies),
+                           'p50_ms': percentile(latencies, 0.5) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+                           'max_ms': max(latencies) * 1000, 'api_calls': self.api_calls[step]}
+        return {'build': get_build(), 'logs': log_paths, 'speed': speed, 'wall_seconds': wall_seconds,
+                'records': len(self.records), 'steps': steps, 'api_calls': dict(stand_in.calls),
+                'missing_jobs': dict(self.missing_jobs)}
+
+    # endregion
+
+
+def map_chat_ids(data, group_chat_ids, chat_id):
+    """Return a copy of an update's dict with the recorded group chat's id replaced by the replaying bot's"""
+    if isinstance(data, list):
+        return [map_chat_ids(item, group_chat_ids, chat_id) for item in data]
+    if not isinstance(data, dict):
+        return data
+    mapped = {key: map_chat_ids(value, group_chat_ids, chat_id) for key, value in data.items()}
+    if mapped.get('id') in group_chat_ids:
+        mapped['id'] = chat_id
+    return mapped
+
+
+def get_step(update):
+    """Return the step an update's cost is attributed to: its command, or the action of its button"""
+    if update.callback_query is not None:
+        return f'button {(update.callback_query.data or "").split(":")[0]}'
+    message = update.effective_message
+    if message is not None and message.text and message.text.startswith('/'):
+        return message.text.split()[0].split('@')[0].lower()
+    return 'other'
+
+
+def get_build():
+    """Return the git commit of the replayed build, if known"""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percentile(samples, quantile):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * quantile), len(ordered) - 1)]
+
+
+def compare(base, candidate):
+    """Return a textual comparison of two runs' latencies and Bot API calls per step"""
+    lines = [f'Base: {base["build"]} ({base["wall_seconds"]:.1f} s), '
+             f'candidate: {candidate["build"]} ({candidate["wall_seconds"]:.1f} s), '
+             f'same logs: {base["logs"] == candidate["logs"] and base["records"] == candidate["records"]}',
+             '',
+             f'{"step":<32}{"runs":>7}{"p50 ms":>17}{"p95 ms":>17}{"change":>9}{"API calls":>15}{"errors":>9}']
+    for step in sorted(set(base['steps']) | set(candidate['steps'])):
+        before, after = base['steps'].get(step), candidate['steps'].get(step)
+        if before is None or after is None:
+            lines.append(f'{step:<32}  only in the {"candidate" if before is None else "base"}')
+            continue
+        change = (after['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        lines.append(f'{step:<32}{after["runs"]:>7}'
+                     f'{before["p50_ms"]:>8.2f} {after["p50_ms"]:>8.2f}{before["p95_ms"]:>8.2f} {after["p95_ms"]:>8.2f}'
+                     f'{change:>+8.0f}%{before["api_calls"]:>7} {after["api_calls"]:>7}'
+                     f'{before["errors"]:>4} {after["errors"]:>4}')
+    lines += ['', f'Bot API calls: {base["api_calls"]} -> {candidate["api_calls"]}']
+    if base['missing_jobs'] or candidate['missing_jobs']:
+        lines.append(f'Recorded jobs not found: {base["missing_jobs"]} -> {candidate["missing_jobs"]}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded traffic through the Technion FC bot')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='replay traffic logs and write the results')
+    run_parser.add_argument('logs', nargs='+', help='traffic logs recorded by the bot')
+    run_parser.add_argument('--output', required=True, help='file to write the results to (JSON)')
+    run_parser.add_argument('--speed', type=float, default=0, help='replay speed, 1 for real time, 0 for maximal')
+    run_parser.add_argument('--api-port', type=int, default=8081, help='port of the Bot API stand-in')
+    run_parser.add_argument('--api-latency', type=float, default=0.0, help='seconds the stand-in takes per call')
+    compare_parser = commands.add_parser('compare', help='compare the results of two replays')
+    compare_parser.add_argument('base', help='results of the base build')
+    compare_parser.add_argument('candidate', help='results of the candidate build')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.base) as base, open(args.candidate) as candidate:
+            return print(compare(json.load(base), json.load(candidate)))
+
+    logging.getLogger().setLevel(logging.WARNING)
+    records = sorted(chain.from_iterable(read_records(path) for path in args.logs), key=lambda record: record['time'])
+    if not records:
+        raise SystemExit(f'{", ".join(args.logs)} have no records')
+    stand_in = BotApiStandIn(args.api_port, latency=args.api_latency)
+    stand_in.start()
+    try:
+        telegram_bot = Bot('123456:replay', base_url=f'http://127.0.0.1:{args.api_port}/bot')
+        replayer = Replayer(records, telegram_bot)
+        wall_seconds = replayer.run(stand_in, args.speed)
+        results = replayer.results(args.logs, args.speed, wall_seconds, stand_in)
+    finally:
+        stand_in.stop()
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'Replayed {len(records)} records in {wall_seconds:.2f} seconds, Bot API calls: {results["api_calls"]}')
+
+
+if __name__ == '__main__':
+    main()
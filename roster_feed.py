@@ -0,0 +1,108 @@
+import json
+import time
+from datetime import timedelta
+from threading import Lock
+
+from tornado.concurrent import Future
+from tornado.gen import with_timeout
+from tornado.ioloop import IOLoop
+from tornado.util import TimeoutError
+from tornado.web import RequestHandler, HTTPError
+
+
+class RosterFeed:
+    """This class holds the JSON rendering of the roster served to external consumers
+
+    The document is rendered once per roster change, on the thread that changed the roster, so requests only copy
+    bytes. When several bot processes share the roster, its ETag is the shared roster version, so every process serves
+    the same version under the same ETag. Otherwise, it is the roster version within this process (prefixed by the
+    process start time, so versions never repeat across restarts). Long polling clients wait on a future resolved when
+    the version changes."""
+
+    def __init__(self):
+        self._epoch = int(time.time())
+        self._version = 0
+        self._shared = False        # whether the version is the shared roster version
+        self._body = json.dumps({'version': None, 'playing': [], 'waiting': [], 'matches': []}).encode()
+        self._waiters = []
+        self._lock = Lock()
+
+    @property
+    def etag(self):
+        return f'"shared-{self._version}"' if self._shared else f'"{self._epoch}-{self._version}"'
+
+    def current(self):
+        """Return the current (body, etag) pair"""
+        with self._lock:
+            return self._body, self.etag
+
+    def publish(self, document, version=None):
+        """Replace the served document with a new roster version and wake up long polling clients
+
+        `version` is the shared roster version, if the roster is shared."""
+        with self._lock:
+            if version is not None:
+                self._version, self._shared = version, True
+            else:
+                self._version += 1
+            document = dict(document, version=self._version)
+            self._body = json.dumps(document, ensure_ascii=False).encode()
+            waiters, self._waiters = self._waiters, []
+        for io_loop, future in waiters:
+            io_loop.add_callback(_resolve, future)
+
+    def wait_for_change(self, etag):
+        """Return a future resolved once the ETag differs from the given one (already resolved if it does)"""
+        future = Future()
+        with self._lock:
+            if etag != self.etag:
+                future.set_result(None)
+            else:
+                self._waiters.append((IOLoop.current(), future))
+        return future
+
+    def cancel_wait(self, future):
+        """Forget a waiting client that timed out"""
+        with self._lock:
+            self._waiters = [(io_loop, waiter) for io_loop, waiter in self._waiters if waiter is not future]
+
+    def mount(self, httpd, path, long_poll_timeout):
+        """Serve the roster at the given path of a running webhook server"""
+        httpd.http_server.request_callback.add_handlers(r'.*', [
+            (path, RosterHandler, {'feed': self, 'long_poll_timeout': long_poll_timeout}),
+        ])
+
+
+def _resolve(future):
+    if not future.done():       # the client may have timed out in the meantime
+        future.set_result(None)
+
+
+class RosterHandler(RequestHandler):
+    """Serve the roster as JSON. Pass `?wait=<seconds>` with If-None-Match to wait for the next change"""
+
+    def initialize(self, feed, long_poll_timeout):
+        self._feed = feed
+        self._long_poll_timeout = long_poll_timeout
+        self._etag = None
+
+    async def get(self):
+        body, self._etag = self._feed.current()
+        try:
+            wait = min(float(self.get_query_argument('wait', 0)), self._long_poll_timeout)
+        except ValueError:
+            raise HTTPError(400, 'wait must be a number of seconds')
+        if wait > 0 and self._etag in self.request.headers.get('If-None-Match', ''):
+            future = self._feed.wait_for_change(self._etag)
+            try:
+                await with_timeout(timedelta(seconds=wait), future)
+            except TimeoutError:
+                self._feed.cancel_wait(future)
+            body, self._etag = self._feed.current()
+
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.set_header('Cache-Control', 'no-cache')
+        self.write(body)        # finish() answers 304 Not Modified instead if If-None-Match still matches
+
+    def compute_etag(self):
+        return self._etag
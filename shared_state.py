@@ -0,0 +1,262 @@
+import logging
+from functools import wraps, partial
+from threading import RLock, local
+
+from psycopg import Error, OperationalError, InterfaceError
+from psycopg.types.json import Jsonb
+from telegram.utils.request import Request
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3        # attempts to run a handler before giving up on a conflicting update
+
+
+class SharedRoster:
+    """This class keeps the in-memory roster in sync with the ROSTER_STATE table
+
+    When enabled, several bot processes share the roster. Each handler runs on the latest state, and its changes are
+    written only if no other process changed the state in the meantime, which is checked using the row version
+    (optimistic concurrency). On a conflict, the handler is run again on the newer state. When disabled, handlers are
+    only serialized against the jobs running on the JobQueue thread.
+
+    A handler that raises has its changes to the in-memory state undone before the error propagates.
+
+    Since a handler may run more than once, its side effects outside the roster (messages, announcements and writes)
+    are deferred: they are held back while it runs and carried out only once its changes are committed. If it still
+    conflicts after MAX_ATTEMPTS, they are dropped and `on_conflict` is called with the handler's arguments instead.
+
+    Either way, `on_change` is called with the new state and its shared version (None when disabled) whenever a
+    handler or another process changes it.
+
+    While listening to the change feed, commits notify the other processes of the new version, so the state is only
+    read again after one of them changed it, rather than before every handler."""
+
+    def __init__(self, database, snapshot, restore, enabled, on_change=None, feed=None, on_conflict=None):
+        self._database = database
+        self._feed = feed
+        self._snapshot = snapshot       # returns the in-memory state as a JSON serializable dict
+        self._restore = restore         # replaces the in-memory state with a given dict
+        self._on_change = on_change     # called with the state and its version after every change
+        self._on_conflict = on_conflict     # called with the arguments of a handler given up on
+        self._effects = local()         # side effects deferred by the handler running on each thread
+        self.enabled = enabled
+        self.version = None             # version of the shared state held in memory
+        self._stale = True              # whether another process may have changed the state since it was read
+        self._lock = RLock()
+        if feed is not None:
+            feed.subscribe('ROSTER_STATE', self._notified)
+            feed.on_reconnect(self.invalidate)
+
+    def start(self):
+        """Load the shared state, or publish the state restored from the back up if no process has done so yet"""
+        if not self.enabled:
+            return
+        with self._lock:
+            state = self._snapshot()
+            self.sync()
+            if self.version == 0 and any(match['playing'] for match in state['matches']):
+                self.commit({})
+
+    def invalidate(self):
+        """Read the shared state again before the next handler"""
+        self._stale = True
+
+    def _notified(self, op, rows):
+        if rows and rows[-1] != self.version:
+            self.invalidate()
+
+    def sync(self):
+        """Load the shared state if another process changed it"""
+        if not self._stale and self._feed is not None and self._feed.listening:
+            return
+        self._stale = False         # before reading, so a change notified meanwhile is read next time
+        try:
+            connection = self._database.get_connection()
+            with connection.cursor() as cur:
+                cur.execute("SELECT version, CASE WHEN version IS DISTINCT FROM %s THEN state END "
+                            "FROM ROSTER_STATE WHERE id = 1", (self.version,))
+                version, state = cur.fetchone()
+            connection.commit()
+        except Error:
+            self.invalidate()
+            raise
+        if version != self.version:
+            if state:
+                self._restore(state)
+                self._changed(state, version)
+            self.version = version
+
+    def commit(self, before):
+        """Write the in-memory state if it changed since `before`. Return False if another process changed it first"""
+        state = self._snapshot()
+        if state == before:
+            return True
+
+        connection = self._database.get_connection()
+        with connection.cursor() as cur:
+            cur.execute("UPDATE ROSTER_STATE SET state = %s, version = version + 1 "
+                        "WHERE id = 1 AND version = %s RETURNING version", (Jsonb(state), self.version))
+            row = cur.fetchone()
+            if row is not None and self._feed is not None:
+                for query, params in self._feed.statements('ROSTER_STATE', list(row)):
+                    cur.execute(query, params)
+        connection.commit()
+        if row is None:
+            self.invalidate()
+            return False
+        (self.version,) = row
+        self._changed(state, self.version)
+        return True
+
+    def refresh(self):
+        """Load the shared state now if another process changed it, rather than before the next handler"""
+        if self.enabled:
+            with self._lock:
+                self.sync()
+
+    def _changed(self, state, version):
+        if self._on_change is not None:
+            self._on_change(state, version)
+
+    def defer(self, action, *args, **kwargs):
+        """Carry out a side effect once the running handler's changes are committed, or right away outside handlers
+        and when the roster isn't shared"""
+        pending = getattr(self._effects, 'pending', None)
+        if pending is None:
+            return action(*args, **kwargs)
+        pending.append(partial(action, *args, **kwargs))
+
+    def deferred(self, action):
+        """Wrap a function with side effects so calls to it are deferred"""
+        @wraps(action)
+        def wrapper(*args, **kwargs):
+            return self.defer(action, *args, **kwargs)
+        return wrapper
+
+    def _run_effects(self, effects):
+        for effect in effects:
+            try:
+                effect()
+            except Exception as err:
+                logger.warning(f"Deferred {getattr(effect.func, '__name__', effect.func)} failed: {err}")
+
+    def _rollback(self, before):
+        """Undo the changes of a handler that failed partway, so they aren't published by the next one"""
+        self.invalidate()
+        try:
+            if self._snapshot() != before:
+                self._restore(before)
+        except Exception as err:
+            logger.error(f"Failed to restore the roster to version {self.version}, reading it again: {err}")
+            self.version = None
+
+    def transaction(self, callback):
+        """Wrap a handler or job callback so it runs on the latest shared state and publishes its changes"""
+        @wraps(callback)
+        def wrapper(*args, **kwargs):
+            with self._lock:
+                if getattr(self._effects, 'pending', None) is not None:     # nested in a running transaction
+                    return callback(*args, **kwargs)
+                if not self.enabled:
+                    if self._on_change is None:
+                        return callback(*args, **kwargs)
+                    before = self._snapshot()
+                    result = callback(*args, **kwargs)
+                    state = self._snapshot()
+                    if state != before:
+                        self._changed(state, None)
+                    return result
+
+                for attempt in range(1, MAX_ATTEMPTS + 1):
+                    self.sync()
+                    before = self._snapshot()
+                    self._effects.pending = []
+                    try:
+                        result = callback(*args, **kwargs)
+                        committed = self.commit(before)
+                        effects = self._effects.pending
+                    except Exception:
+                        self._rollback(before)
+                        raise
+                    finally:
+                        self._effects.pending = None
+                    if committed:
+                        self._run_effects(effects)
+                        return result
+                    logger.warning(f"Roster version {self.version} is stale, running {callback.__name__} again "
+                                   f"(attempt {attempt}, {len(effects)} side effects dropped)")
+                logger.error(f"Giving up on {callback.__name__} after {MAX_ATTEMPTS} conflicting attempts")
+                if self._on_conflict is not None:
+                    self._on_conflict(*args, **kwargs)
+        return wrapper
+
+
+class DeferringRequest(Request):
+    """This class defers the Bot API calls made by handlers of a shared roster (see SharedRoster.defer), so messages
+    are only sent once the changes they tell of are committed. Calls reading from the Bot API (get*) are made right
+    away, as handlers need their results"""
+
+    def __init__(self, roster, **kwargs):
+        super().__init__(**kwargs)
+        self._roster = roster
+
+    def post(self, url, data=None, timeout=None):
+        if url.rsplit('/', 1)[-1].startswith('get'):
+            return super().post(url, data, timeout)
+        return self._roster.defer(super().post, url, data, timeout)
+
+
+class LeaderLease:
+    """This class elects a single bot process to run the scheduled jobs
+
+    The leader holds a session level Postgres advisory lock on a dedicated connection. If the leader dies, or its
+    connection does, Postgres releases the lock and another process takes over on its next job."""
+
+    def __init__(self, database, key, enabled):
+        self._database = database
+        self._key = key
+        self.enabled = enabled
+        self._connection = None
+        self._held = False
+        self._lock = RLock()
+
+    def is_leader(self):
+        """Return whether this process holds the leader lease, trying to acquire it if no process does"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            try:
+                if self._connection is None or self._connection.closed:
+                    self._connection = self._database.new_connection(autocommit=True)
+                    self._held = False
+                with self._connection.cursor() as cur:
+                    if self._held:
+                        cur.execute("SELECT 1")       # the lease lasts as long as the connection does
+                    else:
+                        cur.execute("SELECT pg_try_advisory_lock(%s)", (self._key,))
+                        (self._held,) = cur.fetchone()
+                        if self._held:
+                            logger.info("Acquired the leader lease, running scheduled jobs on this process")
+            except (OperationalError, InterfaceError) as err:
+                logger.error(f"Lost the leader lease: {err}")
+                self.release()
+            return self._held
+
+    def release(self):
+        """Give up the leader lease by closing its connection"""
+        with self._lock:
+            self._held = False
+            if self._connection is not None:
+                try:
+                    self._connection.close()
+                except Error as err:
+                    logger.error(f"Error closing leader lease connection: {err}")
+                self._connection = None
+
+    def leader_only(self, callback):
+        """Wrap a job callback so it only runs on the leader"""
+        @wraps(callback)
+        def wrapper(*args, **kwargs):
+            if self.is_leader():
+                return callback(*args, **kwargs)
+        return wrapper
@@ -0,0 +1,350 @@
+"""Time-accelerated simulation of a full match week
+
+Drives the bot's real command handlers, callback query handler and jobs through a week of synthetic user behavior
+using a simulated clock and a stand-in for the Telegram bot, then reports throughput and where time was spent at each
+step of the bot's schedule. The handlers still talk to the database, so point DATABASE_URL to a local database:
+
+    DATABASE_URL=postgresql://localhost/technionfc python simulator.py --players 40 --seed 7
+"""
+import os
+import heapq
+import random
+import logging
+import argparse
+from time import perf_counter
+from itertools import count
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault('TELEGRAM_CHAT_ID', '-1001760505503')      # must be set before the bot reads its config
+
+from telegram import User, Chat, Message, MessageEntity, Update, CallbackQuery
+from telegram.ext import CommandHandler, CallbackQueryHandler
+
+import bot
+from clock import SimulatedClock, ISRAEL_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+GROUP_CHAT_ID = int(bot.TELEGRAM_CHAT_ID)
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+FIRST_NAMES = ('Daniel', 'Omer', 'Yossi', 'Itay', 'Noam', 'Amit', 'Eitan', 'Ariel', 'Tomer', 'Guy',
+               'דניאל', 'עומר', 'יוסי', 'איתי', 'נועם', 'עמית', 'איתן', 'אריאל', 'תומר', 'גיא')
+LAST_NAMES = ('Cohen', 'Levi', 'Mizrahi', 'Peretz', 'Biton', 'Friedman', 'Avraham', 'Katz', 'Shapira', 'Golan',
+              'כהן', 'לוי', 'מזרחי', 'פרץ', 'ביטון', 'פרידמן', 'אברהם', 'כץ', 'שפירא', 'גולן')
+
+
+class SimulatedBot:
+    """This object stands in for telegram.Bot and counts the Bot API calls made by the handlers"""
+    def __init__(self):
+        self.admins = set()
+        self.defaults = None        # read by telegram.Message when replying
+        self.calls = Counter()
+        self._message_ids = count(1)
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        self.calls['sendMessage'] += 1
+        return SimpleNamespace(message_id=next(self._message_ids), chat_id=chat_id, text=text)
+
+    def get_chat_member(self, chat_id, user_id, *args, **kwargs):
+        self.calls['getChatMember'] += 1
+        return SimpleNamespace(status='administrator' if user_id in self.admins else 'member')
+
+    def answer_callback_query(self, callback_query_id, *args, **kwargs):
+        self.calls['answerCallbackQuery'] += 1
+        return True
+
+    def edit_message_text(self, text, *args, **kwargs):
+        self.calls['editMessageText'] += 1
+        return True
+
+
+class SimulatedJobQueue:
+    """This object stands in for telegram.ext.JobQueue and runs jobs by the simulated clock"""
+    def __init__(self, clock):
+        self.clock = clock
+        self.jobs = []
+
+    def run_once(self, callback, when, context=None, name=None):
+        return self._add(callback, self.clock.now() + timedelta(seconds=when), context, name)
+
+    def run_repeating(self, callback, interval, first=None, context=None, name=None):
+        job = self._add(callback, self.clock.now() + timedelta(seconds=first or interval), context, name)
+        job.interval = timedelta(seconds=interval)
+        return job
+
+    def run_daily(self, callback, time, days=tuple(range(7)), context=None, name=None):
+        job = self._add(callback, None, context, name)
+        job.time, job.days = time, days
+        job.next_t = self._next_daily_run(job, self.clock.now())
+        return job
+
+    def get_jobs_by_name(self, name):
+        return tuple(job for job in self.jobs if job.name == name)
+
+    def next_run(self):
+        """Return the time of the next job due to run, or None if there are no jobs"""
+        return min((job.next_t for job in self.jobs), default=None)
+
+    def pop_due(self, now):
+        """Return all jobs due to run by the given time and reschedule them"""
+        due = sorted((job for job in self.jobs if job.next_t <= now), key=lambda job: job.next_t)
+        for job in due:
+            if job.interval is not None:
+                job.next_t += job.interval
+            elif job.days is not None:
+                job.next_t = self._next_daily_run(job, job.next_t)
+            else:
+                self.jobs.remove(job)
+        return due
+
+    def _add(self, callback, next_t, context, name):
+        job = SimpleNamespace(callback=callback, next_t=next_t, context=context, name=name or callback.__name__,
+                              interval=None, time=None, days=None)
+        self.jobs.append(job)
+        return job
+
+    @staticmethod
+    def _next_daily_run(job, after):
+        """Return the first time after the given time at which a daily job runs"""
+        day = after.date()
+        while True:
+            run = ISRAEL_TIMEZONE.localize(datetime.combine(day, job.time.replace(tzinfo=None)))
+            if run > after and run.weekday() in job.days:
+                return run
+            day += timedelta(days=1)
+
+
+class StepStats:
+    """This object accumulates the time spent and API calls made at a single schedule step"""
+    def __init__(self, started):
+        self.started = started
+        self.runs = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.api_calls = 0
+
+    def add(self, seconds, api_calls, failed):
+        self.runs += 1
+        self.errors += failed
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.api_calls += api_calls
+
+
+class WeekSimulator:
+    """This class drives the bot through a week of synthetic behavior"""
+
+    def __init__(self, players, seed, start):
+        self.random = random.Random(seed)
+        self.clock = SimulatedClock(start)
+        self.telegram_bot = SimulatedBot()
+        self.users = [self._make_user(user_id) for user_id in range(1001, 1001 + players)]
+        self.admin = self.users[0]
+        self.telegram_bot.admins.add(self.admin.id)
+        self.job_queue = SimulatedJobQueue(self.clock)
+        self.handlers = {}
+        self.events = []
+        self.steps = {}
+        self._sequence = count()
+        self._update_ids = count(1)
+
+    # region SETUP
+
+    def _make_user(self, user_id):
+        return User(user_id, first_name=self.random.choice(FIRST_NAMES), is_bot=False,
+                    last_name=self.random.choice(LAST_NAMES), username=f'player{user_id}', bot=self.telegram_bot)
+
+    def add_handler(self, handler, group=0):
+        """Collect the bot's handlers the way a telegram.ext.Dispatcher would"""
+        self.handlers.setdefault(group, []).append(handler)
+
+    def get_callback(self, command=None):
+        """Return the callback handling the given command, or button presses if no command is given"""
+        for handler in self.handlers[0]:
+            if command is None and isinstance(handler, CallbackQueryHandler):
+                return handler.callback
+            if command is not None and isinstance(handler, CommandHandler) and command in handler.command:
+                return handler.callback
+        raise KeyError(command)
+
+    def add_error_handler(self, callback):
+        pass
+
+    def schedule(self, moment, step, action, *args):
+        """Schedule a user action at the given moment and attribute its cost to the given step"""
+        heapq.heappush(self.events, (moment, next(self._sequence), step, action, args))
+
+    # endregion
+
+    # region SCENARIO
+
+    def build_week(self):
+        """Schedule a week of synthetic behavior: two list creation races, two matchdays and everything in between"""
+        saturday = self.clock.now()
+        tuesday = saturday + timedelta(days=3)
+        for creation_day, matchday in (saturday, saturday + timedelta(days=2)), (tuesday, tuesday + timedelta(days=2)):
+            self._schedule_list_creation(creation_day)
+            self._schedule_matchday(matchday)
+
+    def _at(self, day, hour, minute, second=0):
+        return ISRAEL_TIMEZONE.localize(datetime(day.year, day.month, day.day, hour, minute, second))
+
+    def _schedule_list_creation(self, day):
+        """The race to /create at 21:30, followed by everyone adding themselves"""
+        step = f'{WEEKDAYS[day.weekday()]} 21:30 list creation race'
+        racers = self.random.sample(self.users, min(10, len(self.users)))
+        for racer in racers:
+            moment = self._at(day, 21, 29, 55) + timedelta(seconds=self.random.uniform(0, 10))
+            self.schedule(moment, step, self.send_command, racer, 'create', False)
+
+        step = f'{WEEKDAYS[day.weekday()]} evening additions'
+        for user in self.users:
+            moment = self._at(day, 21, 30, 10) + timedelta(seconds=self.random.expovariate(1 / 600))
+            self.schedule(moment, step, self.send_command, user, 'add', False)
+            if self.random.random() < 0.3:
+                self.schedule(moment + timedelta(minutes=1), step, self.send_command, user, 'print', False)
+
+        step = f'{WEEKDAYS[day.weekday()]} admin edits'
+        moment = self._at(day, 23, 0)
+        for _ in range(3):
+            target = self.random.choice(self.users[1:])
+            self.schedule(moment, step, self.send_command, self.admin, 'removeUser', True, target)
+            moment += timedelta(seconds=20)
+        self.schedule(moment, step, self.send_command, self.admin, 'addExternal Guest Player', True)
+
+    def _schedule_matchday(self, day):
+        """Approvals (mostly before the 16:00 deadline), match balls, removals and team shuffles"""
+        step = f'{WEEKDAYS[day.weekday()]} approval rush'
+        for user in self.users:
+            if self.random.random() < 0.85:
+                moment = self._at(day, 9, 0) + timedelta(minutes=self.random.triangular(0, 450, 400))
+                if self.random.random() < 0.5:
+                    self.schedule(moment, step, self.press_button, user, 'approve')
+                else:
+                    self.schedule(moment, step, self.send_command, user, 'approve', False)
+            if self.random.random() < 0.05:
+                moment = self._at(day, 10, 0) + timedelta(minutes=self.random.uniform(0, 400))
+                self.schedule(moment, step, self.send_command, user, 'ball', False)
+            if self.random.random() < 0.1:
+                moment = self._at(day, 8, 0) + timedelta(minutes=self.random.uniform(0, 600))
+                self.schedule(moment, step, self.send_command, user, 'remove', False)
+
+        step = f'{WEEKDAYS[day.weekday()]} 19:00 shuffles'
+        for user in self.random.sample(self.users, min(8, len(self.users))):
+            moment = self._at(day, 19, 0) + timedelta(minutes=self.random.uniform(0, 60))
+            self.schedule(moment, step, self.send_command, user, 'shuffle', False)
+
+    # endregion
+
+    # region UPDATES
+
+    def send_command(self, user, text, public, *tagged_users):
+        """Send a command the way Telegram would deliver it to the bot"""
+        chat = Chat(GROUP_CHAT_ID, Chat.SUPERGROUP) if public else Chat(user.id, Chat.PRIVATE)
+        command = text.split()[0]
+        text = f'/{text}'
+        entities = [MessageEntity(MessageEntity.BOT_COMMAND, 0, len(command) + 1)]
+        for tagged_user in tagged_users:
+            text += ' '
+            entities.append(MessageEntity(MessageEntity.TEXT_MENTION, len(text), len(tagged_user.full_name),
+                                          user=tagged_user))
+            text += tagged_user.full_name
+        message = Message(next(self._update_ids), self.clock.now(), chat, from_user=user, text=text,
+                          entities=entities, bot=self.telegram_bot)
+        context = self._make_context(args=text.split()[1:])
+        self.get_callback(command.lower())(Update(message.message_id, message=message), context)
+
+    def press_button(self, user, action):
+        """Press an inline keyboard button on the group's list message"""
+        chat = Chat(GROUP_CHAT_ID, Chat.SUPERGROUP)
+        message = Message(next(self._update_ids), self.clock.now(), chat, text='', bot=self.telegram_bot)
+        query = CallbackQuery(str(message.message_id), user, chat_instance=str(GROUP_CHAT_ID), message=message,
+                              data=f'{action}:{bot.LIST_MESSAGE}', bot=self.telegram_bot)
+        self.get_callback()(Update(message.message_id, callback_query=query), self._make_context())
+
+    def _make_context(self, args=None, job=None):
+        return SimpleNamespace(bot=self.telegram_bot, job_queue=self.job_queue, args=args or [], job=job, error=None)
+
+    # endregion
+
+    # region RUN
+
+    def run(self, until):
+        """Run all scheduled actions and jobs until the given time"""
+        bot.clock = self.clock
+        bot.register_handlers(self)
+        bot.register_jobs(self.job_queue)
+        bot.matches.clear()
+        self.build_week()
+
+        started = perf_counter()
+        while True:
+            next_event = self.events[0][0] if self.events else None
+            next_job = self.job_queue.next_run()
+            if next_event is None and next_job is None:
+                break
+            moment = min(moment for moment in (next_event, next_job) if moment is not None)
+            if moment > until:
+                break
+            self.clock.set(moment)
+            if next_job is not None and next_job <= moment:
+                for job in self.job_queue.pop_due(moment):
+                    self._measure(f'{job.name} @ {WEEKDAYS[moment.weekday()]} {moment:%H:%M}',
+                                  job.callback, self._make_context(job=job))
+            else:
+                _, _, step, action, args = heapq.heappop(self.events)
+                self._measure(step, action, *args)
+        return perf_counter() - started
+
+    def _measure(self, step, action, *args):
+        """Run an action and attribute its cost to the given step"""
+        if step not in self.steps:
+            self.steps[step] = StepStats(self.clock.now())
+        api_calls = sum(self.telegram_bot.calls.values())
+        failed = False
+        started = perf_counter()
+        try:
+            action(*args)
+        except Exception as err:
+            logger.exception(f"Step {step} failed: {err}")
+            failed = True
+        self.steps[step].add(perf_counter() - started, sum(self.telegram_bot.calls.values()) - api_calls, failed)
+
+    def report(self, wall_seconds, simulated):
+        """Return a textual report of throughput and the time spent at each schedule step"""
+        runs = sum(stats.runs for stats in self.steps.values())
+        lines = [f'Simulated {simulated} in {wall_seconds:.2f} seconds '
+                 f'({simulated.total_seconds() / wall_seconds:,.0f}x real time)',
+                 f'{runs} handler and job runs, {runs / wall_seconds:,.1f} runs per second',
+                 f'Bot API calls: {dict(self.telegram_bot.calls)}',
+                 '',
+                 f'{"step":<45}{"runs":>7}{"errors":>8}{"total ms":>11}{"mean ms":>10}{"max ms":>10}{"API calls":>11}']
+        for step, stats in sorted(self.steps.items(), key=lambda item: item[1].started):
+            lines.append(f'{step:<45}{stats.runs:>7}{stats.errors:>8}{stats.seconds * 1000:>11.1f}'
+                         f'{stats.seconds * 1000 / stats.runs:>10.2f}{stats.max_seconds * 1000:>10.2f}'
+                         f'{stats.api_calls:>11}')
+        return '\n'.join(lines)
+
+    # endregion
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a full match week of the Technion FC bot')
+    parser.add_argument('--players', type=int, default=40, help='number of synthetic group members')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic behavior')
+    parser.add_argument('--days', type=int, default=7, help='number of days to simulate')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    start = ISRAEL_TIMEZONE.localize(datetime(2024, 1, 6, 20, 0))      # a Saturday evening
+    simulated = timedelta(days=args.days)
+    simulator = WeekSimulator(args.players, args.seed, start)
+    wall_seconds = simulator.run(start + simulated)
+    print(simulator.report(wall_seconds, simulated))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import sys
+import json
+import logging
+from threading import Lock
+from queue import SimpleQueue
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Fields handlers attach to their log records (through `extra`), written as top level JSON fields
+CONTEXT_FIELDS = ('command', 'user_id', 'chat_id', 'match_id', 'latency_ms')
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single line JSON objects, with the context fields they carry"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Let through only one in every `rate` debug records of each logger. Records of other levels all pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self._rate = max(rate, 1)
+        self._seen = Counter()
+        self._lock = Lock()         # records are filtered on the threads logging them
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self._rate == 1:
+            return True
+        with self._lock:
+            self._seen[record.name] += 1
+            if self._seen[record.name] % self._rate == 1:
+                return True
+            self.dropped += 1
+            return False
+
+
+class _Enqueue(QueueHandler):
+    """Queue records as they are, leaving all formatting to the listener's thread"""
+
+    def prepare(self, record):
+        if record.exc_info:         # tracebacks can't cross threads, format them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+def parse_levels(levels):
+    """Parse '<logger>=<level>' pairs separated by commas into a dict, e.g. 'telegram=WARNING,psycopg=INFO'"""
+    parsed = {}
+    for pair in filter(None, (pair.strip() for pair in levels.split(','))):
+        name, _, level = pair.partition('=')
+        parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def setup_logging(level='INFO', logger_levels='', json_format=True, debug_sample_rate=1, stream=None):
+    """Route all logging through a queue to a background thread writing to the stream (stderr by default)
+
+    Logging calls only merge the message and queue the record, so handlers never wait on formatting or writing.
+    Return the started listener, to be stopped on shutdown so queued records are written."""
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+    listener = QueueListener(SimpleQueue(), output, respect_handler_level=True)
+
+    enqueue = _Enqueue(listener.queue)
+    enqueue.addFilter(DebugSampler(debug_sample_rate))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(enqueue)
+    root.setLevel(level.upper())
+    for name, logger_level in parse_levels(logger_levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    listener.start()
+    return listener
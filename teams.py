@@ -0,0 +1,215 @@
+import random
+import logging
+from threading import Lock
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('goalkeeper', 'apart', 'together')
+HARD_WEIGHT = 1000          # cost of breaking a hard rule: no number of soft rules outweighs a single hard rule
+SOFT_WEIGHT = 10
+REPEAT_WEIGHT = 1           # cost of two of last match's teammates on the same team again
+RESTARTS = 30               # local searches from random splits, the cheapest split found is kept
+UPSERT_RULE_QUERY = "INSERT INTO TEAM_RULES (user_id, other_id, kind, hard) VALUES (%s, %s, %s, %s) " \
+                    "ON CONFLICT (user_id, other_id) DO UPDATE SET kind = EXCLUDED.kind, hard = EXCLUDED.hard"
+UPSERT_TEAMS_QUERY = "INSERT INTO LAST_TEAMS (user_id, match_id, team) VALUES "
+UPSERT_TEAMS_CONFLICT = " ON CONFLICT (user_id) DO UPDATE SET match_id = EXCLUDED.match_id, team = EXCLUDED.team"
+
+# Result of a split: the teams (lists of the given players), the rules it breaks as (kind, hard, player, other player)
+# quadruplets, and the number of last match's teammate pairs kept together
+Split = namedtuple('Split', ('teams', 'broken', 'repeated'))
+
+
+class TeamRules:
+    """This class keeps the rules teams are split by, and the teams of every player's last match
+
+    Rules are either per player (goalkeepers are kept on different teams) or per pair (never on the same team, or
+    always on the same team), each either hard or soft. A pair's rule is keyed by its lower user id first. Changes are
+    written to TEAM_RULES right away by the database writer."""
+
+    def __init__(self, writer):
+        self._writer = writer
+        self._rules = {}            # (user id, other user id or 0) -> (kind, hard)
+        self._last_teams = {}       # user id -> (match id, team) of the last match the user played
+        self._drafts = {}           # match id -> teams of the latest split of a match not played yet
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._rules)
+
+    def load(self, rules, last_teams):
+        """Load the rules read from TEAM_RULES (replacing all rules) and the teams read from LAST_TEAMS"""
+        with self._lock:
+            self._rules = {(user_id, other_id): (kind, hard) for user_id, other_id, kind, hard in rules}
+            for user_id, match_id, team in last_teams:
+                self._last_teams[user_id] = (match_id, team)
+
+    def patch_rules(self, op, rows):
+        """Apply the rules another bot process set (or cleared), as (user id, other user id, ...) rows"""
+        with self._lock:
+            for user_id, other_id, *rule in rows:
+                if op == 'delete':
+                    self._rules.pop((user_id, other_id), None)
+                else:
+                    self._rules[(user_id, other_id)] = tuple(rule)
+
+    def patch_last_teams(self, op, rows):
+        """Apply the last teams another bot process closed a match with"""
+        with self._lock:
+            for user_id, match_id, team in rows:
+                self._last_teams[user_id] = (match_id, team)
+
+    def set(self, kind, hard, user_id, other_id=0):
+        """Set a goalkeeper's rule, or the rule of a pair of players (replacing the pair's previous rule)"""
+        key = (user_id, other_id) if kind == 'goalkeeper' else tuple(sorted((user_id, other_id)))
+        with self._lock:
+            self._rules[key] = (kind, hard)
+        self._writer.submit('TEAM_RULES', [(UPSERT_RULE_QUERY, (*key, kind, hard))], changed=[(*key, kind, hard)])
+
+    def clear(self, user_id, other_id=0):
+        """Clear a goalkeeper's rule, or the rule of a pair of players. Return whether there was one"""
+        key = (user_id, other_id) if not other_id else tuple(sorted((user_id, other_id)))
+        with self._lock:
+            if self._rules.pop(key, None) is None:
+                return False
+        self._writer.submit('TEAM_RULES', [("DELETE FROM TEAM_RULES WHERE user_id = %s AND other_id = %s", key)],
+                            changed=[key], op='delete')
+        return True
+
+    def rules(self):
+        """Return all rules as (user id, other user id or 0, kind, hard) quadruplets"""
+        with self._lock:
+            return [(*key, kind, hard) for key, (kind, hard) in sorted(self._rules.items())]
+
+    def draft(self, match_id, teams):
+        """Keep the latest split of a match (as lists of user ids), until the match is played"""
+        with self._lock:
+            self._drafts[match_id] = teams
+
+    def close(self, match_id):
+        """Make a played match's latest split its players' last teams"""
+        with self._lock:
+            teams = self._drafts.pop(match_id, None)
+            if not teams:
+                return
+            rows = [(user_id, match_id, team) for team, user_ids in enumerate(teams) for user_id in user_ids]
+            for user_id, _, team in rows:
+                self._last_teams[user_id] = (match_id, team)
+        query = UPSERT_TEAMS_QUERY + ', '.join(['(%s, %s, %s)'] * len(rows)) + UPSERT_TEAMS_CONFLICT
+        self._writer.submit('LAST_TEAMS', [(query, [value for row in rows for value in row])], changed=rows)
+
+    def pair_weights(self, keys):
+        """Return the matrix of costs of every two of the given user ids (or None) being on the same team, and the
+        cost every split starts from: 'together' rules weigh negatively, so their pairs cost only when split
+
+        Goalkeepers are paired as 'apart' with every other goalkeeper, hard only if both their rules are."""
+        size = len(keys)
+        weights = [[0] * size for _ in range(size)]
+        offset = 0
+        with self._lock:
+            for i in range(size):
+                for j in range(i + 1, size):
+                    if keys[i] is None or keys[j] is None:
+                        continue
+                    weight = 0
+                    rule = self._pair_rule(keys[i], keys[j])
+                    if rule is not None:
+                        kind, hard = rule
+                        weight = HARD_WEIGHT if hard else SOFT_WEIGHT
+                        if kind == 'together':
+                            offset += weight
+                            weight = -weight
+                    last_i, last_j = self._last_teams.get(keys[i]), self._last_teams.get(keys[j])
+                    if last_i is not None and last_i == last_j:
+                        weight += REPEAT_WEIGHT
+                    weights[i][j] = weights[j][i] = weight
+        return weights, offset
+
+    def pair_rule(self, user_id, other_id):
+        """Return the (kind, hard) rule two players are split by, or None"""
+        with self._lock:
+            return self._pair_rule(user_id, other_id)
+
+    def _pair_rule(self, user_id, other_id):
+        rule = self._rules.get(tuple(sorted((user_id, other_id))))
+        if rule is not None:
+            return rule
+        goalkeeper, other_goalkeeper = self._rules.get((user_id, 0)), self._rules.get((other_id, 0))
+        if goalkeeper is not None and other_goalkeeper is not None:
+            return 'goalkeeper', goalkeeper[1] and other_goalkeeper[1]
+        return None
+
+    def repeated(self, user_id, other_id):
+        """Check if two players were teammates in the last match they both played"""
+        with self._lock:
+            last = self._last_teams.get(user_id)
+            return last is not None and last == self._last_teams.get(other_id)
+
+
+def split_teams(players, team_count, rules, key, restarts=RESTARTS, rng=random):
+    """Split players into teams of sizes differing by at most one, breaking as few rules as possible
+
+    Every split's cost is the sum of its same team pairs' weights, so swapping two players of different teams changes
+    it by a few of the players' per team weight sums, kept up to date as players move. Each restart descends from a
+    random split by the best swap until no swap helps. Without any rules the first random split is kept as is.
+    `key` returns a player's user id, or None for players without rules (e.g. externals)."""
+    keys = [key(player) for player in players]
+    weights, offset = rules.pair_weights(keys)
+    size = len(players)
+    best, best_cost = None, None
+    for _ in range(max(restarts, 1)):
+        order = list(range(size))
+        rng.shuffle(order)
+        team_of = [0] * size
+        for position, index in enumerate(order):
+            team_of[index] = position % team_count
+        # sums[i][t]: total weight of player i with the players of team t
+        sums = [[0] * team_count for _ in range(size)]
+        for i in range(size):
+            for j in range(size):
+                sums[i][team_of[j]] += weights[i][j]
+        cost = sum(sums[i][team_of[i]] for i in range(size)) // 2 + offset
+
+        while True:
+            best_delta, best_swap = 0, None
+            for i in range(size):
+                for j in range(i + 1, size):
+                    team_i, team_j = team_of[i], team_of[j]
+                    if team_i == team_j:
+                        continue
+                    delta = sums[j][team_i] + sums[i][team_j] - sums[i][team_i] - sums[j][team_j] - 2 * weights[i][j]
+                    if delta < best_delta:
+                        best_delta, best_swap = delta, (i, j)
+            if best_swap is None:
+                break
+            i, j = best_swap
+            team_i, team_j = team_of[i], team_of[j]
+            team_of[i], team_of[j] = team_j, team_i
+            for k in range(size):
+                sums[k][team_i] += weights[k][j] - weights[k][i]
+                sums[k][team_j] += weights[k][i] - weights[k][j]
+            cost += best_delta
+
+        if best_cost is None or cost < best_cost:
+            best, best_cost = team_of, cost
+        if best_cost == 0:
+            break
+
+    teams = [[player for player, team in zip(players, best) if team == index] for index in range(team_count)]
+    return Split(teams, *get_broken_rules(players, keys, best, rules))
+
+
+def get_broken_rules(players, keys, team_of, rules):
+    """Return the rules a split breaks, and the number of last match's teammate pairs it keeps together"""
+    broken, repeated = [], 0
+    for i in range(len(players)):
+        for j in range(i + 1, len(players)):
+            if keys[i] is None or keys[j] is None:
+                continue
+            same_team = team_of[i] == team_of[j]
+            rule = rules.pair_rule(keys[i], keys[j])
+            if rule is not None and same_team != (rule[0] == 'together'):
+                broken.append((rule[0], rule[1], players[i], players[j]))
+            if same_team and rules.repeated(keys[i], keys[j]):
+                repeated += 1
+    return broken, repeated
@@ -0,0 +1,73 @@
+"""Drives the bot's real handlers through the week simulator's stand-ins, for tests of whole commands and buttons
+
+Importing the bot connects to its database and backs the lists up to it, so these tests only run when DATABASE_URL
+points to a disposable database, and are skipped otherwise:
+
+    DATABASE_URL=postgresql://localhost/technionfc_test python -m unittest discover
+"""
+import os
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+needs_database = unittest.skipUnless(os.environ.get('DATABASE_URL'),
+                                     'set DATABASE_URL to a disposable database to run the bot tests')
+
+if os.environ.get('DATABASE_URL'):
+    import simulator        # sets the group chat id before the bot reads its config
+    import bot
+    from telegram import Chat, Message, CallbackQuery, Update
+    from clock import ISRAEL_TIMEZONE
+
+    class RecordingBot(simulator.SimulatedBot):
+        """This object stands in for telegram.Bot, keeping the texts sent, answered and edited"""
+        def __init__(self):
+            super().__init__()
+            self.left = set()           # users who left the group
+            self.failures = {}          # chat id -> error sending it a message raises
+            self.sent = []              # (chat id, text, reply markup) triplets
+            self.answers = []
+            self.edits = []
+
+        def send_message(self, chat_id, text, *args, **kwargs):
+            if chat_id in self.failures:
+                raise self.failures[chat_id]
+            self.sent.append((chat_id, text, kwargs.get('reply_markup')))
+            return super().send_message(chat_id, text, *args, **kwargs)
+
+        def get_chat_member(self, chat_id, user_id, *args, **kwargs):
+            member = super().get_chat_member(chat_id, user_id, *args, **kwargs)
+            return SimpleNamespace(status='left') if user_id in self.left else member
+
+        def answer_callback_query(self, callback_query_id, text=None, *args, **kwargs):
+            self.answers.append(text)
+            return super().answer_callback_query(callback_query_id, *args, **kwargs)
+
+        def edit_message_text(self, text, *args, **kwargs):
+            self.edits.append(text)
+            return super().edit_message_text(text, *args, **kwargs)
+
+    class BotHarness(simulator.WeekSimulator):
+        """This class sends commands and presses buttons as group members, on a simulated Monday matchday"""
+        def __init__(self, players=6):
+            super().__init__(players, seed=0, start=ISRAEL_TIMEZONE.localize(datetime(2024, 1, 8, 10, 0)))
+            self.telegram_bot = RecordingBot()
+            self.telegram_bot.admins.add(self.admin.id)
+            for user in self.users:
+                user.bot = self.telegram_bot
+            bot.clock = self.clock
+            bot.register_handlers(self)
+            bot.matches.clear()
+
+        def press(self, user, data, public=True):
+            """Press an inline keyboard button with the given data on a message of the group or the user's chat"""
+            chat = Chat(simulator.GROUP_CHAT_ID, Chat.SUPERGROUP) if public else Chat(user.id, Chat.PRIVATE)
+            message = Message(next(self._update_ids), self.clock.now(), chat, text='', bot=self.telegram_bot)
+            query = CallbackQuery(str(message.message_id), user, chat_instance=str(chat.id), message=message,
+                                  data=data, bot=self.telegram_bot)
+            self.get_callback()(Update(message.message_id, callback_query=query), self._make_context())
+
+        def listed(self, match=None):
+            """Return the users on the list of a match (the earliest open one by default)"""
+            match = match or bot.matches.next_open(self.clock.now().date())
+            return [player.user for player in match.playing] if match is not None else []
@@ -0,0 +1,99 @@
+import unittest
+from types import SimpleNamespace
+
+from announcements import AnnouncementBatcher, merge, MAX_MESSAGE_LENGTH, SEPARATOR
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def run_once(self, callback, when, context=None, name=None):
+        self.jobs.append((callback, context))
+
+    def run_all(self, bot):
+        jobs, self.jobs = self.jobs, []
+        for callback, context in jobs:
+            callback(SimpleNamespace(bot=bot, job=SimpleNamespace(context=context)))
+
+
+class MergeTest(unittest.TestCase):
+
+    def test_short_texts_are_merged_into_one_message(self):
+        self.assertEqual(merge([r'Dan was removed\.', r'Ron made the list\!']),
+                         [rf'Dan was removed\.{SEPARATOR}Ron made the list\!'])
+
+    def test_texts_are_kept_whole_across_messages(self):
+        texts = ['a' * 3000, 'b' * 3000, 'c' * 10]
+        self.assertEqual(merge(texts), ['a' * 3000, 'b' * 3000 + SEPARATOR + 'c' * 10])
+
+    def test_long_texts_are_split_at_line_breaks(self):
+        line = r'Dan Cohen \- please approve\!'
+        text = '\n'.join([line] * 400)
+        messages = merge([text])
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+            self.assertEqual(set(message.split('\n')), {line})
+        self.assertEqual(sum(message.count('\n') + 1 for message in messages), 400)
+
+    def test_long_lines_are_split_at_spaces(self):
+        text = ' '.join([r'approve\!'] * 1000)
+        messages = merge([text])
+        self.assertEqual(''.join(messages), text)
+        for message in messages:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+            self.assertTrue(message.endswith(' ') or message == messages[-1])
+
+    def test_escapes_are_never_cut(self):
+        text = r'\.' * 3000
+        messages = merge([text])
+        self.assertEqual(''.join(messages), text)
+        for message in messages:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH)
+            self.assertEqual(len(message) % 2, 0)
+
+
+class AnnouncementBatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bot = FakeBot()
+        self.job_queue = FakeJobQueue()
+        self.context = SimpleNamespace(bot=self.bot, job_queue=self.job_queue)
+
+    def test_announcements_within_the_window_are_sent_together(self):
+        batcher = AnnouncementBatcher(10)
+        batcher.announce(self.context, 1, 'Dan was removed.')
+        batcher.announce(self.context, 1, r'Ron made the list\!', markdown=True)
+        batcher.announce(self.context, 2, 'Other chat')
+        self.assertEqual(self.bot.sent, [])
+        self.assertEqual(len(self.job_queue.jobs), 2)
+        self.job_queue.run_all(self.bot)
+        self.assertEqual(self.bot.sent, [(1, rf'Dan was removed\.{SEPARATOR}Ron made the list\!'), (2, 'Other chat')])
+        self.assertEqual(batcher.saved, 1)
+
+    def test_urgent_announcements_are_sent_right_away(self):
+        batcher = AnnouncementBatcher(10)
+        batcher.announce(self.context, 1, 'Now!', urgent=True)
+        self.assertEqual(self.bot.sent, [(1, r'Now\!')])
+        self.assertEqual(self.job_queue.jobs, [])
+
+    def test_flush_sends_waiting_announcements(self):
+        batcher = AnnouncementBatcher(10)
+        batcher.announce(self.context, 1, 'Bye')
+        batcher.flush(self.bot)
+        self.assertEqual(self.bot.sent, [(1, 'Bye')])
+        self.job_queue.run_all(self.bot)
+        self.assertEqual(self.bot.sent, [(1, 'Bye')])
+
+
+if __name__ == '__main__':
+    unittest.main()
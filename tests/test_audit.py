@@ -0,0 +1,80 @@
+import unittest
+
+from audit import AuditLog, fetch_page, PAGE_SIZE
+
+
+class FakeConnection:
+    """Records the queries run on it, answering them with no rows"""
+
+    def __init__(self):
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return []
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeWriter:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, table, statements):
+        self.submitted.append((table, statements))
+
+
+class FetchPageTest(unittest.TestCase):
+
+    def test_first_page_of_all_actors(self):
+        connection = FakeConnection()
+        fetch_page(connection)
+        ((query, params),) = connection.queries
+        self.assertNotIn('WHERE', query)
+        self.assertTrue(query.endswith('FROM AUDIT ORDER BY id DESC LIMIT %s'))
+        self.assertEqual(params, [PAGE_SIZE])
+        self.assertEqual(connection.commits, 1)
+
+    def test_older_page_of_one_actor(self):
+        connection = FakeConnection()
+        fetch_page(connection, actor_id=7, before_id=40, limit=5)
+        ((query, params),) = connection.queries
+        self.assertIn('WHERE actor_id = %s AND id < %s ORDER BY id DESC LIMIT %s', query)
+        self.assertEqual(params, [7, 40, 5])
+
+
+class AuditLogTest(unittest.TestCase):
+
+    def test_entries_are_written_in_one_insert_per_batch(self):
+        writer = FakeWriter()
+        audit_log = AuditLog(writer, batch_size=3)
+        audit_log.record(None, 'shuffle')
+        audit_log.record(None, 'remove', target='Dan')
+        self.assertEqual(writer.submitted, [])
+        audit_log.record(None, 'approve', match_id='thu22-11')
+        ((table, [(query, params)]),) = writer.submitted
+        self.assertEqual(table, 'AUDIT')
+        self.assertEqual(query.count('(%s'), 3)
+        self.assertEqual(len(params), 3 * 7)
+
+    def test_flush_writes_nothing_when_empty(self):
+        writer = FakeWriter()
+        AuditLog(writer).flush()
+        self.assertEqual(writer.submitted, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
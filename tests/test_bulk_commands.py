@@ -0,0 +1,74 @@
+import unittest
+
+from tests.bot_harness import needs_database
+
+try:
+    from tests.bot_harness import BotHarness, bot
+except ImportError:         # no database to run the bot against
+    pass
+
+
+@needs_database
+class BulkCommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.harness = BotHarness(players=20)
+        self.admin = self.harness.admin
+        self.players = self.harness.users[1:]
+        self.harness.send_command(self.players[0], 'create', False)
+
+    def last_reply(self):
+        return self.harness.telegram_bot.sent[-1][1]
+
+    def test_add_users_appends_everyone_tagged(self):
+        self.harness.send_command(self.admin, 'addUsers', True, *self.players[1:4])
+        self.assertEqual(self.harness.listed(), self.players[:4])
+
+    def test_one_problem_adds_no_one(self):
+        self.harness.send_command(self.players[1], 'add', False)
+        self.harness.send_command(self.admin, 'addUsers', True, self.players[1], self.players[2], self.players[2])
+        self.assertEqual(self.harness.listed(), self.players[:2])
+        reply = self.last_reply()
+        self.assertIn('did not add anyone', reply)
+        self.assertIn(f'{self.players[1].full_name} is already on the playing list', reply)
+        self.assertIn(f'{self.players[2].full_name} was tagged more than once', reply)
+
+    def test_remove_users_removes_everyone_tagged(self):
+        self.harness.send_command(self.admin, 'addUsers', True, *self.players[1:4])
+        self.harness.send_command(self.admin, 'removeUsers', True, self.players[1], self.players[3])
+        self.assertEqual(self.harness.listed(), [self.players[0], self.players[2]])
+        self.assertIn('were removed from the playing list', self.last_reply())
+
+    def test_remove_users_rejects_unlisted_users(self):
+        self.harness.send_command(self.admin, 'removeUsers', True, self.players[0], self.players[1])
+        self.assertEqual(self.harness.listed(), self.players[:1])
+        self.assertIn(f'{self.players[1].full_name} is not listed', self.last_reply())
+
+    def test_approve_and_unapprove_users(self):
+        self.harness.send_command(self.admin, 'addUsers', True, *self.players[1:3])
+        self.harness.send_command(self.admin, 'approveUsers', True, *self.players[1:3])
+        match = bot.matches.next_open(self.harness.clock.now().date())
+        self.assertEqual([player.approved for player in match.playing], [False, True, True])
+        self.harness.send_command(self.admin, 'unapproveUsers', True, self.players[2])
+        self.assertEqual([player.approved for player in match.playing], [False, True, False])
+
+    def test_reorder_waiting_moves_the_tagged_to_the_front_of_the_waiting_list(self):
+        self.harness.send_command(self.admin, 'addUsers', True, *self.players[1:19])
+        waiting = self.players[bot.LIST_MAX_SIZE:19]
+        self.harness.send_command(self.admin, 'reorderWaiting', True, waiting[3], waiting[1])
+        self.assertEqual(self.harness.listed()[:bot.LIST_MAX_SIZE], self.players[:bot.LIST_MAX_SIZE])
+        self.assertEqual(self.harness.listed()[bot.LIST_MAX_SIZE:], [waiting[3], waiting[1], waiting[0], waiting[2]])
+
+    def test_reorder_waiting_rejects_players_on_the_playing_list(self):
+        self.harness.send_command(self.admin, 'addUsers', True, *self.players[1:17])
+        self.harness.send_command(self.admin, 'reorderWaiting', True, self.players[16], self.players[1])
+        self.assertEqual(self.harness.listed(), self.players[:17])
+        self.assertIn(f'{self.players[1].full_name} is not on the waiting list', self.last_reply())
+
+    def test_bulk_commands_are_for_admins_only(self):
+        self.harness.send_command(self.players[0], 'addUsers', True, self.players[1])
+        self.assertEqual(self.harness.listed(), self.players[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from tests.bot_harness import needs_database
+
+try:
+    from tests.bot_harness import BotHarness, bot
+except ImportError:         # no database to run the bot against
+    pass
+
+
+@needs_database
+class RosterButtonsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.harness = BotHarness()
+        self.creator, self.player, self.other = self.harness.users[1:4]
+        self.harness.send_command(self.creator, 'create', False)
+        self.harness.send_command(self.player, 'add', False)
+        self.match = bot.matches.next_open(self.harness.clock.now().date())
+
+    def data(self, action, origin=None):
+        return f'{action}:{origin or bot.LIST_MESSAGE}:{self.match.match_id}'
+
+    def test_approve_edits_the_list_message(self):
+        self.harness.press(self.player, self.data('approve'))
+        self.assertTrue(self.match.playing[1].approved)
+        self.assertIn('approved', self.harness.telegram_bot.answers[-1])
+        self.assertEqual(len(self.harness.telegram_bot.edits), 1)
+
+    def test_ball_toggles(self):
+        self.harness.press(self.player, self.data('ball', bot.REMINDER_MESSAGE))
+        self.assertTrue(self.match.playing[1].match_ball)
+        self.harness.press(self.player, self.data('ball', bot.REMINDER_MESSAGE))
+        self.assertFalse(self.match.playing[1].match_ball)
+        self.assertEqual(self.harness.telegram_bot.edits, [])        # reminders aren't edited
+
+    def test_removal_takes_effect_on_confirmation_only(self):
+        self.harness.press(self.player, self.data('remove'))
+        self.assertIn(self.player, self.harness.listed())
+        _, text, keyboard = self.harness.telegram_bot.sent[-1]
+        self.assertIn('are you sure', text)
+        confirm, cancel = (button.callback_data for button in keyboard.inline_keyboard[0])
+        self.assertEqual(confirm, f'remove:{bot.CONFIRM_REMOVAL}:{self.match.match_id}:{self.player.id}')
+
+        self.harness.press(self.other, confirm)
+        self.assertIn('meant for another player', self.harness.telegram_bot.answers[-1])
+        self.harness.press(self.player, cancel)
+        self.assertIn(self.player, self.harness.listed())
+
+        self.harness.press(self.player, confirm)
+        self.assertNotIn(self.player, self.harness.listed())
+        self.assertIn('removed you', self.harness.telegram_bot.edits[-1])
+
+    def test_presses_of_users_who_left_the_group_are_rejected(self):
+        self.harness.telegram_bot.left.add(self.player.id)
+        self.harness.press(self.player, self.data('approve'), public=False)
+        self.assertFalse(self.match.playing[1].approved)
+        self.assertIn('not a part of the Technion FC group', self.harness.telegram_bot.answers[-1])
+
+    def test_buttons_of_closed_matches_are_answered(self):
+        self.harness.press(self.player, 'approve:list:thu1-2')
+        self.assertIn('This list is closed', self.harness.telegram_bot.answers[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import time
+import unittest
+from threading import Event
+
+from psycopg import OperationalError, DataError
+
+from db_writer import DatabaseWriter
+from tests.bot_harness import needs_database
+
+try:
+    from tests.bot_harness import BotHarness, bot
+except ImportError:         # no database to run the bot against
+    pass
+
+
+class FakeDatabase:
+    """Hands out connections running the statements of a write by recording them, after `gate` is set"""
+
+    def __init__(self):
+        self.executed = []
+        self.commits = 0
+        self.gate = Event()
+        self.gate.set()
+
+        self.errors = []                # errors raised by the next statements run
+        self.connections = 0
+        self.rollbacks = 0
+
+    def new_connection(self):
+        self.connections += 1
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self._database = database
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params):
+        self._database.gate.wait()
+        if self._database.errors:
+            raise self._database.errors.pop(0)
+        self._database.executed.append((query, params))
+
+    def commit(self):
+        self._database.commits += 1
+
+    def rollback(self):
+        self._database.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class DatabaseWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.database = FakeDatabase()
+        self.writer = DatabaseWriter(self.database, retry_delay=0)
+
+    def tearDown(self):
+        self.writer.stop(timeout=5)
+
+    def test_writes_run_in_submission_order(self):
+        for index in range(20):
+            self.writer.submit('PLAYING' if index % 2 else 'INVITED', [("INSERT", (index,))])
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual([params for _, params in self.database.executed], [(index,) for index in range(20)])
+        self.assertEqual(self.writer.written, {'PLAYING': 10, 'INVITED': 10})
+        self.assertEqual(self.database.commits, 20)
+
+    def test_connection_errors_are_retried_on_a_new_connection(self):
+        self.database.errors = [OperationalError('server closed the connection')]
+        with self.assertLogs('db_writer', 'ERROR'):
+            self.writer.submit('PLAYING', [("DELETE FROM PLAYING", ())])
+            self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(self.database.executed, [("DELETE FROM PLAYING", ())])
+        self.assertEqual(self.database.connections, 2)
+        self.assertEqual((self.writer.errors['PLAYING'], self.writer.dropped['PLAYING']), (1, 0))
+
+    def test_failing_writes_are_rolled_back_and_dropped(self):
+        self.database.errors = [DataError('invalid input')]
+        with self.assertLogs('db_writer', 'ERROR'):
+            self.writer.submit('PLAYING', [("INSERT", (1,))])
+            self.writer.submit('PLAYING', [("INSERT", (2,))])
+            self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(self.database.executed, [("INSERT", (2,))])
+        self.assertEqual(self.database.rollbacks, 1)
+        self.assertEqual((self.writer.dropped['PLAYING'], self.writer.written['PLAYING']), (1, 1))
+
+
+class DatabaseWriterStopTest(unittest.TestCase):
+
+    def test_stop_flushes_pending_writes(self):
+        database = FakeDatabase()
+        writer = DatabaseWriter(database)
+        writer.submit('PLAYING', [("DELETE FROM PLAYING", ())])
+        self.assertTrue(writer.stop(timeout=5))
+        self.assertEqual(database.executed, [("DELETE FROM PLAYING", ())])
+        self.assertEqual(writer.written['PLAYING'], 1)
+
+    def test_stop_gives_up_on_a_stuck_writer_with_a_full_queue(self):
+        database = FakeDatabase()
+        database.gate.clear()           # the database hangs
+        writer = DatabaseWriter(database, max_queue_size=2)
+        for _ in range(3):              # one being written, two filling the queue
+            writer.submit('PLAYING', [("DELETE FROM PLAYING", ())], timeout=0.1)
+        started = time.monotonic()
+        with self.assertLogs('db_writer', 'ERROR'):
+            self.assertFalse(writer.stop(timeout=0.3))
+        self.assertLess(time.monotonic() - started, 1)
+        database.gate.set()
+
+
+@needs_database
+class MatchBackupTest(unittest.TestCase):
+
+    def backed_up(self, match):
+        bot.db_writer.flush(timeout=5)
+        with bot.sql_database.new_connection() as connection, connection.cursor() as cur:
+            cur.execute("SELECT user_id FROM PLAYING WHERE match_id = %s ORDER BY position", (match.match_id,))
+            return [user_id for user_id, in cur.fetchall()]
+
+    def test_saving_and_clearing_a_match_replace_its_rows_in_order(self):
+        harness = BotHarness()
+        creator, player = harness.users[1:3]
+        harness.send_command(creator, 'create', False)
+        harness.send_command(player, 'add', False)
+        match = bot.matches.next_open(harness.clock.now().date())
+        bot.save_match(match)
+        self.assertEqual(self.backed_up(match), [creator.id, player.id])
+        bot.clear_database_tables(match)
+        bot.save_match(match)
+        bot.clear_database_tables(match)
+        self.assertEqual(self.backed_up(match), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import unittest
+from threading import Lock
+
+from telegram.error import RetryAfter, Unauthorized, NetworkError
+
+from direct_messages import DirectMessageFanOut, RateLimiter
+from tests.bot_harness import needs_database
+
+try:
+    from tests.bot_harness import BotHarness, bot
+except ImportError:         # no database to run the bot against
+    pass
+
+
+class FakeBot:
+    """Fails the first sends to some chats with the given errors, and records the messages sent"""
+
+    def __init__(self, failures=None):
+        self.failures = {chat_id: list(errors) for chat_id, errors in (failures or {}).items()}
+        self.sent = []
+        self._lock = Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self._lock:
+            errors = self.failures.get(chat_id)
+            if errors:
+                raise errors.pop(0)
+            self.sent.append((chat_id, text, kwargs))
+
+
+class DirectMessageFanOutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fan_out = DirectMessageFanOut(max_workers=4, rate=1000)
+
+    def test_sends_to_every_chat(self):
+        bot = FakeBot()
+        receipts = self.fan_out.send_all(bot, [1, 2, 3], 'Approve!', reply_markup='keyboard')
+        self.assertEqual(sorted(bot.sent), [(chat_id, 'Approve!', {'reply_markup': 'keyboard'}) for chat_id in (1, 2, 3)])
+        self.assertTrue(all(receipt.delivered and receipt.attempts == 1 for receipt in receipts.values()))
+
+    def test_users_who_never_started_the_bot_are_not_retried(self):
+        bot = FakeBot({2: [Unauthorized('bot was blocked by the user'), Unauthorized('again')]})
+        receipts = self.fan_out.send_all(bot, [1, 2], 'Approve!')
+        self.assertTrue(receipts[1].delivered)
+        self.assertEqual((receipts[2].delivered, receipts[2].attempts), (False, 1))
+        self.assertIn('blocked', receipts[2].error)
+
+    def test_retries_network_errors_and_flood_control(self):
+        bot = FakeBot({1: [NetworkError('timed out')], 2: [RetryAfter(0)]})
+        receipts = self.fan_out.send_all(bot, [1, 2], 'Approve!')
+        self.assertEqual([(receipt.delivered, receipt.attempts) for receipt in receipts.values()], [(True, 2)] * 2)
+
+    def test_gives_up_after_max_attempts(self):
+        bot = FakeBot({1: [NetworkError('timed out')] * 3})
+        receipt = self.fan_out.send_all(bot, [1], 'Approve!')[1]
+        self.assertEqual((receipt.delivered, receipt.attempts), (False, 3))
+
+    def test_no_chats_send_nothing(self):
+        self.assertEqual(self.fan_out.send_all(FakeBot(), [], 'Approve!'), {})
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_spaces_out_calls(self):
+        limiter = RateLimiter(rate=50)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 50 - 0.01)
+
+
+@needs_database
+class DirectRemindersTest(unittest.TestCase):
+
+    def test_players_not_reached_privately_are_mentioned_in_the_group(self):
+        harness = BotHarness()
+        reached, blocked = harness.users[1:3]
+        harness.send_command(reached, 'create', False)
+        harness.send_command(blocked, 'add', False)
+        match = bot.matches.next_open(harness.clock.now().date())
+        match.playing.append(bot.TechnionFCPlayer(bot.User(bot.FAKE_USER_ID, '', False, username='guest')))
+        harness.telegram_bot.failures = {blocked.id: Unauthorized('bot was blocked by the user')}
+        harness.telegram_bot.sent.clear()
+        with bot.active_match(match):
+            mentioned = bot.send_direct_reminders(harness._make_context(), list(match.playing), 'Approve!')
+        self.assertEqual([player.user.id for player in mentioned], [blocked.id, bot.FAKE_USER_ID])
+        (chat_id, text, keyboard), = harness.telegram_bot.sent
+        self.assertEqual((chat_id, text), (reached.id, 'Approve!'))
+        self.assertEqual(keyboard.inline_keyboard[0][0].callback_data,
+                         f'approve:{bot.REMINDER_MESSAGE}:{match.match_id}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import re
+import csv
+import gzip
+import unittest
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+from export import EXPORT_TABLES, export_table
+from postgres import MIGRATIONS
+
+
+class FakeConnection:
+    """Serves a single table's rows through a named cursor"""
+
+    def __init__(self, columns, rows):
+        self.description = [SimpleNamespace(name=column) for column in columns]
+        self._rows = list(rows)
+        self.commits = 0
+
+    def cursor(self, name=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query):
+        pass
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+    def commit(self):
+        self.commits += 1
+
+
+class ExportTest(unittest.TestCase):
+
+    def test_every_table_but_the_shared_roster_is_exported(self):
+        created = {match.group(1) for _, _, statements in MIGRATIONS for statement in statements
+                   for match in [re.match(r'CREATE TABLE (?:IF NOT EXISTS )?(\w+)', statement)] if match}
+        self.assertEqual(created - set(EXPORT_TABLES), {'ROSTER_STATE'})
+        self.assertLessEqual(set(EXPORT_TABLES), created)
+
+    def test_csv_export_streams_all_batches(self):
+        rows = [(user_id, user_id + 1, 'apart', True) for user_id in range(7)]
+        connection = FakeConnection(('user_id', 'other_id', 'kind', 'hard'), rows)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'team_rules.csv.gz')
+            self.assertEqual(export_table(connection, 'TEAM_RULES', path, batch_size=3), 7)
+            with gzip.open(path, 'rt', newline='') as file:
+                exported = list(csv.reader(file))
+        self.assertEqual(exported[0], ['user_id', 'other_id', 'kind', 'hard'])
+        self.assertEqual(exported[1:], [[str(value) for value in row] for row in rows])
+        self.assertEqual(connection.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
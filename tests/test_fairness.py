@@ -0,0 +1,78 @@
+import random
+import unittest
+
+from fairness import IndexedHeap
+
+
+class IndexedHeapTest(unittest.TestCase):
+
+    def assert_consistent(self, heap):
+        """Check the heap property, and that every key's tracked position is where the key is"""
+        entries = heap._heap
+        for position in range(1, len(entries)):
+            self.assertLessEqual(entries[(position - 1) // 2][0], entries[position][0])
+        self.assertEqual(heap._positions, {key: position for position, (_, key) in enumerate(entries)})
+
+    def drain(self, heap):
+        keys = []
+        while heap:
+            keys.append(heap.pop())
+        return keys
+
+    def test_pops_keys_by_priority(self):
+        heap = IndexedHeap([('c', 3), ('a', 1), ('d', 4), ('b', 2)])
+        self.assert_consistent(heap)
+        self.assertEqual(self.drain(heap), ['a', 'b', 'c', 'd'])
+        self.assertIsNone(heap.pop())
+
+    def test_updates_priorities_both_ways(self):
+        heap = IndexedHeap((key, priority) for priority, key in enumerate('abcdefg'))
+        heap.update('g', -1)
+        heap.update('a', 10)
+        heap.push('d', -2)          # pushing a key already in the heap updates it
+        self.assert_consistent(heap)
+        self.assertEqual(self.drain(heap), ['d', 'g', 'b', 'c', 'e', 'f', 'a'])
+
+    def test_removes_keys_anywhere(self):
+        heap = IndexedHeap((key, priority) for priority, key in enumerate('abcdefg'))
+        heap.remove('a')
+        heap.remove('e')
+        heap.remove('g')            # the last entry
+        heap.remove('missing')
+        self.assert_consistent(heap)
+        self.assertNotIn('e', heap)
+        self.assertEqual(self.drain(heap), ['b', 'c', 'd', 'f'])
+
+    def test_removing_moves_the_last_entry_up_when_needed(self):
+        heap = IndexedHeap([('a', 0), ('b', 10), ('c', 1), ('d', 11), ('e', 12), ('f', 2), ('g', 3)])
+        heap.remove('d')            # replaced by 'g', which is smaller than its new parent 'b'
+        self.assert_consistent(heap)
+        self.assertEqual(self.drain(heap), ['a', 'c', 'f', 'g', 'b', 'e'])
+
+    def test_tracks_positions_through_random_operations(self):
+        rng = random.Random(7)
+        heap, expected = IndexedHeap(), {}
+        for _ in range(2000):
+            key = rng.randrange(50)
+            operation = rng.random()
+            if operation < 0.4:
+                priority = rng.randrange(100)
+                heap.push(key, (priority, key))
+                expected[key] = (priority, key)
+            elif operation < 0.6 and key in expected:
+                priority = rng.randrange(100)
+                heap.update(key, (priority, key))
+                expected[key] = (priority, key)
+            elif operation < 0.8:
+                heap.remove(key)
+                expected.pop(key, None)
+            else:
+                popped = heap.pop()
+                self.assertEqual(popped, min(expected, key=expected.get) if expected else None)
+                expected.pop(popped, None)
+            self.assert_consistent(heap)
+            self.assertEqual(len(heap), len(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
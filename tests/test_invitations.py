@@ -0,0 +1,62 @@
+import unittest
+from datetime import datetime, timedelta
+
+from clock import ISRAEL_TIMEZONE
+from invitations import InvitationRegistry
+
+NOW = ISRAEL_TIMEZONE.localize(datetime(2024, 1, 8, 12, 0))
+
+
+class InvitationRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = InvitationRegistry()
+
+    def test_expires_overdue_invitations_oldest_first(self):
+        self.registry.add('late', expires_at=NOW + timedelta(hours=2))
+        self.registry.add('later', expires_at=NOW + timedelta(hours=3))
+        self.registry.add('early', expires_at=NOW + timedelta(hours=1))
+        self.registry.add('never')
+        expired = self.registry.expire(NOW + timedelta(hours=2))
+        self.assertEqual([invitation.key for invitation in expired], ['early', 'late'])
+        self.assertEqual(list(self.registry), ['later', 'never'])
+        self.assertEqual(self.registry.expire(NOW + timedelta(days=30))[0].key, 'later')
+        self.assertEqual(list(self.registry), ['never'])
+
+    def test_popped_invitations_do_not_expire(self):
+        self.registry.add('popped', expires_at=NOW)
+        self.assertEqual(self.registry.pop('popped').key, 'popped')
+        self.assertIsNone(self.registry.pop('popped'))
+        self.assertEqual(self.registry.expire(NOW + timedelta(hours=1)), [])
+        self.assertEqual(len(self.registry), 0)
+
+    def test_an_invitation_added_again_after_pop_expires_at_its_new_time(self):
+        self.registry.add('user', expires_at=NOW)
+        self.registry.pop('user')
+        again = self.registry.add('user', expires_at=NOW + timedelta(hours=2))
+        self.assertEqual(self.registry.expire(NOW + timedelta(hours=1)), [])
+        self.assertIn('user', self.registry)
+        self.assertEqual(self.registry.expire(NOW + timedelta(hours=2)), [again])
+
+    def test_replaced_invitations_expire_at_their_new_time(self):
+        self.registry.add('user', expires_at=NOW)
+        replacement = self.registry.add('user', expires_at=NOW + timedelta(hours=2))
+        self.assertEqual(self.registry.expire(NOW + timedelta(hours=1)), [])
+        self.assertIs(self.registry.get('user'), replacement)
+        replacement = self.registry.add('user')
+        self.assertEqual(self.registry.expire(NOW + timedelta(hours=3)), [])
+        self.assertIs(self.registry.get('user'), replacement)
+
+    def test_restores_its_list_representation(self):
+        player = object()
+        self.registry.add('reserved', player, NOW + timedelta(hours=1))
+        self.registry.add(12345)
+        restored = InvitationRegistry()
+        restored.restore(self.registry.to_list(), {'reserved': player})
+        self.assertEqual(restored.to_list(), self.registry.to_list())
+        self.assertIs(restored.get('reserved').player, player)
+        self.assertEqual([invitation.key for invitation in restored.expire(NOW + timedelta(hours=1))], ['reserved'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from datetime import date
+from types import SimpleNamespace
+
+from matches import Match, MatchBook, match_key, next_weekday, parse_match_date
+
+MONDAY = date(2024, 1, 8)
+
+
+def make_player(user_id, username=None):
+    return SimpleNamespace(user=SimpleNamespace(id=user_id, username=username))
+
+
+class MatchBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.book = MatchBook()
+        self.monday = Match(MONDAY)
+        self.thursday = Match(date(2024, 1, 11))
+        self.next_thursday = Match(date(2024, 1, 18))
+        for match in (self.next_thursday, self.monday, self.thursday):
+            self.book.add(match)
+
+    def test_match_ids(self):
+        self.assertEqual(self.thursday.match_id, 'thu11-1')
+        self.assertEqual(self.book.new_pitch(date(2024, 1, 11)).match_id, 'thu11-1-2')
+        self.assertEqual(self.book.new_pitch(date(2024, 1, 11)).match_id, 'thu11-1-3')
+        self.assertEqual([match.pitch for match in self.book.on(date(2024, 1, 11))], [1, 2, 3])
+
+    def test_same_weekday_and_day_a_month_apart_have_different_ids(self):
+        april = Match(date(2024, 4, 11))        # also a Thursday the 11th
+        self.book.add(april)
+        self.assertEqual(april.match_id, 'thu11-4')
+        self.assertIs(self.book.find('#thu11-4', MONDAY), april)
+        self.assertIs(self.book.find('#thu11-1', MONDAY), self.thursday)
+        self.assertIs(self.book.find('#thu11', MONDAY), self.thursday)
+        self.assertIs(self.book.find('#thu11', date(2024, 1, 12)), april)
+
+    def test_iterates_in_kickoff_order(self):
+        self.assertEqual(list(self.book), [self.monday, self.thursday, self.next_thursday])
+        self.assertIs(self.book.next_open(date(2024, 1, 9)), self.thursday)
+        self.assertIsNone(self.book.next_open(date(2024, 1, 19)))
+
+    def test_finds_matches_by_id(self):
+        self.assertIs(self.book.find('#thu18-1', MONDAY), self.next_thursday)
+        self.assertIs(self.book.find('THU11', MONDAY), self.thursday)
+        self.assertIs(self.book.get('mon8-1'), self.monday)
+        self.assertIsNone(self.book.find('#fri12', MONDAY))
+
+    def test_finds_the_earliest_upcoming_match_by_prefix(self):
+        self.assertIs(self.book.find('#thu', MONDAY), self.thursday)
+        self.assertIs(self.book.find('#thu', date(2024, 1, 12)), self.next_thursday)
+        self.assertIs(self.book.find('#thu1', date(2024, 1, 12)), self.next_thursday)
+        self.assertIsNone(self.book.find('#mon', date(2024, 1, 9)))
+
+    def test_indexes_players_by_match(self):
+        self.thursday.playing.extend([make_player(5), make_player(-1, 'guest')])
+        self.next_thursday.playing.append(make_player(5))
+        self.book.reindex(self.thursday)
+        self.book.reindex(self.next_thursday)
+        self.assertEqual(self.book.of_player(5), [self.thursday, self.next_thursday])
+        self.assertEqual(self.book.of_player('@guest'), [self.thursday])
+
+        self.thursday.playing.popleft()
+        self.book.reindex(self.thursday)
+        self.assertEqual(self.book.of_player(5), [self.next_thursday])
+        self.book.remove(self.next_thursday)
+        self.assertEqual(self.book.of_player(5), [])
+        self.assertIsNone(self.book.find('#thu18', MONDAY))
+        self.assertEqual(self.book.on(date(2024, 1, 18)), [])
+
+    def test_match_keys(self):
+        self.assertEqual(match_key(make_player(5, 'dani').user), 5)
+        self.assertEqual(match_key(make_player(-1, 'guest').user), '@guest')
+
+
+class MatchDateTest(unittest.TestCase):
+
+    def test_next_weekday_includes_today(self):
+        self.assertEqual(next_weekday(MONDAY, 0), MONDAY)
+        self.assertEqual(next_weekday(MONDAY, 3), date(2024, 1, 11))
+        self.assertEqual(next_weekday(date(2024, 1, 12), 0), date(2024, 1, 15))
+
+    def test_parses_weekdays_and_dates(self):
+        self.assertEqual(parse_match_date('Thursday', MONDAY), date(2024, 1, 11))
+        self.assertEqual(parse_match_date('mon', MONDAY), MONDAY)
+        self.assertEqual(parse_match_date('15/1', MONDAY), date(2024, 1, 15))
+        self.assertEqual(parse_match_date('1/1', MONDAY), date(2025, 1, 1))
+        self.assertIsNone(parse_match_date('31/2', MONDAY))
+        self.assertIsNone(parse_match_date('soon', MONDAY))
+
+
+if __name__ == '__main__':
+    unittest.main()
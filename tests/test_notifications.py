@@ -0,0 +1,105 @@
+import os
+import json
+import unittest
+
+from notifications import ChangeFeed, MAX_PAYLOAD_SIZE
+from tests.bot_harness import needs_database
+
+
+class ChangeFeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.feed = ChangeFeed(True)
+        self.other = ChangeFeed(True)       # the feed of another bot process
+        self.changes = []
+        self.other.subscribe('PLAYERS', lambda op, rows: self.changes.append((op, rows)))
+
+    def deliver(self, statements):
+        for _, (channel, payload) in statements:
+            self.assertEqual(channel, self.other.channel)
+            self.other.dispatch(payload)
+
+    def test_other_processes_are_patched_with_the_changed_rows(self):
+        self.deliver(self.feed.statements('PLAYERS', [[1, 'Dani', 'Levi', None]]))
+        self.deliver(self.feed.statements('PLAYERS', [[1]], op='delete'))
+        self.assertEqual(self.changes, [('upsert', [[1, 'Dani', 'Levi', None]]), ('delete', [[1]])])
+        self.assertEqual(self.other.received['PLAYERS'], 2)
+
+    def test_own_notifications_are_skipped(self):
+        for _, (_, payload) in self.other.statements('PLAYERS', [[1, 'Dani', 'Levi', None]]):
+            self.other.dispatch(payload)
+        self.assertEqual(self.changes, [])
+        self.assertEqual(self.other.received, {})
+
+    def test_unsubscribed_tables_are_only_counted(self):
+        self.deliver(self.feed.statements('LAST_TEAMS', [['mon8-1', 2]]))
+        self.assertEqual(self.changes, [])
+        self.assertEqual(self.other.received['LAST_TEAMS'], 1)
+
+    def test_large_changes_are_split_between_payloads_within_the_limit(self):
+        rows = [[user_id, 'x' * 100] for user_id in range(300)]
+        statements = self.feed.statements('PLAYERS', rows)
+        self.assertGreater(len(statements), 1)
+        for _, (_, payload) in statements:
+            self.assertLess(len(payload.encode()), MAX_PAYLOAD_SIZE)
+        self.deliver(statements)
+        self.assertEqual([row for _, chunk in self.changes for row in chunk], rows)
+
+    def test_disabled_feeds_notify_of_nothing(self):
+        self.assertEqual(ChangeFeed(False).statements('PLAYERS', [[1]]), [])
+        self.assertEqual(self.feed.statements('PLAYERS', []), [])
+
+    def test_a_failing_subscriber_is_logged(self):
+        self.other.subscribe('TEAM_RULES', lambda op, rows: 1 / 0)
+        with self.assertLogs('notifications', 'ERROR'):
+            self.deliver(self.feed.statements('TEAM_RULES', [[1, 2, 'together']]))
+        with self.assertLogs('notifications', 'ERROR'):
+            self.other.dispatch('not json')
+
+    def test_caches_are_refreshed_on_reconnecting_only(self):
+        refreshed = []
+        self.feed.on_reconnect(lambda: refreshed.append(True))
+        self.feed.connected()
+        self.assertEqual(refreshed, [])
+        self.feed.disconnected()
+        self.assertFalse(self.feed.listening)
+        self.feed.connected()
+        self.assertEqual(refreshed, [True])
+        self.assertTrue(self.feed.listening)
+
+
+@needs_database
+class ChangeFeedDeliveryTest(unittest.TestCase):
+
+    def setUp(self):
+        import psycopg
+        self.feed = ChangeFeed(True, channel='technionfc_changes_test')
+        self.listener = psycopg.connect(os.environ['DATABASE_URL'], autocommit=True)
+        self.writer = psycopg.connect(os.environ['DATABASE_URL'])
+        self.listener.execute(f'LISTEN {self.feed.channel}')
+
+    def tearDown(self):
+        self.listener.close()
+        self.writer.close()
+
+    def received(self):
+        return [json.loads(notify.payload)['r'] for notify in self.listener.notifies(timeout=0.2)]
+
+    def write(self, rows):
+        for query, params in self.feed.statements('PLAYERS', rows):
+            self.writer.execute(query, params)
+
+    def test_notifications_are_delivered_on_commit_only_and_in_order(self):
+        self.write([[1]])
+        self.write([[2]])
+        self.assertEqual(self.received(), [])
+        self.writer.commit()
+        self.assertEqual(self.received(), [[[1]], [[2]]])
+
+        self.write([[3]])
+        self.writer.rollback()
+        self.assertEqual(self.received(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from telegram import User
+
+from player_directory import PlayerDirectory, full_name_is_valid
+from player_index import PlayerIndex
+
+
+class RecordingWriter:
+    """Keeps the writes submitted to the database writer instead of running them"""
+
+    def __init__(self):
+        self.writes = []
+
+    def submit(self, table, statements, changed=None):
+        self.writes.append((table, statements, changed))
+
+
+class FullNameTest(unittest.TestCase):
+
+    def test_requires_first_and_last_names(self):
+        self.assertTrue(full_name_is_valid(User(1, 'Dani', False, last_name='Levi')))
+        self.assertFalse(full_name_is_valid(User(1, 'Dani', False)))
+        self.assertFalse(full_name_is_valid(User(1, 'D', False, last_name='Levi')))
+
+    def test_rejects_special_characters(self):
+        self.assertFalse(full_name_is_valid(User(1, 'Dani', False, last_name='Levi2')))
+        self.assertFalse(full_name_is_valid(User(1, 'Dani', False, last_name='Le_vi')))
+
+
+class PlayerDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = RecordingWriter()
+        self.index = PlayerIndex()
+        self.directory = PlayerDirectory(self.writer, self.index, batch_size=3)
+        self.dani = User(1, 'Dani', False, last_name='Levi', username='dani')
+
+    def written_ids(self):
+        return [[row[0] for row in changed] for _, _, changed in self.writer.writes]
+
+    def test_unchanged_profiles_are_written_once(self):
+        self.directory.observe(self.dani)
+        self.directory.observe(User(1, 'Dani', False, last_name='Levi', username='dani'))
+        self.directory.flush()
+        self.directory.flush()
+        self.assertEqual(self.written_ids(), [[1]])
+
+    def test_changed_profiles_are_written_again(self):
+        self.directory.observe(self.dani)
+        self.directory.flush()
+        renamed = User(1, 'Daniel', False, last_name='Levi', username='dani')
+        self.directory.observe(renamed)
+        self.directory.flush()
+        self.assertEqual(self.written_ids(), [[1], [1]])
+        self.assertIs(self.directory.get(1), renamed)
+        self.assertIs(self.index.by_username('@dani'), renamed)
+
+    def test_a_full_batch_is_written_in_one_upsert(self):
+        for user_id in range(1, 4):
+            self.directory.observe(User(user_id, 'Dani', False, last_name='Levi'))
+        self.assertEqual(self.written_ids(), [[1, 2, 3]])
+        table, [(query, params)], _ = self.writer.writes[0]
+        self.assertEqual(table, 'PLAYERS')
+        self.assertEqual(query.count('(%s, %s, %s, %s)'), 3)
+        self.assertEqual(params[:4], [1, 'Dani', 'Levi', None])
+
+    def test_bots_and_reserved_spots_are_not_cached(self):
+        self.directory.observe(User(2, 'Bot', True))
+        self.directory.observe(User(-1, 'Reserved for', False, last_name='guest'))
+        self.directory.flush()
+        self.assertEqual(len(self.directory), 0)
+        self.assertEqual(self.writer.writes, [])
+
+    def test_loaded_profiles_are_not_written_back(self):
+        self.directory.load([self.dani])
+        self.directory.flush()
+        self.assertIs(self.directory.get(1), self.dani)
+        self.assertEqual(self.writer.writes, [])
+
+    def test_loading_keeps_profiles_not_written_yet(self):
+        renamed = User(1, 'Daniel', False, last_name='Levi', username='dani')
+        self.directory.observe(renamed)
+        self.directory.load([self.dani])
+        self.assertIs(self.directory.get(1), renamed)
+        self.directory.flush()
+        self.assertEqual(self.writer.writes[0][2], [(1, 'Daniel', 'Levi', 'dani')])
+
+    def test_name_validation_is_cached_per_full_name(self):
+        self.assertTrue(self.directory.name_is_valid(self.dani))
+        self.assertTrue(self.directory.name_is_valid(self.dani))
+        self.assertEqual((self.directory.hits, self.directory.misses), (1, 1))
+        self.assertFalse(self.directory.name_is_valid(User(1, 'Dani', False, username='dani')))
+        self.assertEqual(self.directory.misses, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
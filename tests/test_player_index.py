@@ -0,0 +1,72 @@
+import unittest
+from types import SimpleNamespace
+
+from player_index import PlayerIndex, normalize, MIN_MARGIN
+
+
+def make_user(user_id, full_name, username=None, is_bot=False):
+    return SimpleNamespace(id=user_id, full_name=full_name, username=username, is_bot=is_bot)
+
+
+class PlayerIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PlayerIndex()
+        self.yossi = make_user(1, 'Yossi Cohen', 'yossi')
+        self.dani = make_user(2, 'Dani Levi')
+        self.danny = make_user(3, 'Danny Levi')
+        for user in (self.yossi, self.dani, self.danny):
+            self.index.add(user)
+
+    def test_resolves_usernames_with_or_without_at(self):
+        self.assertIs(self.index.resolve('@Yossi'), self.yossi)
+        self.assertIs(self.index.resolve('yossi'), self.yossi)
+        self.assertIs(self.index.by_username('@YOSSI'), self.yossi)
+        self.assertIsNone(self.index.by_username('@nobody'))
+
+    def test_resolves_exact_names_however_typed(self):
+        self.assertIs(self.index.resolve('  dani LEVI '), self.dani)
+
+    def test_exact_names_shared_by_several_players_are_ambiguous(self):
+        self.index.add(make_user(4, 'Dani Levi'))
+        self.assertIsNone(self.index.resolve('Dani Levi'))
+
+    def test_resolves_a_misspelt_name_by_a_clear_margin(self):
+        self.assertIs(self.index.resolve('Yosi Cohen'), self.yossi)
+        (best, user), (second, _) = self.index.search('Dani Levii', limit=2)
+        self.assertIs(user, self.dani)
+        self.assertGreaterEqual(best - second, MIN_MARGIN)
+        self.assertIs(self.index.resolve('Dani Levii'), self.dani)
+
+    def test_similar_names_within_the_margin_are_ambiguous(self):
+        (best, _), (second, _) = self.index.search('Danni Levi', limit=2)
+        self.assertLess(best - second, MIN_MARGIN)
+        self.assertIsNone(self.index.resolve('Danni Levi'))
+
+    def test_unknown_names_are_not_resolved(self):
+        self.assertEqual(self.index.search('Zvika Pick'), [])
+        self.assertIsNone(self.index.resolve('Zvika Pick'))
+
+    def test_renamed_users_are_found_by_their_new_name_only(self):
+        self.index.add(make_user(1, 'Moshe Peretz', 'moshe'))
+        self.assertEqual(self.index.resolve('Moshe Peretz').id, 1)
+        self.assertEqual(self.index.search('Yossi Cohen'), [])
+        self.assertIsNone(self.index.by_username('yossi'))
+        self.assertEqual(len(self.index), 3)
+
+    def test_ignores_bots_and_reserved_spots(self):
+        self.index.add(make_user(5, 'Football Bot', 'fcbot', is_bot=True))
+        self.index.add(make_user(-1, '', 'reserved'))
+        self.assertIsNone(self.index.by_username('fcbot'))
+        self.assertIsNone(self.index.by_username('reserved'))
+        self.assertEqual(len(self.index), 3)
+
+    def test_hebrew_names_match_with_or_without_niqqud(self):
+        user = make_user(6, 'אָבִי כֹּהֵן')
+        self.index.add(user)
+        self.assertEqual(normalize('אָבִי כֹּהֵן'), 'אבי כהן')
+        self.assertIs(self.index.resolve('אבי כהן'), user)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from collections import deque
+from types import SimpleNamespace
+
+import promotion
+
+
+def make_players(names, approved=()):
+    return [SimpleNamespace(name=name, approved=name in approved) for name in names]
+
+
+def names(players):
+    return [player.name if player is not None else None for player in players]
+
+
+class SweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.players = make_players('abcdefg', approved='f')
+        self.playing = deque(self.players)
+        self.by_name = {player.name: player for player in self.players}
+
+    def sweep(self, removed, **kwargs):
+        promotions = promotion.sweep(self.playing, [self.by_name[name] for name in removed], 4, **kwargs)
+        return [(player.name, first_in_line.name if first_in_line else None) for player, first_in_line in promotions]
+
+    def test_promotes_first_in_line_in_removal_order(self):
+        promotions = self.sweep('ca', prefer_approved=False)
+        self.assertEqual(promotions, [('c', 'e'), ('a', 'f')])
+        self.assertEqual(names(self.playing), ['b', 'd', 'e', 'f', 'g'])
+
+    def test_prefers_approved_waiting_players(self):
+        promotions = self.sweep('ca')
+        self.assertEqual(promotions, [('c', 'f'), ('a', 'e')])
+        self.assertEqual(names(self.playing), ['b', 'd', 'f', 'e', 'g'])
+
+    def test_waiting_players_removed_are_not_replaced(self):
+        promotions = self.sweep('eb')
+        self.assertEqual(promotions, [('e', None), ('b', 'f')])
+        self.assertEqual(names(self.playing), ['a', 'c', 'd', 'f', 'g'])
+
+    def test_a_waiting_player_removed_with_playing_players_is_not_promoted(self):
+        promotions = self.sweep('afg')
+        self.assertEqual(promotions, [('a', 'e'), ('f', None), ('g', None)])
+        self.assertEqual(names(self.playing), ['b', 'c', 'd', 'e'])
+
+    def test_runs_out_of_waiting_players(self):
+        promotions = self.sweep('abcd', prefer_approved=False)
+        self.assertEqual(promotions, [('a', 'e'), ('b', 'f'), ('c', 'g'), ('d', None)])
+        self.assertEqual(names(self.playing), ['e', 'f', 'g'])
+
+    def test_nothing_removed_leaves_the_list(self):
+        self.assertEqual(self.sweep(''), [])
+        self.assertEqual(names(self.playing), list('abcdefg'))
+
+    def test_promotes_by_rank_then_position(self):
+        ranks = {'e': 1, 'f': 3, 'g': 3}
+        promotions = self.sweep('abc', prefer_approved=False, rank=lambda player: ranks[player.name])
+        self.assertEqual(promotions, [('a', 'f'), ('b', 'g'), ('c', 'e')])
+        self.assertEqual(names(self.playing), ['d', 'f', 'g', 'e'])
+
+    def test_approved_players_come_first_when_promoting_by_rank(self):
+        ranks = {'e': 1, 'f': 0, 'g': 3}
+        promotions = self.sweep('ab', rank=lambda player: ranks[player.name])
+        self.assertEqual(promotions, [('a', 'f'), ('b', 'g')])
+        self.assertEqual(names(self.playing), ['c', 'd', 'f', 'g', 'e'])
+
+
+if __name__ == '__main__':
+    unittest.main()
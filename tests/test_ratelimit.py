@@ -0,0 +1,65 @@
+import unittest
+
+from ratelimit import CommandRateLimiter, parse_limit, parse_limits, SILENT_POLICY
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ParseLimitsTest(unittest.TestCase):
+
+    def test_parses_commands_case_insensitively(self):
+        self.assertEqual(parse_limits('print=3/60, addUser=30/60,'), {'print': (3, 60.0), 'adduser': (30, 60.0)})
+        self.assertEqual(parse_limit('6/60'), (6, 60.0))
+
+
+class CommandRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = CommandRateLimiter({'print': (2, 60.0), 'adduser': (30, 60.0)}, (6, 60.0), clock=self.clock)
+
+    def test_throttles_beyond_the_limit_and_warns_once(self):
+        self.assertEqual([self.limiter.allow(1, 'print') for _ in range(4)],
+                         [(True, False), (True, False), (False, True), (False, False)])
+        self.assertEqual(self.limiter.throttled['print'], 2)
+
+    def test_buckets_refill_over_the_period(self):
+        for _ in range(2):
+            self.limiter.allow(1, 'print')
+        self.assertEqual(self.limiter.allow(1, 'print'), (False, True))
+        self.clock.now = 30.0
+        self.assertEqual(self.limiter.allow(1, 'print'), (True, False))
+        self.assertEqual(self.limiter.allow(1, 'print'), (False, True))      # warned again after being let through
+
+    def test_buckets_are_per_user_and_command(self):
+        for _ in range(2):
+            self.limiter.allow(1, 'print')
+        self.assertTrue(self.limiter.allow(2, 'print')[0])
+        self.assertTrue(self.limiter.allow(1, 'shuffle')[0])
+
+    def test_commands_without_a_limit_get_the_default(self):
+        self.assertEqual(sum(self.limiter.allow(1, 'remove')[0] for _ in range(10)), 6)
+
+    def test_admin_list_edits_get_their_own_limit(self):
+        self.assertEqual(sum(self.limiter.allow(1, 'addUser')[0] for _ in range(40)), 30)
+
+    def test_silent_policy_never_warns(self):
+        limiter = CommandRateLimiter({}, (1, 60.0), SILENT_POLICY, clock=self.clock)
+        self.assertEqual([limiter.allow(1, 'print') for _ in range(2)], [(True, False), (False, False)])
+
+    def test_prune_forgets_full_buckets_only(self):
+        self.limiter.allow(1, 'print')
+        self.limiter.allow(2, 'remove')
+        self.clock.now = 20.0       # user 1's bucket of 2 per minute refills in 30 seconds, user 2's of 6 in 10
+        self.limiter.prune()
+        self.assertEqual(list(self.limiter._buckets), [(1, 'print')])
+
+
+if __name__ == '__main__':
+    unittest.main()
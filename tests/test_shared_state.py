@@ -0,0 +1,235 @@
+import unittest
+
+from telegram.utils.request import Request
+
+from shared_state import SharedRoster, DeferringRequest, MAX_ATTEMPTS
+
+
+class FakeDatabase:
+    """Holds the ROSTER_STATE row in memory, answering the queries SharedRoster makes"""
+
+    def __init__(self, version=0, state=None, conflicts=0):
+        self.version = version
+        self.state = state
+        self.conflicts = conflicts      # commits to lose to other processes
+
+    def get_connection(self):
+        return self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self._database = database
+        self._row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params):
+        database = self._database
+        if query.startswith('UPDATE') and database.conflicts:      # another process commits first
+            database.conflicts -= 1
+            database.version += 1
+            database.state = {'matches': []}
+        if query.startswith('SELECT'):
+            self._row = (database.version, database.state if database.version != params[0] else None)
+        elif query.startswith('UPDATE'):
+            state, version = params
+            self._row = None
+            if version == database.version:
+                database.version += 1
+                database.state = state.obj
+                self._row = (database.version,)
+
+    def fetchone(self):
+        return self._row
+
+
+def match_state(match_id, playing):
+    return {'id': match_id, 'date': '2024-01-09', 'kickoff': '20:00:00', 'pitch': None, 'pinned': None,
+            'playing': playing, 'invited': [], 'asked': []}
+
+
+PLAYER = {'user': {'id': 5, 'first_name': 'Dan', 'is_bot': False}, 'liable': False, 'approved': False,
+          'match_ball': False}
+
+
+class SharedRosterStartTest(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = {'matches': []}
+        self.restored = []
+
+    def make_roster(self, database):
+        def restore(state):
+            self.restored.append(state)
+            self.memory = state
+        return SharedRoster(database, lambda: self.memory, restore, True)
+
+    def test_publishes_restored_matches_when_nothing_is_shared(self):
+        database = FakeDatabase()
+        self.memory = {'matches': [match_state(1, []), match_state(2, [PLAYER])]}
+        roster = self.make_roster(database)
+        roster.start()
+        self.assertEqual(database.version, 1)
+        self.assertEqual(database.state, self.memory)
+        self.assertEqual(roster.version, 1)
+
+    def test_does_not_publish_empty_lists(self):
+        database = FakeDatabase()
+        self.memory = {'matches': [match_state(1, [])]}
+        roster = self.make_roster(database)
+        roster.start()
+        self.assertEqual(database.version, 0)
+        self.assertIsNone(database.state)
+
+    def test_loads_the_shared_state(self):
+        shared = {'matches': [match_state(3, [PLAYER])]}
+        database = FakeDatabase(version=4, state=shared)
+        self.memory = {'matches': [match_state(1, [PLAYER])]}
+        roster = self.make_roster(database)
+        roster.start()
+        self.assertEqual(self.restored, [shared])
+        self.assertEqual(roster.version, 4)
+        self.assertEqual(database.state, shared)
+
+    def test_disabled_does_nothing(self):
+        database = FakeDatabase()
+        self.memory = {'matches': [match_state(1, [PLAYER])]}
+        roster = SharedRoster(database, lambda: self.memory, self.restored.append, False)
+        roster.start()
+        self.assertEqual(database.version, 0)
+        self.assertEqual(self.restored, [])
+
+
+class SentRequest(Request):
+    """Records the Bot API methods posted instead of posting them"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    def post(self, url, data=None, timeout=None):
+        self.sent.append(url.rsplit('/', 1)[-1])
+        return True
+
+
+class RecordingRequest(DeferringRequest, SentRequest):
+    pass
+
+
+class SharedRosterTransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = {'matches': []}
+        self.effects = []
+        self.conflicts = []
+
+    def make_roster(self, database):
+        def restore(state):
+            self.memory = state
+        return SharedRoster(database, lambda: self.memory, restore, True, on_conflict=self.conflicts.append)
+
+    def make_handler(self, roster):
+        notify = roster.deferred(self.effects.append)
+
+        def handler(update):
+            self.memory = {'matches': self.memory['matches'] + [match_state(len(self.memory['matches']), [])]}
+            notify(update)
+            return 'done'
+        return roster.transaction(handler)
+
+    def test_side_effects_run_once_after_retrying_a_conflict(self):
+        database = FakeDatabase(version=1, state={'matches': []}, conflicts=2)
+        roster = self.make_roster(database)
+        self.assertEqual(self.make_handler(roster)('add'), 'done')
+        self.assertEqual(self.effects, ['add'])
+        self.assertEqual(self.conflicts, [])
+        self.assertEqual(len(database.state['matches']), 1)
+
+    def test_side_effects_are_dropped_when_giving_up(self):
+        database = FakeDatabase(version=1, state={'matches': []}, conflicts=MAX_ATTEMPTS)
+        roster = self.make_roster(database)
+        self.assertIsNone(self.make_handler(roster)('add'))
+        self.assertEqual(self.effects, [])
+        self.assertEqual(self.conflicts, ['add'])
+        self.assertEqual(database.state, {'matches': []})
+
+    def test_side_effects_run_right_away_outside_handlers(self):
+        roster = self.make_roster(FakeDatabase())
+        roster.defer(self.effects.append, 'job')
+        self.assertEqual(self.effects, ['job'])
+
+    def test_bot_api_calls_are_deferred_except_reads(self):
+        database = FakeDatabase(version=1, state={'matches': []}, conflicts=1)
+        roster = self.make_roster(database)
+        request = RecordingRequest(roster)
+
+        def handler():
+            request.post('https://api.telegram.org/bot0:token/getChatMember', {})
+            request.post('https://api.telegram.org/bot0:token/sendMessage', {})
+            self.assertEqual(request.sent, ['getChatMember'] * len(request.sent))
+            self.memory = {'matches': [match_state(1, [PLAYER])]}
+        roster.transaction(handler)()
+        self.assertEqual(request.sent, ['getChatMember', 'getChatMember', 'sendMessage'])
+
+    def test_bot_api_calls_are_posted_right_away_outside_handlers(self):
+        request = RecordingRequest(self.make_roster(FakeDatabase()))
+        request.post('https://api.telegram.org/bot0:token/sendMessage', {})
+        self.assertEqual(request.sent, ['sendMessage'])
+
+    def test_nested_handlers_commit_and_carry_out_effects_with_the_outer_one(self):
+        database = FakeDatabase(version=1, state={'matches': []})
+        roster = self.make_roster(database)
+        inner = self.make_handler(roster)
+
+        def outer():
+            self.assertEqual(inner('inner'), 'done')
+            self.assertEqual(self.effects, [])
+            self.assertEqual(database.version, 1)
+            return 'outer'
+        self.assertEqual(roster.transaction(outer)(), 'outer')
+        self.assertEqual(self.effects, ['inner'])
+        self.assertEqual(database.version, 2)
+
+    def test_failing_side_effects_do_not_stop_the_others(self):
+        roster = self.make_roster(FakeDatabase(version=1, state={'matches': []}))
+
+        def handler():
+            roster.defer(lambda: 1 / 0)
+            roster.defer(self.effects.append, 'sent')
+            self.memory = {'matches': [match_state(1, [PLAYER])]}
+        with self.assertLogs('shared_state', 'WARNING'):
+            roster.transaction(handler)()
+        self.assertEqual(self.effects, ['sent'])
+
+    def test_failing_handler_leaves_the_state_as_committed(self):
+        shared = {'matches': [match_state(1, [])]}
+        database = FakeDatabase(version=1, state=shared)
+        roster = self.make_roster(database)
+        notify = roster.deferred(self.effects.append)
+
+        def failing():
+            self.memory = {'matches': [match_state(1, [PLAYER])]}
+            notify('half done')
+            raise ValueError('failed partway')
+        with self.assertRaises(ValueError):
+            roster.transaction(failing)()
+        self.assertEqual(self.memory, shared)
+        self.assertEqual(self.effects, [])
+
+        self.assertEqual(self.make_handler(roster)('add'), 'done')
+        self.assertEqual(database.state, {'matches': [match_state(1, []), match_state(1, [])]})
+
+
+if __name__ == '__main__':
+    unittest.main()
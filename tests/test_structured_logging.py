@@ -0,0 +1,43 @@
+import logging
+import unittest
+from threading import Thread
+
+from structured_logging import DebugSampler, parse_levels
+
+
+def make_record(name, level=logging.DEBUG):
+    return logging.LogRecord(name, level, __file__, 0, 'message', None, None)
+
+
+class DebugSamplerTest(unittest.TestCase):
+
+    def test_lets_one_in_every_rate_debug_records_of_each_logger_through(self):
+        sampler = DebugSampler(3)
+        self.assertEqual([sampler.filter(make_record('bot')) for _ in range(6)], [True, False, False] * 2)
+        self.assertTrue(sampler.filter(make_record('db_writer')))
+        self.assertTrue(sampler.filter(make_record('bot', logging.INFO)))
+        self.assertEqual(sampler.dropped, 4)
+
+    def test_counts_records_of_concurrent_threads_exactly(self):
+        sampler = DebugSampler(4)
+        passed = []
+
+        def log():
+            passed.append(sum(sampler.filter(make_record('bot')) for _ in range(5000)))
+        threads = [Thread(target=log) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(passed), 8 * 5000 // 4)
+        self.assertEqual(sampler.dropped, 8 * 5000 * 3 // 4)
+
+
+class ParseLevelsTest(unittest.TestCase):
+
+    def test_parses_logger_levels(self):
+        self.assertEqual(parse_levels('telegram=warning, psycopg=INFO,'), {'telegram': 'WARNING', 'psycopg': 'INFO'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import random
+import unittest
+from itertools import combinations
+
+from teams import TeamRules, split_teams, HARD_WEIGHT
+
+
+class FakeWriter:
+    def __init__(self):
+        self.writes = []
+
+    def submit(self, table, statements, changed=None, op='upsert'):
+        self.writes.append((table, changed, op))
+
+
+def split_cost(teams, rules):
+    """Return a split's cost computed from scratch, as the sum of its same team pairs' weights"""
+    keys = [key for team in teams for key in team]
+    weights, offset = rules.pair_weights(keys)
+    team_of = [index for index, team in enumerate(teams) for _ in team]
+    return offset + sum(weights[i][j] for i, j in combinations(range(len(keys)), 2) if team_of[i] == team_of[j])
+
+
+class SplitTeamsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = TeamRules(FakeWriter())
+        self.players = list(range(1, 16))
+
+    def split(self, players=None, team_count=3, seed=0, **kwargs):
+        return split_teams(players or self.players, team_count, self.rules, lambda player: player,
+                           rng=random.Random(seed), **kwargs)
+
+    def assert_balanced(self, split, players, team_count):
+        self.assertEqual(len(split.teams), team_count)
+        self.assertEqual(sorted(player for team in split.teams for player in team), sorted(players))
+        sizes = [len(team) for team in split.teams]
+        self.assertLessEqual(max(sizes) - min(sizes), 1)
+
+    def test_teams_are_balanced_without_rules(self):
+        for players, team_count in ((self.players, 3), (self.players[:14], 3), (self.players[:7], 2)):
+            split = self.split(players, team_count)
+            self.assert_balanced(split, players, team_count)
+            self.assertEqual((split.broken, split.repeated), ([], 0))
+
+    def test_satisfiable_hard_rules_are_never_broken(self):
+        for goalkeeper in (1, 2, 3):
+            self.rules.set('goalkeeper', True, goalkeeper)
+        self.rules.set('apart', True, 4, 5)
+        self.rules.set('apart', True, 5, 6)
+        self.rules.set('apart', True, 4, 6)
+        self.rules.set('together', True, 7, 8)
+        self.rules.set('together', True, 8, 9)
+        self.rules.set('apart', False, 10, 11)
+        for seed in range(20):
+            split = self.split(seed=seed)
+            self.assert_balanced(split, self.players, 3)
+            self.assertEqual(split.broken, [])
+            team_of = {player: index for index, team in enumerate(split.teams) for player in team}
+            self.assertEqual(len({team_of[1], team_of[2], team_of[3]}), 3)
+            self.assertEqual(len({team_of[4], team_of[5], team_of[6]}), 3)
+            self.assertEqual(len({team_of[7], team_of[8], team_of[9]}), 1)
+
+    def test_unsatisfiable_rules_are_reported(self):
+        for goalkeeper in (1, 2, 3):
+            self.rules.set('goalkeeper', True, goalkeeper)
+        split = self.split(self.players[:6], 2)
+        self.assertEqual(len(split.broken), 1)
+        kind, hard, player, other = split.broken[0]
+        self.assertEqual((kind, hard), ('goalkeeper', True))
+        self.assertIn(player, (1, 2, 3))
+        self.assertIn(other, (1, 2, 3))
+
+    def test_soft_rules_give_way_to_hard_ones(self):
+        self.rules.set('together', True, 1, 2)
+        self.rules.set('apart', False, 1, 2)       # replaces the pair's hard rule
+        self.assertEqual(self.rules.pair_rule(2, 1), ('apart', False))
+        self.rules.set('together', True, 1, 3)
+        self.rules.set('together', True, 2, 3)     # so 1 and 2 can't be kept apart
+        split = self.split(self.players[:6], 2)
+        self.assertEqual([(kind, hard) for kind, hard, _, _ in split.broken], [('apart', False)])
+
+    def test_swap_deltas_reach_the_optimum_of_small_splits(self):
+        rng = random.Random(3)
+        players = self.players[:8]
+        for _ in range(30):
+            pair = rng.sample(players, 2)
+            self.rules.set(rng.choice(('apart', 'together')), rng.random() < 0.3, *pair)
+        self.rules.load([], [(player, 'mon8-1', player % 2) for player in players])
+
+        best = min(split_cost([list(team), [player for player in players if player not in team]], self.rules)
+                   for team in combinations(players, 4))
+        split = self.split(players, 2, restarts=50)
+        self.assertEqual(split_cost(split.teams, self.rules), best)
+
+    def test_repeated_teammates_are_counted(self):
+        self.rules.load([], [(1, 'mon8-1', 0), (2, 'mon8-1', 0), (3, 'mon8-1', 1), (4, 'mon8-1', 1)])
+        split = self.split([1, 2, 3, 4], 2)
+        self.assertEqual(split.repeated, 0)
+        self.assertEqual(split.broken, [])
+        self.assertEqual(split_cost(split.teams, self.rules), 0)
+
+
+class TeamRulesTest(unittest.TestCase):
+
+    def test_writes_rules_and_closed_teams(self):
+        writer = FakeWriter()
+        rules = TeamRules(writer)
+        rules.set('apart', True, 9, 4)
+        self.assertEqual(rules.rules(), [(4, 9, 'apart', True)])
+        self.assertTrue(rules.clear(9, 4))
+        self.assertFalse(rules.clear(9, 4))
+        rules.draft('thu11-1', [[1, 2], [3]])
+        rules.close('thu11-1')
+        rules.close('thu11-1')        # closing twice writes once
+        self.assertEqual([(table, op) for table, _, op in writer.writes],
+                         [('TEAM_RULES', 'upsert'), ('TEAM_RULES', 'delete'), ('LAST_TEAMS', 'upsert')])
+        self.assertTrue(rules.repeated(1, 2))
+        self.assertFalse(rules.repeated(1, 3))
+        weights, offset = rules.pair_weights([1, 2, None])
+        self.assertEqual((weights[0][1], weights[0][2], offset), (1, 0, 0))
+        self.assertLess(weights[0][1], HARD_WEIGHT)
+
+
+if __name__ == '__main__':
+    unittest.main()
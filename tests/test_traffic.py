@@ -0,0 +1,44 @@
+import unittest
+
+from traffic import Anonymizer
+
+SALT = 'a salt of sixteen bytes'
+
+
+class AnonymizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.anonymizer = Anonymizer(SALT)
+
+    def test_text_keeps_commands_keywords_and_match_ids(self):
+        for text in ('/shuffle', '/export parquet', '/audit 123 before 40', '/addMatch thu 21:00',
+                     '/addMatch Thursday', '/approve #thu22', '/approve #thu22-11', '/approve #thu22-11-2'):
+            self.assertEqual(self.anonymizer.text(text), text)
+
+    def test_text_replaces_lowercase_names(self):
+        text = self.anonymizer.text('/removeUser dan cohen #thu22-11')
+        command, first_name, last_name, match_id = text.split(' ')
+        self.assertEqual((command, match_id), ('/removeUser', '#thu22-11'))
+        self.assertEqual((first_name, last_name), (self.anonymizer.name('dan'), self.anonymizer.name('cohen')))
+        self.assertNotEqual((first_name, last_name), ('dan', 'cohen'))
+
+    def test_button_data_user_ids_match_the_pressing_user(self):
+        update = {'callback_query': {
+            'from': {'id': 123456789, 'first_name': 'Dan', 'is_bot': False},
+            'data': 'remove:confirm:thu22-11:123456789',
+            'message': {'reply_markup': {'inline_keyboard': [[
+                {'text': 'Cancel', 'callback_data': 'remove:cancel:thu22-11:123456789'}]]}}}}
+        query = self.anonymizer.anonymize(update)['callback_query']
+        user_id = query['from']['id']
+        self.assertNotEqual(user_id, 123456789)
+        self.assertEqual(query['data'], f'remove:confirm:thu22-11:{user_id}')
+        self.assertEqual(query['message']['reply_markup']['inline_keyboard'][0][0]['callback_data'],
+                         f'remove:cancel:thu22-11:{user_id}')
+
+    def test_short_salt_is_refused(self):
+        with self.assertRaises(ValueError):
+            Anonymizer('short')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import os
+import re
+import gzip
+import json
+import zlib
+import time
+import hashlib
+import logging
+from functools import wraps
+from threading import Thread
+from queue import Queue, Full, Empty
+
+from matches import WEEKDAYS
+from teams import KINDS
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5              # seconds between flushes of the log file, bounding what a crash loses
+MAX_QUEUE_SIZE = 10000          # records waiting to be written, dropped beyond that rather than slowing handlers
+MIN_SALT_SIZE = 16              # bytes of salt, without which pseudonyms of ids and names are reversed by brute force
+ID_KEYS = ('id', 'user_id')                                             # ids of users and chats
+NAME_KEYS = ('first_name', 'last_name', 'username', 'title', 'full_name')
+TEXT_KEYS = ('text', 'caption')
+CALLBACK_DATA_KEYS = ('data', 'callback_data')                          # buttons' data, which may hold user ids
+KEYWORDS = frozenset(KINDS + ('clear', 'soft', 'before', 'csv', 'parquet'))     # words commands' arguments parse
+# weekdays and match ids, e.g. 'thu', 'thursday', '#thu22-11' or '#thu22-11-2'
+MATCH_WORD = re.compile(rf"#?(?:{'|'.join(WEEKDAYS)})(?:[a-z]*day)?(?:\d{{1,2}}(?:-\d{{1,2}}){{0,2}})?",
+                        re.IGNORECASE)
+
+
+class Anonymizer:
+    """This class replaces user and chat ids, names and the names in message texts with stable pseudonyms
+
+    The same value always gets the same pseudonym (given the same salt), so replayed users keep their lists, admin
+    commands still resolve plain-text names, and names keep their validity: pseudonyms replace letters only, one for
+    one, keeping case, digits, punctuation and length (in UTF-16 code units, so message entity offsets stay right).
+    In texts, only commands, the keywords their arguments parse, weekdays and match ids are kept as typed. In buttons'
+    data, the numeric fields (user ids) are pseudonymized like ids are."""
+
+    def __init__(self, salt):
+        self._salt = salt.encode('utf-8')
+        if len(self._salt) < MIN_SALT_SIZE:
+            raise ValueError(f'the salt must be at least {MIN_SALT_SIZE} bytes long, so pseudonyms stay private')
+
+    def anonymize(self, data):
+        """Return a copy of an update's dict with ids, names and texts pseudonymized"""
+        if isinstance(data, list):
+            return [self.anonymize(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        anonymized = {}
+        for key, value in data.items():
+            if key in ID_KEYS and isinstance(value, int) and not isinstance(value, bool):
+                anonymized[key] = self.user_id(value)
+            elif key in NAME_KEYS and isinstance(value, str):
+                anonymized[key] = self.name(value)
+            elif key in TEXT_KEYS and isinstance(value, str):
+                anonymized[key] = self.text(value)
+            elif key in CALLBACK_DATA_KEYS and isinstance(value, str):
+                anonymized[key] = self.callback_data(value)
+            else:
+                anonymized[key] = self.anonymize(value)
+        return anonymized
+
+    def snapshot(self, state):
+        """Return a copy of a roster snapshot with ids and names pseudonymized, including the user ids and names the
+        invitations and asks are keyed by"""
+        anonymized = self.anonymize(state)
+        for match, original in zip(anonymized.get('matches', ()), state.get('matches', ())):
+            match['id'] = original['id']        # match ids aren't personal, and buttons' data refers to them
+            for key in ('invited', 'asked'):
+                match[key] = [[self._key(item_key), *rest] for item_key, *rest in match[key]]
+        return anonymized
+
+    def _key(self, key):
+        return self.user_id(key) if isinstance(key, int) else self.name(key)
+
+    def user_id(self, value):
+        """Return the pseudonym of a user or chat id, keeping its sign (groups have negative ids)"""
+        if value in (0, -1):        # reserved spots' fake user id
+            return value
+        digest = hashlib.blake2b(str(abs(value)).encode(), key=self._salt[:64], digest_size=5).digest()
+        pseudonym = 10 ** 9 + int.from_bytes(digest, 'big') % 10 ** 12
+        return pseudonym if value > 0 else -pseudonym
+
+    def name(self, value):
+        """Return the pseudonym of a name, word by word"""
+        pseudonym, word = [], []
+        for character in value + ' ':
+            if character.isalpha():
+                word.append(character)
+                continue
+            if word:
+                pseudonym.append(self._word(''.join(word)))
+                word = []
+            pseudonym.append(character)
+        return ''.join(pseudonym)[:-1]
+
+    def text(self, value):
+        """Return a message text with its names replaced, keeping commands, keywords, weekdays and match ids"""
+        return ' '.join(word if word.startswith('/') or word.lower() in KEYWORDS or MATCH_WORD.fullmatch(word)
+                        else self.name(word) for word in value.split(' '))
+
+    def callback_data(self, value):
+        """Return a button's data (e.g. 'remove:confirm:thu22-11:<user id>') with its user ids pseudonymized"""
+        return ':'.join(str(self.user_id(int(field))) if field.lstrip('-').isdigit() else field
+                        for field in value.split(':'))
+
+    def _word(self, word):
+        letters = hashlib.shake_256(self._salt + word.lower().encode('utf-8')).digest(len(word))
+        return ''.join(chr(ord('A' if character.isupper() else 'a') + letter % 26)
+                       for character, letter in zip(word, letters))
+
+
+class TrafficRecorder:
+    """This class writes the updates the bot receives and the jobs it runs to a gzip compressed JSON lines file
+
+    Records are anonymized and written on a background thread. Each process start writes its own file (see
+    get_log_path), headed by the (pseudonymized) group chat id, so replays can map it to their own group, and the
+    roster it started with. Writes are flushed every few seconds, so a killed process' file is readable up to its last
+    flush."""
+
+    def __init__(self, path, salt, group_chat_id, flush_interval=FLUSH_INTERVAL):
+        self.path = get_log_path(path, time.time())
+        self._anonymizer = Anonymizer(salt)
+        self._flush_interval = flush_interval
+        self._queue = Queue(maxsize=MAX_QUEUE_SIZE)
+        self.dropped = 0
+        self._put({'kind': 'header', 'time': time.time(), 'group_chat_id': group_chat_id})
+        self._thread = Thread(target=self._run, name='traffic-recorder', daemon=True)
+        self._thread.start()
+
+    def record_update(self, update):
+        """Record an update, as its dict"""
+        self._put({'kind': 'update', 'time': time.time(), 'update': update})
+
+    def record_snapshot(self, state):
+        """Record the roster the bot starts with, so replays start from it too"""
+        self._put({'kind': 'snapshot', 'time': time.time(), 'state': state})
+
+    def job(self, callback):
+        """Wrap a job callback so its runs are recorded by job name (and context, when it's a flag)"""
+        @wraps(callback)
+        def wrapper(context):
+            record = {'kind': 'job', 'time': time.time(), 'job': context.job.name}
+            if isinstance(context.job.context, bool):
+                record['context'] = context.job.context
+            self._put(record)
+            return callback(context)
+        return wrapper
+
+    def stop(self, timeout=None):
+        """Write the records still queued and close the file"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def _run(self):
+        with gzip.open(self.path, 'wt', encoding='utf-8') as file:
+            while True:
+                try:
+                    record = self._queue.get(timeout=self._flush_interval)
+                except Empty:
+                    file.flush()
+                    continue
+                if record is None:
+                    break
+                if record['kind'] == 'update':
+                    record['update'] = self._anonymizer.anonymize(record['update'])
+                elif record['kind'] == 'snapshot':
+                    record['state'] = self._anonymizer.snapshot(record['state'])
+                elif record['kind'] == 'header':
+                    record['group_chat_id'] = self._anonymizer.user_id(int(record['group_chat_id']))
+                file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        logger.info(f"Traffic recording closed ({self.dropped} records dropped)")
+
+
+def get_log_path(path, started):
+    """Return the path of the log written by a process started at a given timestamp: the configured path, with the
+    start time and process id added to its name"""
+    directory, name = os.path.split(path)
+    stem, dot, extensions = name.partition('.')
+    return os.path.join(directory, f"{stem}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))}-{os.getpid()}"
+                                   f"{dot}{extensions}")
+
+
+def read_records(path):
+    """Yield the records of a traffic log, in the order they were written
+
+    The log of a process killed before closing it ends mid-stream, so records are read up to its last flush."""
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        try:
+            for line in file:
+                if line.strip() and line.endswith('\n'):
+                    yield json.loads(line)
+        except (EOFError, zlib.error) as err:
+            logger.warning(f"{path} ends with a truncated write, reading the records before it: {err}")